@@ -0,0 +1,80 @@
+"""
+    Beat-level similarity search: building a BeatIndex over every heart beat of a corpus,
+    reopening it, and batched top-k queries of the annoy backend versus the exact backend.
+    Fails unless every stored beat refers back to its ECG, beat number and samples.
+
+    python benchmarks/bench_beat_index.py --ecgs 500 --k 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import BeatIndex, bpm_points
+from watchlib.data_handler import ECGCorpus
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--window", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = write_ecgs(tmp, args.ecgs, args.seconds)
+        write_ecgs(os.path.join(tmp, "short"), 1, args.seconds // 3, seed=args.ecgs)
+        os.replace(os.path.join(tmp, "short", "electrocardiograms", "ecg_0.csv"), os.path.join(folder, "short.csv"))
+        corpus = ECGCorpus.build(folder, os.path.join(tmp, "corpus"))
+
+        index, build_time = timed(lambda: BeatIndex(os.path.join(tmp, "annoy"), args.window, block_size=64).ensure(corpus))
+        exact, exact_build_time = timed(lambda: BeatIndex(os.path.join(tmp, "exact"), args.window, backend="exact").ensure(corpus))
+        _, reopen_time = timed(lambda: BeatIndex(os.path.join(tmp, "annoy"), args.window, block_size=64).ensure(corpus))
+
+        # Back-references: ECG, number of the beat in the ECG and its samples
+        before = index.before
+        for i in np.random.default_rng(0).choice(len(index), size=200, replace=False):
+            ecg, number, sample = index.ecgs[i], index.beats[i], index.samples[i]
+            assert bpm_points(corpus[int(ecg)])[number] == sample
+            expected = corpus.values(int(ecg))[sample - before:sample - before + args.window]
+            assert np.allclose(index.windows[i], expected, rtol=1e-3, atol=0.5)
+        assert np.array_equal(index.samples, exact.samples) and np.array_equal(index.ecgs, exact.ecgs)
+
+        # The same index from a list of ECGs
+        from_list = BeatIndex(os.path.join(tmp, "list"), args.window, backend="exact").build(list(corpus))
+        assert np.array_equal(from_list.beats, index.beats) and np.array_equal(from_list.ecgs, index.ecgs)
+
+        queries = np.asarray(index.windows[np.random.default_rng(1).choice(len(index), size=min(args.queries, len(index)))],
+                             dtype=np.float32)
+        found, query_time = timed(lambda: index.query_batch(queries, args.k))
+        expected, exact_query_time = timed(lambda: exact.query_batch(queries, args.k))
+        recall = np.mean([len(set(f) & set(e)) / args.k for f, e in zip(found.tolist(), expected.tolist())])
+
+        beats, neighbours = exact.query_ecg(corpus[3], 1)
+        assert exact.references(neighbours[:, 0])["name"].eq(corpus.names[3]).all()
+        assert exact.samples[neighbours[:, 0]].tolist() == beats.tolist()
+
+    print(f"{len(corpus)} ECGs, {len(index)} beats x {args.window} samples, "
+          f"{index.meta['built_trees']} trees, {len(queries)} queries")
+    print(f"  build annoy:  {build_time:7.3f} s, reopen {reopen_time:7.3f} s")
+    print(f"  build exact:  {exact_build_time:7.3f} s")
+    print(f"  query annoy:  {1000 * query_time / len(queries):7.3f} ms per beat, recall@{args.k} {recall:.3f}")
+    print(f"  query exact:  {1000 * exact_query_time / len(queries):7.3f} ms per beat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+    Heart beat windows: split_around_heartbeats (one list slice per beat) versus the
+    (n_beats, window) arrays of beat_windows and beat_windows_batch, and the average
+    heart beat of every ECG from them. Fails unless every window equals the samples
+    around its beat.
+
+    python benchmarks/bench_beat_windows.py --ecgs 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import beat_windows, beat_windows_batch, bpm_points, split_around_heartbeats
+from watchlib.data_handler import ECGCorpus
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=100)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--window", type=int, default=384)
+    args = parser.parse_args()
+    window, before = args.window, args.window // 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = write_ecgs(tmp, args.ecgs, args.seconds)
+        # One shorter ECG, its windows must not reach into the NaN padding of the corpus
+        write_ecgs(os.path.join(tmp, "short"), 1, args.seconds // 3, seed=args.ecgs)
+        os.replace(os.path.join(tmp, "short", "electrocardiograms", "ecg_0.csv"), os.path.join(folder, "short.csv"))
+        corpus = ECGCorpus.build(folder, os.path.join(tmp, "corpus"))
+        ecgs = list(corpus)
+
+        for i, ecg in enumerate(ecgs):
+            y = np.asarray(ecg.y)
+            windows, points = beat_windows(ecg, window)
+            expected = [p for p in bpm_points(ecg) if p - before >= 0 and p - before + window <= len(y)]
+            assert points.tolist() == expected
+            for row, p in zip(windows, points):
+                assert np.array_equal(row, y[p - before:p - before + window])
+
+            padded, padded_points = beat_windows(ecg, window, pad=True)
+            assert padded_points.tolist() == bpm_points(ecg)
+            assert np.array_equal(padded[np.isin(padded_points, points)], windows)
+
+        windows, rows, points = beat_windows_batch(corpus, window)
+        assert not np.isnan(windows).any()
+        for i, ecg in enumerate(ecgs):
+            single, single_points = beat_windows(ecg, window)
+            assert np.array_equal(windows[rows == i], single.astype(np.float32))
+            assert np.array_equal(points[rows == i], single_points)
+        padded, padded_rows, _ = beat_windows_batch(corpus, window, pad=True)
+        assert len(padded) == sum(len(bpm_points(ecg)) for ecg in ecgs)
+
+        _, split_time = timed(lambda: [split_around_heartbeats(ecg) for ecg in ecgs])
+        _, single_time = timed(lambda: [beat_windows(ecg, window)[0].mean(axis=0) for ecg in ecgs])
+
+        def batch_templates():
+            windows, rows, _ = beat_windows_batch(corpus, window)
+            # rows are ascending, every ECG with beats is one run of rows
+            present = np.unique(rows)
+            sums = np.add.reduceat(windows, np.searchsorted(rows, present), axis=0, dtype=np.float64)
+            templates = np.full((len(corpus), window), np.nan)
+            templates[present] = sums / np.bincount(rows)[present][:, None]
+            return templates
+
+        templates, batch_time = timed(batch_templates)
+        assert np.allclose(templates[0], beat_windows(ecgs[0], window)[0].mean(axis=0))
+
+    print(f"{len(ecgs)} ECGs x {args.seconds * 512} samples, {len(windows)} beats x {window} samples")
+    print(f"  split_around_heartbeats:        {split_time:7.3f} s")
+    print(f"  beat_windows + mean:            {single_time:7.3f} s  ({split_time / single_time:5.1f}x)")
+    print(f"  beat_windows_batch + templates: {batch_time:7.3f} s  ({split_time / batch_time:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
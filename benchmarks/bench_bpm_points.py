@@ -0,0 +1,72 @@
+"""
+    Heart beat detection: the previous slope loop versus the NumPy bpm_points and the
+    batched bpm_points_batch over an ECGCorpus. That all three find the same beat indices
+    is tested in watchlib/analysis/tests/test_analysis_ecg_utils.py.
+
+    python benchmarks/bench_bpm_points.py --ecgs 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import bpm_points, bpm_points_batch
+from watchlib.analysis.analysis_utils import slopes_for
+from watchlib.data_handler import ECGCorpus
+
+
+def bpm_points_loop(ecg, a=50, d=180, r=3, slopes=None):
+    # bpm_points before it was vectorized
+    x, y = ecg.x, ecg.y
+    points = list(zip(x, y))
+    if slopes is None:
+        slopes = slopes_for(points)
+    bpm_points = [-d]
+    for idx, slope in enumerate(slopes):
+        if np.abs(slope) > a and np.abs(bpm_points[-1] - x[idx]) > d:
+            bpm_points.append(x[idx])
+    return bpm_points[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=100)
+    parser.add_argument("--seconds", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = write_ecgs(tmp, args.ecgs, args.seconds)
+        # One shorter ECG, the corpus pads it with NaN
+        write_ecgs(os.path.join(tmp, "short"), 1, args.seconds // 2, seed=args.ecgs)
+        os.replace(os.path.join(tmp, "short", "electrocardiograms", "ecg_0.csv"), os.path.join(folder, "short.csv"))
+        corpus = ECGCorpus.build(folder, os.path.join(tmp, "corpus"))
+        ecgs = list(corpus)
+
+        start = time.perf_counter()
+        for ecg in ecgs:
+            bpm_points_loop(ecg)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for ecg in ecgs:
+            bpm_points(ecg)
+        numpy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bpm_points_batch(corpus)
+        batch_time = time.perf_counter() - start
+
+    print(f"{len(ecgs)} ECGs x {args.seconds * 512} samples")
+    print(f"  loop:  {loop_time:7.3f} s")
+    print(f"  numpy: {numpy_time:7.3f} s  ({loop_time / numpy_time:6.1f}x)")
+    print(f"  batch: {batch_time:7.3f} s  ({loop_time / batch_time:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
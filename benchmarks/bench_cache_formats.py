@@ -0,0 +1,53 @@
+"""
+    Disk size and warm load time of the cached health data per cache backend.
+
+    python benchmarks/bench_cache_formats.py --records 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_export
+from watchlib.data_handler import CacheHandler, DataLoader
+
+
+def folder_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_export(folder, args.records)
+        data = DataLoader(folder).load_health_data()
+
+        for backend in ["csv", "columnar"]:
+            cache = CacheHandler(folder, backend=backend)
+            cache.delete_all_health_data_caches()
+
+            start = time.perf_counter()
+            cache.cache_health_data(data)
+            write_time = time.perf_counter() - start
+
+            load_times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                loaded = cache.load_health_data()
+                load_times.append(time.perf_counter() - start)
+            assert sorted(loaded) == sorted(data)
+
+            size_mb = folder_size(cache.cached_export_data_path) / 1024 ** 2
+            print(f"{backend:>9}: {size_mb:8.2f} MB  write {write_time:6.2f} s  warm load {min(load_times):6.3f} s")
+
+
+if __name__ == "__main__":
+    main()
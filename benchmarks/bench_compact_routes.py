@@ -0,0 +1,71 @@
+"""
+    Memory per point of routes held in memory: WorkoutRoutes backed by a DataFrame
+    (with ISO time strings as read from csv caches, and with datetime64 times) versus
+    CompactWorkoutRoute with float64 and float32 columns.
+
+    python benchmarks/bench_compact_routes.py --routes 500 --points 2000
+"""
+import argparse
+import gc
+import io
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_routes
+from watchlib.data_handler import DataLoader
+from watchlib.utils import CompactWorkoutRoute, WorkoutRoute
+
+
+def allocated(build):
+    gc.collect()
+    tracemalloc.start()
+    routes = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return routes, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=500)
+    parser.add_argument("--points", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_routes(folder, args.routes, args.points)
+        routes = DataLoader(folder).load_routes_seq()
+    csvs = [(route.name, route.route.assign(time=route.time.dt.strftime("%Y-%m-%dT%H:%M:%SZ")).to_csv(index=False))
+            for route in routes]
+    points = sum(len(route.route) for route in routes)
+
+    results = {}
+    _, results["DataFrame, string times"] = allocated(
+        lambda: [WorkoutRoute(pd.read_csv(io.StringIO(csv)), name) for name, csv in csvs])
+    typed, results["DataFrame, datetime64"] = allocated(
+        lambda: [WorkoutRoute(route.route.copy(), route.name) for route in routes])
+    compact, results["compact float64"] = allocated(
+        lambda: [CompactWorkoutRoute.from_route(route) for route in routes])
+    compact32, results["compact float32"] = allocated(
+        lambda: [CompactWorkoutRoute.from_route(route, float32=True) for route in routes])
+
+    for route, small, small32 in zip(typed, compact, compact32):
+        assert (route.start, route.end, route.duration_sec) == (small.start, small.end, small.duration_sec)
+        assert route.time.equals(small.time) and route.lon.equals(small.lon) and route.lat.equals(small.lat)
+        assert route.elevation.equals(small.elevation)
+        assert np.allclose(route.speed.to_numpy(), small32.speed.to_numpy(), equal_nan=True, rtol=1e-6)
+
+    print(f"{args.routes} routes x {args.points} points")
+    for name, size in results.items():
+        print(f"  {name:24s} {size / points:7.1f} bytes/point")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+    Size, speed and reconstruction error of the ECG codec compared to the csv exports
+    and to raw float32 samples (ECGCorpus), including decoding of sample ranges.
+    Fails if a decoded sample is off by more than the error bound of its ECG.
+
+    python benchmarks/bench_ecg_codec.py --ecgs 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.data_handler import ECGCodec
+from watchlib.utils import read_ecg_csv
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--resolution", type=float, default=None, help="uV, defaults to peak / 32767 per ECG")
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--range", type=int, default=512, help="samples decoded by the range reads")
+    args = parser.parse_args()
+
+    codec = ECGCodec(args.resolution, args.block_size)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = write_ecgs(tmp, args.ecgs, args.seconds)
+        csv_size = 0
+        ecgs = []
+        for filename in sorted(os.listdir(folder)):
+            path = os.path.join(folder, filename)
+            csv_size += os.path.getsize(path)
+            with open(path, "rb") as f:
+                ecgs.append(read_ecg_csv(f.read()))
+
+        start = time.perf_counter()
+        encoded = [codec.encode(values, meta_data) for values, meta_data in ecgs]
+        encode_time = time.perf_counter() - start
+
+        paths = []
+        for i, data in enumerate(encoded):
+            paths.append(os.path.join(tmp, f"ecg_{i}{codec.extension}"))
+            with open(paths[-1], "wb") as f:
+                f.write(data)
+
+        start = time.perf_counter()
+        decoded = [codec.read(path) for path in paths]
+        decode_time = time.perf_counter() - start
+
+        ranges = []
+        for values, _ in ecgs:
+            first = int(rng.integers(0, max(len(values) - args.range, 1)))
+            ranges.append((first, first + args.range))
+        start = time.perf_counter()
+        decoded_ranges = [codec.read(path, first, end)[0] for path, (first, end) in zip(paths, ranges)]
+        range_time = time.perf_counter() - start
+
+        worst = 0.0
+        worst_bound = 0.0
+        for (values, meta_data), data, (decoded_values, decoded_meta_data), part, (first, end) in zip(
+                ecgs, encoded, decoded, decoded_ranges, ranges):
+            bound = codec.error_bound(codec.step_for(values))
+            error = np.max(np.abs(decoded_values - values)) if len(values) else 0.0
+            assert error <= bound * (1 + 1e-9), (error, bound)
+            assert decoded_meta_data == meta_data
+            assert np.array_equal(part, decoded_values[first:end])
+            worst, worst_bound = max(worst, error), max(worst_bound, bound)
+
+    samples = sum(len(values) for values, _ in ecgs)
+    codec_size = sum(len(data) for data in encoded)
+    resolution = "peak / 32767" if args.resolution is None else f"{args.resolution} uV"
+    print(f"{args.ecgs} ECGs x {args.seconds * 512} samples, resolution {resolution}, "
+          f"blocks of {args.block_size} samples")
+    print(f"  csv:          {csv_size / 1e6:8.2f} MB")
+    print(f"  float32:      {samples * 4 / 1e6:8.2f} MB  ({csv_size / (samples * 4):5.1f}x)")
+    print(f"  codec:        {codec_size / 1e6:8.2f} MB  ({csv_size / codec_size:5.1f}x), "
+          f"{codec_size * 8 / samples:.2f} bits/sample")
+    print(f"  encode:       {args.ecgs / encode_time:8.1f} ECGs/sec")
+    print(f"  decode:       {args.ecgs / decode_time:8.1f} ECGs/sec")
+    print(f"  decode range: {args.ecgs / range_time:8.1f} ranges/sec ({args.range} samples)")
+    print(f"  max error:    {worst:.6f} uV (bound {worst_bound:.6f} uV)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+    Loading ECGs for analysis: parsing the csv files into ECG objects versus reopening
+    the memory-mapped ECGCorpus, and building an annoy index from both.
+
+    python benchmarks/bench_ecg_corpus.py --ecgs 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import annoy, query_annoy
+from watchlib.data_handler import CacheHandler, DataLoader, ECGCorpus
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--trees", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_ecgs(folder, args.ecgs, args.seconds)
+        cache = CacheHandler(folder)
+
+        ecgs, load_time = timed(lambda: sorted(DataLoader(folder).load_ecgs(), key=lambda ecg: ecg.name))
+        _, build_time = timed(cache.cache_ecgs)
+        corpus, open_time = timed(lambda: ECGCorpus(cache.cached_ecgs_path))
+
+        assert [ecg.name for ecg in ecgs] == corpus.names
+        for i, ecg in enumerate(ecgs):
+            assert np.array_equal(np.asarray(ecg.y, dtype=np.float32), corpus.values(i))
+
+        list_index, list_time = timed(lambda: annoy(ecgs, trees=args.trees))
+        corpus_index, corpus_time = timed(lambda: annoy(corpus, trees=args.trees))
+        assert query_annoy(list_index, 0, 10) == query_annoy(corpus_index, 0, 10)
+
+    print(f"{args.ecgs} ECGs x {args.seconds * 512} samples")
+    print(f"  load csv files:    {load_time:7.3f} s")
+    print(f"  build corpus:      {build_time:7.3f} s")
+    print(f"  reopen corpus:     {open_time:7.3f} s  ({load_time / open_time:7.1f}x)")
+    print(f"  annoy from ECGs:   {list_time:7.3f} s")
+    print(f"  annoy from corpus: {corpus_time:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
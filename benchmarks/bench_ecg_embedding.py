@@ -0,0 +1,87 @@
+"""
+    PCA embeddings of an ECGCorpus: the old PCA of annoy_with_pca (min(n_ecgs, n_samples)
+    components fitted on all rows) versus ECGEmbedding with a fixed number of components,
+    fitted incrementally from the mapped corpus or with a randomized solver. Reports fit
+    time, peak Python memory and the explained variance.
+
+    python benchmarks/bench_ecg_embedding.py --ecgs 1000 --components 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import ECGEmbedding, ECGIndex, ecg_matrix
+from watchlib.data_handler import ECGCorpus
+
+
+def measured(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=500)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--components", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=128)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ECGCorpus.build(write_ecgs(tmp, args.ecgs, args.seconds), os.path.join(tmp, "corpus"))
+        n_features = corpus.min_length
+
+        def full_pca():
+            # annoy_with_pca before it used ECGEmbedding
+            ecg_data = ecg_matrix(list(corpus), 0, n_features)
+            return PCA(n_components=min(len(corpus), n_features)).fit(ecg_data)
+
+        full, full_time, full_memory = measured(full_pca)
+        incremental, incremental_time, incremental_memory = measured(
+            lambda: ECGEmbedding(args.components, batch_size=args.batch_size).fit(corpus))
+        randomized, randomized_time, randomized_memory = measured(
+            lambda: ECGEmbedding(args.components, solver="randomized").fit(corpus))
+
+        # Saved embeddings transform new ECGs without fitting again
+        path = os.path.join(tmp, "embedding.npz")
+        incremental.save(path)
+        loaded = ECGEmbedding.load(path)
+        embedding = incremental.transform(corpus)
+        assert np.allclose(loaded.transform(corpus), embedding)
+        assert np.allclose(loaded.transform(corpus[5]), embedding[5], rtol=1e-4, atol=1e-2)
+
+        # Batches read one at a time fit the same projection as the corpus
+        batches = (corpus.samples[start:start + args.batch_size] for start in range(0, len(corpus), args.batch_size))
+        streamed = ECGEmbedding(args.components, batch_size=args.batch_size, _to=n_features).fit(batches)
+        if len(corpus) % args.batch_size >= args.components:
+            assert np.allclose(streamed.projection, incremental.projection)
+
+        index = ECGIndex(os.path.join(tmp, "index"), method="pca", components=args.components, trees=10).ensure(corpus)
+        assert index.query_ecg(corpus[5], 1) == [5]
+
+    top = full.explained_variance_ratio_[:args.components].sum()
+    print(f"{args.ecgs} ECGs x {n_features} samples, {args.components} components")
+    print(f"  full PCA ({len(full.components_)} components): {full_time:7.3f} s {full_memory:8.1f} MiB, "
+          f"top {args.components} explain {top:.3f}")
+    print(f"  incremental:                 {incremental_time:7.3f} s {incremental_memory:8.1f} MiB, "
+          f"explain {incremental.explained_variance_ratio.sum():.3f}")
+    print(f"  randomized:                  {randomized_time:7.3f} s {randomized_memory:8.1f} MiB, "
+          f"explain {randomized.explained_variance_ratio.sum():.3f}")
+
+
+if __name__ == "__main__":
+    main()
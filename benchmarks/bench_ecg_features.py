@@ -0,0 +1,79 @@
+"""
+    ECG feature table: calling bpm, heart_rate_variability and heart_rate_variability_pairwise
+    per ECG (three detections each) versus ECGFeatures, which detects the heart beats once per
+    ECG, and once per corpus in a single batch. Fails unless all features agree.
+
+    python benchmarks/bench_ecg_features.py --ecgs 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import (ECGFeatures, bpm, heart_rate_variability, heart_rate_variability_pairwise,
+                               split_around_heartbeats, split_between_heartbeats)
+from watchlib.data_handler import ECGCorpus
+
+
+def separate_features(ecgs):
+    # ecg_distributions before ECGFeatures
+    with warnings.catch_warnings():
+        # mean of an empty list for ECGs without enough beats
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return [(bpm(ecg), heart_rate_variability(ecg), heart_rate_variability_pairwise(ecg)) for ecg in ecgs]
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=100)
+    parser.add_argument("--seconds", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = write_ecgs(tmp, args.ecgs, args.seconds)
+        corpus = ECGCorpus.build(folder, os.path.join(tmp, "corpus"))
+        ecgs = list(corpus)
+
+        expected, separate_time = timed(lambda: separate_features(ecgs))
+        table, list_time = timed(lambda: ECGFeatures().feature_table(ecgs))
+        corpus_table, corpus_time = timed(lambda: ECGFeatures().feature_table(corpus))
+
+        for t in (table, corpus_table):
+            assert t["name"].tolist() == corpus.names
+            assert np.allclose(t[["bpm", "hrv", "hrv_pairwise"]].to_numpy(), expected, rtol=1e-12, equal_nan=True)
+
+        # Memoized ECGs are not detected again, the least recently used ones are evicted
+        features = ECGFeatures(cache_size=args.ecgs // 2)
+        features.feature_table(ecgs)
+        assert len(features) == args.ecgs // 2 and features.misses == args.ecgs
+        _, cached_time = timed(lambda: features.feature_table(ecgs[-(args.ecgs // 2):]))
+        assert features.hits == args.ecgs // 2 and features.misses == args.ecgs
+        features.feature_table(corpus)
+        assert features.misses == args.ecgs + args.ecgs // 2
+
+        ecg = ecgs[0]
+        assert features.split_between_heartbeats(ecg) == split_between_heartbeats(ecg)
+        assert features.split_around_heartbeats(ecg) == split_around_heartbeats(ecg)
+
+    print(f"{args.ecgs} ECGs x {args.seconds * 512} samples")
+    print(f"  bpm + hrv + hrv_pairwise:   {separate_time:7.3f} s")
+    print(f"  feature_table of ECGs:      {list_time:7.3f} s  ({separate_time / list_time:5.1f}x)")
+    print(f"  feature_table of corpus:    {corpus_time:7.3f} s  ({separate_time / corpus_time:5.1f}x)")
+    print(f"  memoized half of the ECGs:  {cached_time:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+    Saved ECGIndex: building an annoy index with the tuned number of trees versus reopening
+    it (also from another process) and the old annoy(..., trees=10000) rebuild. An added ECG
+    changes the fingerprint and triggers a rebuild, a rewritten corpus with the same samples
+    is hashed once and then reopened by the signature of its sample file.
+
+    python benchmarks/bench_ecg_index.py --ecgs 500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import write_ecgs
+from watchlib.analysis import ECGIndex, annoy, tune_trees
+from watchlib.data_handler import CacheHandler
+from watchlib.utils import ECG
+
+REOPEN = """
+import sys, time
+sys.path.insert(0, {root!r})
+from watchlib.analysis import ECGIndex
+start = time.perf_counter()
+index = ECGIndex({path!r}).load()
+print(time.perf_counter() - start, *index.query(0, 10))
+"""
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--old-trees", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_ecgs(folder, args.ecgs, args.seconds)
+        cache = CacheHandler(folder)
+        corpus = cache.cache_ecgs()
+
+        _, old_time = timed(lambda: annoy(corpus, trees=args.old_trees))
+
+        for method in ("annoy", "pca"):
+            index = ECGIndex(cache.ecg_index_path, method=method)
+            _, build_time = timed(lambda: index.ensure(corpus))
+            assert index.is_current(corpus) and len(index) == len(corpus)
+            _, reopen_time = timed(lambda: ECGIndex(cache.ecg_index_path, method=method).ensure(corpus))
+            _, load_time = timed(lambda: ECGIndex(cache.ecg_index_path).load())
+
+            # The item vector of an ECG is the transform of its samples
+            vector = np.array(index.index.get_item_vector(3))
+            assert np.allclose(vector, index.transform(corpus.values(3)), rtol=1e-3, atol=1e-2)
+            assert index.query_ecg(corpus[3], 1) == [3]
+            assert index.query_names(corpus.names[3], 1) == [corpus.names[3]]
+
+            print(f"{method}: {args.ecgs} ECGs, {index.meta['dimension']} dimensions, {index.meta['built_trees']} trees")
+            for row in index.meta["tuning"]:
+                print(f"  tuning {row['trees']:5d} trees: recall {row['recall']:.3f}, build {row['build_time']:.3f} s")
+            print(f"  annoy(trees={args.old_trees}):  {old_time:7.3f} s")
+            print(f"  build and save:        {build_time:7.3f} s")
+            print(f"  ensure unchanged:      {reopen_time:7.3f} s")
+            print(f"  load:                  {load_time:7.3f} s")
+
+        output = subprocess.run([sys.executable, "-c", REOPEN.format(root=ROOT, path=cache.ecg_index_path)],
+                                capture_output=True, text=True, check=True, cwd=tmp).stdout.split()
+        assert [int(i) for i in output[1:]] == index.query(0, 10)
+        print(f"  load in another process: {float(output[0]):7.3f} s")
+
+        # One more ECG changes the fingerprint
+        write_ecgs(os.path.join(tmp, "more"), 1, args.seconds, seed=args.ecgs)
+        os.replace(os.path.join(tmp, "more", "electrocardiograms", "ecg_0.csv"),
+                   os.path.join(cache.ecg_path, "ecg_new.csv"))
+        corpus = cache.cache_ecgs()
+        assert not index.is_current(corpus)
+        index.ensure(corpus)
+        assert len(index) == len(corpus) and index.is_current(corpus)
+
+        # The same samples in a rewritten corpus are hashed once, then reopened by the file signature
+        corpus = cache.cache_ecgs()
+        _, rewritten_time = timed(lambda: index.ensure(corpus))
+        _, signature_time = timed(lambda: ECGIndex(cache.ecg_index_path, method="pca").ensure(corpus))
+        stat = os.stat(os.path.join(corpus.path, corpus.SAMPLES))
+        assert index.meta["samples_file"] == [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+        assert index.meta["fingerprint"] == index.fingerprint(corpus)
+        print(f"  ensure rewritten corpus: {rewritten_time:7.3f} s, unchanged file: {signature_time:7.3f} s")
+
+        short = ECG.from_values(corpus.values(0)[:index.meta["window"][1] - 1], corpus.meta_data[0], "short")
+        try:
+            index.query_ecg(short, 1)
+            raise AssertionError("ECGs shorter than the window have to be rejected")
+        except ValueError:
+            pass
+
+    # Queries are not their own neighbours
+    vectors = np.random.default_rng(0).normal(size=(500, 32)).astype(np.float32)
+    tuning = tune_trees(vectors, [1, 4, 16], queries=50)
+    assert tuning["build_time"].is_monotonic_increasing and tuning["recall"].iloc[0] < 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+    ECG csv parsing throughput in ECGs/sec: the previous line by line parser versus
+    read_ecg_csv, for exports with decimal points and with decimal commas.
+
+    python benchmarks/bench_ecg_parser.py --ecgs 200 --seconds 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.utils import read_ecg_csv
+
+
+def read_ecg_lines(ecg: str):
+    # Parser of ECG.__read_ecg / ECGReader.read_ecg before read_ecg_csv
+    data = ecg.split("\n")
+    meta_data = {}
+    for m in data[:12]:
+        if m != "" and "," in m:
+            x = m.split(",")
+            if len(x) == 3:
+                meta_data[x[0]] = x[1] + "." + x[2]
+            else:
+                meta_data[x[0]] = x[1]
+    values = []
+    for d in data[13:]:
+        if d != "":
+            values.append(float(d.replace(",", ".")))
+    return values, meta_data
+
+
+def throughput(parse, contents, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for content in contents:
+            parse(content)
+        best = min(best, time.perf_counter() - start)
+    return len(contents) / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.ecgs} ECGs x {args.seconds * 512} samples")
+    for decimal_comma in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = write_ecgs(tmp, args.ecgs, args.seconds, decimal_comma=decimal_comma)
+            contents = []
+            for filename in sorted(os.listdir(folder)):
+                with open(os.path.join(folder, filename), "r", encoding="utf-8") as f:
+                    contents.append(f.read())
+
+        for content in contents:
+            values, meta_data = read_ecg_csv(content)
+            expected_values, expected_meta_data = read_ecg_lines(content)
+            assert np.array_equal(values, expected_values) and meta_data == expected_meta_data
+
+        lines = throughput(read_ecg_lines, contents, args.repeat)
+        bulk = throughput(read_ecg_csv, contents, args.repeat)
+        print(f"  decimal {'comma' if decimal_comma else 'point'}")
+        print(f"    line by line: {lines:8.1f} ECGs/sec")
+        print(f"    read_ecg_csv: {bulk:8.1f} ECGs/sec  ({bulk / lines:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+    Resampling a corpus to a common sample rate and length: resample_ecgs (one batched FFT
+    per group of equally long ECGs) versus resampling ECG by ECG, and the aliasing of the
+    plain [::res] stride (what annoy_with_interpolation used to do) versus the low-pass of fft_resample.
+
+    python benchmarks/bench_ecg_resampling.py --ecgs 500 --rate 128
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecg, write_ecgs
+from watchlib.analysis import fft_resample, resample_ecgs
+from watchlib.data_handler import ECGCorpus
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=128)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = write_ecgs(tmp, args.ecgs, args.seconds)
+        # A short ECG and one recorded with another sample rate
+        write_ecg(os.path.join(folder, "short.csv"), seconds=args.seconds // 3, seed=args.ecgs)
+        write_ecg(os.path.join(folder, "rate.csv"), seconds=args.seconds, sample_rate=300, seed=args.ecgs + 1)
+        corpus = ECGCorpus.build(folder, os.path.join(tmp, "corpus"))
+        ecgs = list(corpus)
+
+        resampled, batch_time = timed(lambda: resample_ecgs(corpus, args.rate))
+        n_samples = int(round(args.seconds * args.rate))
+        assert resampled.shape == (len(corpus), n_samples) and not np.isnan(resampled).any()
+        assert np.array_equal(resample_ecgs(ecgs, args.rate), resampled)
+
+        def one_by_one():
+            rows = []
+            for i in range(len(corpus)):
+                rate = corpus.metadata["sample_rate"][i]
+                values = corpus.values(i)
+                width = n_samples if len(values) == round(args.seconds * rate) else int(round(len(values) * args.rate / rate))
+                row = np.zeros(n_samples, dtype=np.float32)
+                row[:width] = fft_resample(values, width)
+                rows.append(row)
+            return np.stack(rows)
+
+        expected, loop_time = timed(one_by_one)
+        assert np.allclose(resampled, expected, atol=1e-3)
+        short = corpus.positions["short.csv"]
+        assert np.all(resampled[short, n_samples // 3 + 1:] == 0)
+
+        try:
+            from scipy.signal import resample
+            assert np.allclose(resampled[0], resample(corpus.values(0).astype(np.float64), n_samples), atol=1e-3)
+        except ImportError:
+            pass
+
+        window = resample_ecgs(corpus, args.rate, duration=5, offset=10)
+        assert window.shape == (len(corpus), int(round(5 * args.rate)))
+
+    # A 100 Hz tone sampled at 512 Hz: above the Nyquist frequency of the target rate
+    t = np.arange(args.seconds * 512) / 512
+    tone = np.sin(2 * np.pi * 100 * t)
+    res = int(512 // args.rate)
+    strided, filtered = tone[::res], fft_resample(tone, len(tone) // res)
+
+    print(f"{len(corpus)} ECGs to {args.rate:g} Hz x {args.seconds} s")
+    print(f"  ECG by ECG:    {loop_time:7.3f} s")
+    print(f"  resample_ecgs: {batch_time:7.3f} s  ({loop_time / batch_time:5.1f}x)")
+    print(f"  100 Hz tone RMS after [::{res}]: {np.sqrt(np.mean(strided ** 2)):.3f}, "
+          f"after fft_resample: {np.sqrt(np.mean(filtered ** 2)):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+    ECG similarity search: build time, query latency and recall@k of every annoy variant of
+    watchlib.analysis.annoy against the exact ExactIndex over the same item vectors.
+
+    python benchmarks/bench_ecg_search.py --ecgs 1000 --trees 10 100 --k 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs
+from watchlib.analysis import ExactIndex, annoy, annoy_with_interpolation, annoy_with_pca, exact, query_annoy
+from watchlib.data_handler import ECGCorpus
+
+VARIANTS = {
+    "annoy": annoy,
+    "annoy_with_interpolation": annoy_with_interpolation,
+    "annoy_with_pca": annoy_with_pca,
+}
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def check_exact(vectors: np.ndarray, k: int):
+    # Blocks merged across block boundaries give the same result as a full sort
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarities = normalized[:20] @ normalized.T
+    expected = np.argsort(-similarities, axis=1, kind="stable")[:, :k]
+    for block_size in (7, len(vectors)):
+        items, _ = ExactIndex.from_matrix(vectors, block_size=block_size).nns_by_items(np.arange(20), k)
+        assert np.array_equal(items, expected)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ecgs", type=int, default=300)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--trees", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ECGCorpus.build(write_ecgs(tmp, args.ecgs, args.seconds), os.path.join(tmp, "corpus"))
+        queries = np.random.default_rng(0).choice(len(corpus), size=min(args.queries, len(corpus)), replace=False)
+
+        t, build_time = timed(lambda: exact(corpus))
+        check_exact(np.asarray(corpus.matrix(), dtype=np.float32), args.k)
+        assert query_annoy(t, 0, 1) == [0]
+        try:
+            exact(corpus, _to=corpus.min_length + 1)
+            raise AssertionError("a window past the shortest ECG must not be indexed")
+        except ValueError:
+            pass
+        _, query_time = timed(lambda: t.nns_by_items(queries, args.k))
+
+        print(f"{len(corpus)} ECGs x {args.seconds * 512} samples, {len(queries)} queries, recall@{args.k}")
+        print(f"  {'variant':40s} {'build s':>8s} {'query ms':>9s} {'recall':>7s}")
+        print(f"  {'exact (batched)':40s} {build_time:8.3f} {1000 * query_time / len(queries):9.3f} {1:7.3f}")
+
+        for name, variant in VARIANTS.items():
+            for trees in args.trees:
+                t, build_time = timed(lambda: variant(corpus, trees=trees))
+                # Exact search in the space of the variant, e.g. over its principal components
+                vectors = np.array([t.get_item_vector(i) for i in range(t.get_n_items())], dtype=np.float32)
+                expected, _ = ExactIndex.from_matrix(vectors).nns_by_items(queries, args.k)
+
+                found, query_time = timed(lambda: [query_annoy(t, int(q), args.k) for q in queries])
+                recall = np.mean([len(set(f) & set(e.tolist())) / args.k for f, e in zip(found, expected)])
+                label = f"{name} ({trees} trees)"
+                print(f"  {label:40s} {build_time:8.3f} {1000 * query_time / len(queries):9.3f} {recall:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+    StreamingBeatDetector fed in chunks of random size: the time per chunk. That the beats,
+    bpm and hrv equal bpm_points, bpm and heart_rate_variability of the whole recording and
+    the rolling values those of the last window is tested in
+    watchlib/analysis/tests/test_ecg_stream.py.
+
+    python benchmarks/bench_ecg_stream.py --minutes 10 --chunk 256
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecg
+from watchlib.analysis import StreamingBeatDetector
+from watchlib.utils import read_ecg_csv
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=5)
+    parser.add_argument("--chunk", type=int, default=256, help="mean chunk size in samples")
+    parser.add_argument("--window", type=float, default=30, help="rolling window in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_ecg(os.path.join(tmp, "ecg.csv"), seconds=int(args.minutes * 60))
+        with open(path, "rb") as f:
+            values, _ = read_ecg_csv(f.read())
+
+    rng = np.random.default_rng(0)
+    # Chunks of 0 to 2 * chunk samples, including single samples
+    sizes = rng.integers(0, 2 * args.chunk + 1, size=2 * len(values) // args.chunk + 1)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    bounds = np.concatenate((bounds[bounds < len(values)], [len(values)]))
+
+    detector = StreamingBeatDetector(window=args.window)
+    beats, times = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        t = time.perf_counter()
+        beats.extend(detector.push(values[start:end]).tolist())
+        times.append(time.perf_counter() - t)
+
+    times = np.array(times) * 1000
+    print(f"{args.minutes:g} min, {len(values)} samples, {len(beats)} beats, {len(times)} chunks")
+    print(f"  bpm {detector.bpm:.2f}, hrv {detector.hrv:.2f}, "
+          f"rolling bpm {detector.rolling_bpm:.2f}, rolling hrv {detector.rolling_hrv:.2f}")
+    print(f"  per chunk: median {np.median(times):.3f} ms, p99 {np.percentile(times, 99):.3f} ms, max {times.max():.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
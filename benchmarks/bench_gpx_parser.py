@@ -0,0 +1,84 @@
+"""
+    Parses a synthetic GPX workout route with the previous per trkpt find() loop and
+    with read_gpx (from the file content and from a parsed element tree).
+
+    python benchmarks/bench_gpx_parser.py --points 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_gpx
+from watchlib.utils.gpx import GPX_COLUMNS, read_gpx
+
+
+def read_route_find(root: ET.Element) -> pd.DataFrame:
+    # Previous WorkoutRoute.__read_route
+    ns = {"gpx": "http://www.topografix.com/GPX/1/1"}
+    data = {column: [] for column in GPX_COLUMNS}
+    for track in root.findall("gpx:trk", ns):
+        for track_segment in track.findall("gpx:trkseg", ns):
+            for track_point in track_segment.findall("gpx:trkpt", ns):
+                extension = track_point.find("gpx:extensions", ns)
+                data["lon"].append(float(track_point.get("lon")))
+                data["lat"].append(float(track_point.get("lat")))
+                data["elevation"].append(float(track_point.find("gpx:ele", ns).text))
+                data["time"].append(track_point.find("gpx:time", ns).text)
+                data["speed"].append(float(extension.find("gpx:speed", ns).text))
+                data["course"].append(float(extension.find("gpx:course", ns).text))
+                data["hAcc"].append(float(extension.find("gpx:hAcc", ns).text))
+                data["vAcc"].append(float(extension.find("gpx:vAcc", ns).text))
+    return pd.DataFrame(data)
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_gpx(os.path.join(tmp, "route.gpx"), args.points)
+
+        old, old_time = timed(lambda: read_route_find(ET.parse(path).getroot()))
+        new, new_time = timed(read_gpx, path)
+        tree, tree_time = timed(lambda: read_gpx(ET.parse(path).getroot()))
+
+        expected_time = pd.to_datetime(old["time"], format="%Y-%m-%dT%H:%M:%SZ").to_numpy()
+        for points in (new, tree):
+            assert np.array_equal(points["time"].astype("datetime64[ns]"), expected_time)
+            for column in GPX_COLUMNS:
+                if column != "time":
+                    assert np.array_equal(points[column], old[column].to_numpy()), column
+
+        print(f"{args.points} track points")
+        print(f"  find() loop:        {old_time:7.3f} s")
+        print(f"  read_gpx(path):     {new_time:7.3f} s  ({old_time / new_time:5.1f}x)")
+        print(f"  read_gpx(element):  {tree_time:7.3f} s  ({old_time / tree_time:5.1f}x, incl. ET.parse)")
+
+        # Points without <extensions> keep NaN for speed, course, hAcc and vAcc
+        path = write_gpx(os.path.join(tmp, "partial.gpx"), args.points, missing_extensions=0.1)
+        partial, partial_time = timed(read_gpx, path)
+        partial_tree = read_gpx(ET.parse(path).getroot())
+        missing = np.isnan(partial["speed"])
+        for column in GPX_COLUMNS:
+            assert np.array_equal(partial[column], partial_tree[column], equal_nan=column != "time") or \
+                np.array_equal(partial[column], partial_tree[column]), column
+        print(f"  read_gpx(path), {missing.mean():.0%} points without extensions: {partial_time:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+    Compares DataLoader.load_health_data in tree and streaming mode.
+
+    Every mode runs in a fresh interpreter so the reported peak RSS belongs to
+    that mode only.
+
+    python benchmarks/bench_health_data.py --records 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_mode(path: str, streaming: bool):
+    from watchlib.data_handler import DataLoader
+
+    start = time.perf_counter()
+    data = DataLoader(path).load_health_data(streaming=streaming)
+    elapsed = time.perf_counter() - start
+
+    rows = sum(len(df) for df in data.values())
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"rows": rows, "seconds": elapsed, "peak_mb": peak_mb}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=500_000)
+    parser.add_argument("--child", choices=["tree", "streaming"])
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.path, args.child == "streaming")
+        return
+
+    from synthetic import write_export
+
+    with tempfile.TemporaryDirectory() as folder:
+        export = write_export(folder, args.records)
+        size_mb = os.path.getsize(export) / 1024 ** 2
+        print(f"Export.xml: {args.records} records, {size_mb:.1f} MB")
+
+        for mode in ["tree", "streaming"]:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--path", folder],
+                check=True, capture_output=True, text=True, cwd=folder
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:>10}: {result['seconds']:7.2f} s  "
+                  f"{result['rows'] / result['seconds']:10.0f} records/s  "
+                  f"peak RSS {result['peak_mb']:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+    Pairwise heart rate variability of long recordings: the previous nested loop versus
+    the sort-based mean_hrv_pairwise, the vectorized hrvs_pairwise and the streaming
+    iter_hrvs_pairwise. Fails unless all of them agree with the loop.
+
+    python benchmarks/bench_hrv_pairwise.py --minutes 1 5 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecg
+from watchlib.analysis import heartbeat_distances_ms, hrvs_pairwise, iter_hrvs_pairwise, mean_hrv_pairwise
+from watchlib.utils import read_ecg_csv
+from watchlib.utils.structs import ECG
+
+
+def hrvs_pairwise_loop(ecg):
+    # hrvs_pairwise before it was vectorized
+    dist = heartbeat_distances_ms(ecg)
+    hrvs = []
+    for i in range(0, len(dist) - 1):
+        for j in range(i, len(dist) - 1):
+            hrvs.append(np.abs(dist[i] - dist[j]))
+    return hrvs
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 5, 20])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in args.minutes:
+            path = write_ecg(os.path.join(tmp, "ecg.csv"), seconds=int(minutes * 60))
+            with open(path, "rb") as f:
+                ecg = ECG.from_values(*read_ecg_csv(f.read()), name="ecg")
+
+            expected, loop_time = timed(lambda: hrvs_pairwise_loop(ecg))
+            pairs, pairs_time = timed(lambda: hrvs_pairwise(ecg))
+            streamed, stream_time = timed(lambda: sum(iter_hrvs_pairwise(ecg)))
+            mean, mean_time = timed(lambda: mean_hrv_pairwise(ecg))
+
+            assert pairs == expected
+            assert streamed == sum(expected)
+            assert mean == np.mean(expected)
+
+            beats = len(heartbeat_distances_ms(ecg)) + 1
+            print(f"{minutes:g} min, {beats} beats, {len(expected)} pairs")
+            print(f"  loop:               {loop_time:8.4f} s")
+            print(f"  hrvs_pairwise:      {pairs_time:8.4f} s  ({loop_time / pairs_time:7.1f}x)")
+            print(f"  iter_hrvs_pairwise: {stream_time:8.4f} s  ({loop_time / stream_time:7.1f}x)")
+            print(f"  mean_hrv_pairwise:  {mean_time:8.4f} s  ({loop_time / mean_time:7.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
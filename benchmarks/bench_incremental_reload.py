@@ -0,0 +1,76 @@
+"""
+    Reloading the watchml cache after new data was appended to Export.xml: a full
+    rebuild versus WatchManager.reload_data(incremental=True), which only checks the
+    raw lines of the old elements and parses the new ones.
+
+    python benchmarks/bench_incremental_reload.py --records 500000 --new 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime as dt, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "watchml", "src"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import record_line, write_export, write_gpx
+from watchml.file.manager import WatchManager
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def export(folder: str, records: int, workouts: int):
+    write_export(folder, records, workouts)
+    os.makedirs(os.path.join(folder, "workout-routes"), exist_ok=True)
+    for i in range(workouts + 1):
+        write_gpx(os.path.join(folder, "workout-routes", f"route_{i}.gpx"), 100, seed=i)
+
+
+def append_records(path: str, records: int, new: int):
+    # New records after the last one of write_export(records), the old lines stay the same
+    with open(path, "r", encoding="utf-8") as f:
+        body = f.read().rsplit("</HealthData>", 1)[0]
+    rng = random.Random(records)
+    start = dt(2018, 1, 1) + timedelta(minutes=5) * records
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+        for i in range(new):
+            f.write(record_line(rng, start + timedelta(minutes=5) * i))
+        f.write("</HealthData>\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--new", type=int, default=2_000)
+    parser.add_argument("--workouts", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "export")
+        export(folder, args.records, args.workouts)
+        manager = WatchManager(folder, os.path.join(tmp, "cache"))
+        manager.reload_data()
+
+        append_records(os.path.join(folder, "Export.xml"), args.records, args.new)
+        _, incremental_time = timed(lambda: manager.reload_data(incremental=True))
+        counts = manager.read_cache_info()["export"]["counts"]
+
+        rebuilt = WatchManager(folder, os.path.join(tmp, "rebuilt"))
+        _, full_time = timed(rebuilt.reload_data)
+        assert counts == rebuilt.read_cache_info()["export"]["counts"]
+
+    print(f"{args.records} records + {args.new} new, {args.workouts} workouts")
+    print(f"  full rebuild:        {full_time:7.3f} s")
+    print(f"  incremental reload:  {incremental_time:7.3f} s  ({full_time / incremental_time:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+    Listing and filtering cached routes: routes loaded from the RouteStore versus lazy
+    routes built from the stored route summaries, which never read a point.
+
+    python benchmarks/bench_lazy_routes.py --routes 10000 --points 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_routes
+from watchlib.data_handler import CacheHandler, DataLoader
+from watchlib.filtering import CountryFilter, DiagonalBBoxFilter, TimeFilter
+
+
+def list_and_filter(routes):
+    routes = sorted(routes, key=lambda route: route.start)
+    routes = DiagonalBBoxFilter(0.1).filter(routes)
+    routes = CountryFilter(CountryFilter.countries["Germany"]).filter(routes)
+    routes = TimeFilter(min_duration_sec=0, max_duration_sec=10 ** 6).filter(routes)
+    distance = sum(route.distance for route in routes)
+    return [route.name for route in routes], distance
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_routes(folder, args.routes, args.points)
+        cache = CacheHandler(folder)
+        cache.cache_routes(DataLoader(folder).load_routes_seq())
+
+        start = time.perf_counter()
+        names, distance = list_and_filter(cache.load_routes())
+        eager_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lazy_routes = cache.load_routes(lazy=True)
+        lazy_names, lazy_distance = list_and_filter(lazy_routes)
+        lazy_time = time.perf_counter() - start
+
+        assert lazy_names == names
+        assert np.isclose(lazy_distance, distance)
+        assert not any(route.loaded for route in lazy_routes)
+
+        print(f"{args.routes} routes x {args.points} points, {len(names)} pass the filters")
+        print(f"  routes:      {eager_time:7.3f} s")
+        print(f"  lazy routes: {lazy_time:7.3f} s  ({eager_time / lazy_time:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+    Loading workout routes and ECGs sequentially versus with the persistent LoaderPool
+    of a DataLoader (chunked tasks, results returned through shared memory).
+    The pool is reused, so only the first parallel run pays for starting the workers.
+
+    python benchmarks/bench_loader_pool.py --routes 2000 --points 1000 --ecgs 300 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_ecgs, write_routes
+from watchlib.data_handler import DataLoader, LoaderPool
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--ecgs", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_routes(folder, args.routes, args.points)
+        write_ecgs(folder, args.ecgs)
+
+        with LoaderPool(args.workers, args.chunk_size) as pool:
+            loader = DataLoader(folder, pool=pool)
+
+            routes, seq_time = timed(loader.load_routes_seq, args.repeat)
+            par_routes, par_time = timed(loader.load_routes_par, args.repeat)
+            for route, par_route in zip(routes, par_routes):
+                assert route.name == par_route.name
+                assert route.route.equals(par_route.route)
+                assert (route.start, route.end) == (par_route.start, par_route.end)
+
+            ecgs, ecg_seq_time = timed(lambda: loader.load_ecgs(parallel=False), args.repeat)
+            par_ecgs, ecg_par_time = timed(lambda: loader.load_ecgs(parallel=True), args.repeat)
+            for ecg, par_ecg in zip(ecgs, par_ecgs):
+                assert ecg.name == par_ecg.name and ecg.meta_data == par_ecg.meta_data
+                assert np.array_equal(ecg.y, par_ecg.y)
+
+    print(f"{args.routes} routes x {args.points} points, {args.ecgs} ECGs, "
+          f"{args.workers} workers, chunks of {args.chunk_size} files")
+    print(f"  routes sequential: {seq_time:7.3f} s")
+    print(f"  routes pool:       {par_time:7.3f} s  ({seq_time / par_time:5.1f}x)")
+    print(f"  ECGs sequential:   {ecg_seq_time:7.3f} s")
+    print(f"  ECGs pool:         {ecg_par_time:7.3f} s  ({ecg_seq_time / ecg_par_time:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
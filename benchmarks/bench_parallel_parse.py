@@ -0,0 +1,44 @@
+"""
+    Scaling of the sharded Export.xml parser over the number of worker processes. That
+    every worker count gives the sequential result is tested in
+    watchlib/data_handler/tests/test_export_parser.py.
+
+    python benchmarks/bench_parallel_parse.py --records 1000000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_export
+from watchlib.data_handler import DataLoader
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_export(folder, args.records)
+        loader = DataLoader(folder)
+
+        baseline_time = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            data = loader.load_health_data(workers=workers)
+            elapsed = time.perf_counter() - start
+
+            if baseline_time is None:
+                baseline_time = elapsed
+
+            print(f"workers={workers:>3}: {elapsed:7.2f} s  "
+                  f"{args.records / elapsed:10.0f} records/s  speedup {baseline_time / elapsed:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+    Writes the per type record files of watchml with the old boolean mask per
+    record type and with RecordPartitionWriter (single group-by pass, threads).
+
+    python benchmarks/bench_record_partitions.py --records 2000000 --types 80
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "watchml", "src"))
+
+from watchml.file.records import RECORD_COLUMNS, RecordPartitionWriter, read_manifest, typed_records
+from watchlib.data_handler.cache_backend import get_cache_backend
+
+
+def record_frame(records: int, types: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2018-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 5 * 365 * 24 * 3600, records)), unit="s")
+    dates = start.strftime("%Y-%m-%d %H:%M:%S") + " +0100"
+    df = pd.DataFrame({
+        "type": np.array([f"HKQuantityTypeIdentifier{i}" for i in range(types)])[rng.integers(0, types, records)],
+        "sourceName": "Watch",
+        "sourceVersion": "9.0",
+        "unit": "count/min",
+        "creationDate": dates,
+        "startDate": dates,
+        "endDate": dates,
+        "value": rng.normal(70, 10, records).round(1),
+        "device": None,
+    })
+    return df[RECORD_COLUMNS]
+
+
+def write_masks(df: pd.DataFrame, path: Path, backend):
+    # Previous WatchWriter.write_record_files: one full scan per record type
+    for record_type in df["type"].unique():
+        sub_df = df.loc[df["type"] == record_type]
+        if backend.name != "csv":
+            sub_df = typed_records(sub_df)
+        backend.write(sub_df, str(path / f"{record_type}{backend.extension}"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--types", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--backend", default="columnar")
+    args = parser.parse_args()
+
+    df = record_frame(args.records, args.types)
+    backend = get_cache_backend(args.backend)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        masks_path = Path(tmp) / "masks"
+        masks_path.mkdir()
+        start = time.perf_counter()
+        write_masks(df, masks_path, backend)
+        print(f"{'masks':>22}: {time.perf_counter() - start:6.2f} s")
+
+        for partition_by in [None, "year", "month"]:
+            for workers in sorted({1, args.workers}):
+                path = Path(tmp) / f"{partition_by}_{workers}"
+                path.mkdir()
+                writer = RecordPartitionWriter(path, backend=backend, partition_by=partition_by, workers=workers)
+                start = time.perf_counter()
+                writer.write(df)
+                elapsed = time.perf_counter() - start
+                assert sum(entry["rows"] for entry in read_manifest(path)) == len(df)
+                print(f"{str(partition_by) + ' x' + str(workers):>22}: {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
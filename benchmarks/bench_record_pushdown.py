@@ -0,0 +1,50 @@
+"""
+    Cost of a selective ingest compared to a full one.
+
+    python benchmarks/bench_record_pushdown.py --records 1000000 --types HeartRate StepCount
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_export
+from watchlib.data_handler import DataLoader
+
+
+def timed(loader: DataLoader, **kwargs):
+    start = time.perf_counter()
+    data = loader.load_health_data(**kwargs)
+    return data, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=500_000)
+    parser.add_argument("--types", nargs="+", default=["HeartRate"])
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_export(folder, args.records)
+        loader = DataLoader(folder)
+
+        full, full_time = timed(loader)
+        selected, selected_time = timed(loader, types=args.types, start=args.start, end=args.end)
+
+        if args.start is None and args.end is None:
+            for key in selected:
+                assert selected[key].equals(full[key])
+
+        rows = sum(len(df) for df in selected.values())
+        print(f"full:      {full_time:7.2f} s  {sum(len(df) for df in full.values())} records")
+        print(f"selective: {selected_time:7.2f} s  {rows} records  "
+              f"({selected_time / full_time:.0%} of the full ingest)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+    Cold load time of cached routes: one csv file per route versus the memory-mapped
+    RouteStore used by CacheHandler.load_routes.
+
+    python benchmarks/bench_route_store.py --routes 3000 --points 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_routes
+from watchlib.data_handler import CacheHandler, DataLoader
+from watchlib.utils import WorkoutRoute
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "apple_health_export")
+        write_routes(folder, args.routes, args.points)
+        routes = DataLoader(folder).load_routes_seq()
+
+        # Previous cache layout: one csv file per route
+        csv_path = os.path.join(tmp, "csv_routes")
+        os.makedirs(csv_path)
+        for route in routes:
+            route.route.to_csv(os.path.join(csv_path, route.name), index=False)
+        start = time.perf_counter()
+        csv_routes = [WorkoutRoute(pd.read_csv(os.path.join(csv_path, f)), f) for f in os.listdir(csv_path)]
+        csv_time = time.perf_counter() - start
+
+        cache = CacheHandler(folder)
+        cache.cache_routes(routes)
+        start = time.perf_counter()
+        store_routes = cache.load_routes()
+        store_time = time.perf_counter() - start
+
+        by_name = {route.name: route for route in csv_routes}
+        for route in store_routes:
+            expected = by_name[route.name]
+            assert np.array_equal(route.lon.to_numpy(), expected.lon.to_numpy())
+            assert np.array_equal(route.elevation.to_numpy(), expected.elevation.to_numpy())
+            assert (route.start, route.end, route.duration_sec) == (expected.start, expected.end, expected.duration_sec)
+
+        print(f"{len(routes)} routes x {args.points} points")
+        print(f"  csv per route: {csv_time:7.3f} s")
+        print(f"  route store:   {store_time:7.3f} s  ({csv_time / store_time:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+    Writers for synthetic Apple Health exports used by the benchmarks.
+"""
+import os
+import random
+from datetime import datetime as dt, timedelta
+
+RECORD_TYPES = [
+    ("HKQuantityTypeIdentifierHeartRate", "count/min", 50, 180),
+    ("HKQuantityTypeIdentifierStepCount", "count", 1, 500),
+    ("HKQuantityTypeIdentifierActiveEnergyBurned", "kcal", 0, 20),
+    ("HKQuantityTypeIdentifierBasalEnergyBurned", "kcal", 0, 5),
+    ("HKQuantityTypeIdentifierDistanceWalkingRunning", "km", 0, 1),
+    ("HKQuantityTypeIdentifierRespiratoryRate", "count/min", 10, 25),
+    ("HKQuantityTypeIdentifierOxygenSaturation", "%", 0.9, 1),
+    ("HKCategoryTypeIdentifierSleepAnalysis", "", 0, 0),
+]
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>
+<!ATTLIST Record
+  type          CDATA #REQUIRED
+  value         CDATA #IMPLIED
+>
+]>
+<HealthData locale="de_DE">
+ <ExportDate value="{export_date}"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01" HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexMale" HKCharacteristicTypeIdentifierBloodType="HKBloodTypeNotSet" HKCharacteristicTypeIdentifierFitzpatrickSkinType="HKFitzpatrickSkinTypeNotSet" HKCharacteristicTypeIdentifierCardioFitnessMedicationsUse="HKMedicationUsageNotSet"/>
+"""
+
+FORMAT = "%Y-%m-%d %H:%M:%S +0100"
+
+
+def record_line(rng: random.Random, time: dt) -> str:
+    record_type, unit, low, high = rng.choice(RECORD_TYPES)
+    stamp = time.strftime(FORMAT)
+    end = (time + timedelta(minutes=1)).strftime(FORMAT)
+    value = "HKCategoryValueSleepAnalysisAsleep" if unit == "" else f"{rng.uniform(low, high):.3f}"
+    unit = f' unit="{unit}"' if unit else ""
+    line = (f' <Record type="{record_type}" sourceName="Apple Watch" sourceVersion="8.5"{unit} '
+            f'creationDate="{stamp}" startDate="{stamp}" endDate="{end}" value="{value}"')
+    if rng.random() < 0.05:
+        return line + '>\n  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n </Record>\n'
+    return line + "/>\n"
+
+
+def workout_lines(rng: random.Random, time: dt, index: int) -> str:
+    start = time.strftime(FORMAT)
+    end = (time + timedelta(minutes=45)).strftime(FORMAT)
+    return (
+        f' <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="45" durationUnit="min" '
+        f'sourceName="Apple Watch" creationDate="{end}" startDate="{start}" endDate="{end}">\n'
+        f'  <MetadataEntry key="HKIndoorWorkout" value="0"/>\n'
+        f'  <WorkoutEvent type="HKWorkoutEventTypeSegment" date="{start}" duration="10" durationUnit="min"/>\n'
+        f'  <WorkoutStatistics type="HKQuantityTypeIdentifierHeartRate" startDate="{start}" endDate="{end}" '
+        f'average="{rng.uniform(120, 160):.1f}" unit="count/min"/>\n'
+        f'  <WorkoutRoute sourceName="Apple Watch" creationDate="{end}" startDate="{start}" endDate="{end}">\n'
+        f'   <FileReference path="/workout-routes/route_{index}.gpx"/>\n'
+        f'  </WorkoutRoute>\n'
+        f' </Workout>\n'
+    )
+
+
+def write_export(folder: str, records: int, workouts: int = 0, seed: int = 0,
+                 start: dt = dt(2018, 1, 1)) -> str:
+    """
+        Writes <folder>/Export.xml with `records` records and `workouts` workouts
+        in chronological order and returns its path.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "Export.xml")
+
+    step = timedelta(minutes=5)
+    workout_every = records // workouts if workouts else 0
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER.format(export_date=(start + step * records).strftime(FORMAT)))
+        time = start
+        for i in range(records):
+            f.write(record_line(rng, time))
+            if workout_every and i % workout_every == 0:
+                f.write(workout_lines(rng, time, i // workout_every))
+            time += step
+        for day in range(max(1, records // 288)):
+            date = (start + timedelta(days=day)).strftime("%Y-%m-%d")
+            f.write(f' <ActivitySummary dateComponents="{date}" activeEnergyBurned="{rng.uniform(200, 800):.2f}" '
+                    f'activeEnergyBurnedGoal="500" activeEnergyBurnedUnit="kcal" appleExerciseTime="30"/>\n')
+        f.write("</HealthData>\n")
+    return path
+
+
+GPX_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="Apple Health Export" xmlns="http://www.topografix.com/GPX/1/1" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd">
+<metadata>
+<time>{time}</time>
+</metadata>
+<trk>
+<name>Route {time}</name>
+<trkseg>
+"""
+
+
+def write_gpx(path: str, points: int, seed: int = 0, start: dt = dt(2018, 1, 1),
+              missing_extensions: float = 0.0) -> str:
+    """
+        Writes a workout route with `points` track points, one per second.
+        A `missing_extensions` fraction of the points has no <extensions> element.
+    """
+    rng = random.Random(seed)
+    lon, lat, ele = 8.4 + rng.random(), 49.0 + rng.random(), 110.0
+    time = start
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(GPX_HEADER.format(time=start.strftime("%Y-%m-%dT%H:%M:%SZ")))
+        for _ in range(points):
+            lon += rng.uniform(-1e-4, 1e-4)
+            lat += rng.uniform(-1e-4, 1e-4)
+            ele += rng.uniform(-0.5, 0.5)
+            extensions = (
+                f'<extensions><speed>{rng.uniform(2, 4):.6f}</speed><course>{rng.uniform(0, 360):.6f}</course>'
+                f'<hAcc>{rng.uniform(1, 5):.6f}</hAcc><vAcc>{rng.uniform(1, 5):.6f}</vAcc></extensions>'
+            )
+            if missing_extensions and rng.random() < missing_extensions:
+                extensions = ""
+            f.write(
+                f'<trkpt lon="{lon:.6f}" lat="{lat:.6f}"><ele>{ele:.6f}</ele>'
+                f'<time>{time.strftime("%Y-%m-%dT%H:%M:%SZ")}</time>{extensions}</trkpt>\n'
+            )
+            time += timedelta(seconds=1)
+        f.write("</trkseg>\n</trk>\n</gpx>\n")
+    return path
+
+
+def write_routes(folder: str, routes: int, points: int, seed: int = 0) -> str:
+    """
+        Writes <folder>/workout-routes/route_<i>.gpx for every route and returns
+        the route folder.
+    """
+    route_folder = os.path.join(folder, "workout-routes")
+    os.makedirs(route_folder, exist_ok=True)
+    for i in range(routes):
+        write_gpx(os.path.join(route_folder, f"route_{i}.gpx"), points, seed=seed + i,
+                  start=dt(2018, 1, 1) + timedelta(days=i))
+    return route_folder
+
+
+ECG_HEADER = """Name,Max Mustermann
+Date of Birth,1990-01-01
+Recorded Date,{time}
+Classification,Sinus Rhythm
+Symptoms,
+Software Version,{version}
+Device,Watch6
+Sample Rate,{sample_rate} Hertz
+
+Lead,Lead I
+Unit,µV
+
+
+"""
+
+
+def write_ecg(path: str, seconds: int = 30, sample_rate: int = 512, seed: int = 0,
+              start: dt = dt(2021, 1, 1), decimal_comma: bool = False) -> str:
+    """
+        Writes an ECG export with a noisy baseline and one R peak per heartbeat
+        at 55-95 bpm. With decimal_comma values use a comma as decimal separator
+        like exports of German locales.
+    """
+    rng = random.Random(seed)
+    rate = rng.uniform(55, 95)
+    beat = int(sample_rate * 60 / rate)
+    version = "1,90" if decimal_comma else "1.90"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(ECG_HEADER.format(time=start.strftime(FORMAT), version=version, sample_rate=sample_rate))
+        for i in range(seconds * sample_rate):
+            phase = i % beat
+            value = rng.gauss(0, 15) + (900 * (1 - abs(phase - 20) / 6) if abs(phase - 20) < 6 else 0)
+            value = f"{value:.3f}"
+            f.write((value.replace(".", ",") if decimal_comma else value) + "\n")
+    return path
+
+
+def write_ecgs(folder: str, ecgs: int, seconds: int = 30, seed: int = 0, decimal_comma: bool = False) -> str:
+    """
+        Writes <folder>/electrocardiograms/ecg_<i>.csv for every ECG and returns
+        the ECG folder.
+    """
+    ecg_folder = os.path.join(folder, "electrocardiograms")
+    os.makedirs(ecg_folder, exist_ok=True)
+    for i in range(ecgs):
+        write_ecg(os.path.join(ecg_folder, f"ecg_{i}.csv"), seconds, seed=seed + i,
+                  start=dt(2021, 1, 1) + timedelta(days=i), decimal_comma=decimal_comma)
+    return ecg_folder
@@ -62,7 +62,7 @@ def start():
                 routes = []
                 if ch.isCached("routes"):
                     st.sidebar.info(f"Loading {dl.count_routes()} cached routes. This might take some time.")
-                    routes = ch.load_cached_routes()
+                    routes = ch.load_routes(lazy=True)
                 else:
                     st.sidebar.info(f"Loading {dl.count_routes()} routes. This might take some time.")
                     routes = dl.load_routes()
@@ -1,3 +1,10 @@
 from watchlib.analysis.ecg_analysis import *
 from watchlib.analysis.annoy import *
-from watchlib.analysis.analysis_ecg_utils import *
\ No newline at end of file
+from watchlib.analysis.analysis_ecg_utils import *
+from watchlib.analysis.ecg_features import *
+from watchlib.analysis.ecg_stream import *
+from watchlib.analysis.exact_search import *
+from watchlib.analysis.ecg_resampling import *
+from watchlib.analysis.ecg_embedding import *
+from watchlib.analysis.ecg_index import *
+from watchlib.analysis.beat_index import *
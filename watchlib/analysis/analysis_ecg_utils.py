@@ -1,24 +1,89 @@
 from watchlib.utils import *
-from watchlib.analysis.analysis_utils import slopes_for
-from typing import List
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from typing import Iterator, List, Optional, Tuple, Union
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def ecg_slopes(y) -> np.ndarray:
+    """
+        Slopes between neighbouring samples, the same values as slopes_for(list(zip(x, y)))
+        for the sample indices x of an ECG.
+    """
+    return np.diff(np.asarray(y, dtype=np.float64))
+
+
+def detect_beats(slopes: np.ndarray, a: float = 50, d: float = 180, last: Optional[float] = None) -> np.ndarray:
+    """
+        Indices of the slopes steeper than a that are more than d samples after the
+        previous beat. Only the steep slopes are visited, jumping from beat to beat.
+
+        last: index of the beat before the slopes (may be negative), none by default
+    """
+    candidates = np.flatnonzero(np.abs(slopes) > a)
+    beats = []
+    # Start with -distance to count first beat
+    if last is None:
+        last = -d
+    i = np.searchsorted(candidates, last + d, side="right")
+    while i < len(candidates):
+        last = candidates[i]
+        beats.append(last)
+        i = np.searchsorted(candidates, last + d, side="right")
+    return np.array(beats, dtype=np.int64)
 
 
 def bpm_points(ecg: ECG, a: float = 50, d: float = 180, r: float = 3, slopes=None):
+    """
+        Sample indices of the heart beats of an ECG.
 
-    x, y = ecg.x, ecg.y
-    points = list(zip(x, y))
+        a: heart beat slope amplitude threshold
+        d: heart beat distance threshold in samples
+        r: kept for compatibility, slopes are always taken between neighbouring samples
+        slopes: precomputed slopes (see ecg_slopes)
+    """
     if slopes is None:
-        slopes = slopes_for(points)
+        slopes = ecg_slopes(ecg.y)
+    return detect_beats(np.asarray(slopes, dtype=np.float64), a, d).tolist()
 
-    # Start with -distance to count first beat
-    bpm_points = [-d]
-    for idx, slope in enumerate(slopes):
-        if np.abs(slope) > a and np.abs(bpm_points[-1] - x[idx]) > d:
-            bpm_points.append(x[idx])
-    # Remove first beat (-distance)
-    bpm_points = bpm_points[1:]
-    return bpm_points
+
+def bpm_points_batch(ecgs: Union[np.ndarray, ECGCorpus], a: float = 50, d: float = 180, r: float = 3, block_size: int = 256) -> List[np.ndarray]:
+    """
+        bpm_points for every row of an (n_ecgs, n_samples) matrix or ECGCorpus at once.
+        NaN padding behind shorter ECGs never counts as a beat.
+
+        block_size: number of rows whose slopes are computed at once
+    """
+    samples = ecgs.samples if isinstance(ecgs, ECGCorpus) else np.asarray(ecgs)
+    n_ecgs, n_samples = samples.shape
+    # Keys of different rows are further apart than a beat distance, so a search never
+    # continues in the next row
+    width = n_samples + int(np.ceil(max(d, 0))) + 2
+
+    points = []
+    for start in range(0, n_ecgs, block_size):
+        steep = np.abs(np.diff(np.asarray(samples[start:start + block_size], dtype=np.float64), axis=1)) > a
+        rows, columns = np.nonzero(steep)
+        keys = rows.astype(np.int64) * width + columns
+
+        beat_rows, beat_columns = [], []
+        active = np.arange(len(steep))
+        last = np.full(len(steep), -d, dtype=np.float64)
+        while len(active):
+            i = np.searchsorted(keys, active * width + last[active] + d, side="right")
+            found = i < len(keys)
+            found[found] = rows[i[found]] == active[found]
+            active, i = active[found], i[found]
+            last[active] = columns[i]
+            beat_rows.append(active)
+            beat_columns.append(columns[i])
+
+        beat_rows = np.concatenate(beat_rows) if beat_rows else np.empty(0, dtype=np.int64)
+        beat_columns = np.concatenate(beat_columns) if beat_columns else np.empty(0, dtype=np.int64)
+        order = np.lexsort((beat_columns, beat_rows))
+        counts = np.bincount(beat_rows, minlength=len(steep))
+        points.extend(np.split(beat_columns[order].astype(np.int64), np.cumsum(counts)[:-1]))
+    return points
 
 
 def heartbeat_distances_ms(ecg: ECG) -> List[float]:
@@ -40,13 +105,50 @@ def hrvs(ecg: ECG) -> List[float]:
     return hrvs
 
 
+def _pairwise_distances(ecg: ECG) -> np.ndarray:
+    # The pairs never include the last heart beat distance
+    return np.asarray(heartbeat_distances_ms(ecg), dtype=np.int64)[:-1]
+
+
 def hrvs_pairwise(ecg: ECG) -> List[float]:
-    dist = heartbeat_distances_ms(ecg)
-    hrvs = []
-    for i in range(0, len(dist) - 1):
-        for j in range(i, len(dist) - 1):
-            hrvs.append(np.abs(dist[i] - dist[j]))
-    return hrvs
+    """
+        |d_i - d_j| for all i <= j of the heart beat distances d, row by row.
+    """
+    dist = _pairwise_distances(ecg)
+    i, j = np.triu_indices(len(dist))
+    return np.abs(dist[i] - dist[j]).tolist()
+
+
+def iter_hrvs_pairwise(ecg: ECG) -> Iterator[int]:
+    """
+        The values of hrvs_pairwise one by one, without building the O(n²) pair list.
+    """
+    dist = _pairwise_distances(ecg)
+    for i in range(len(dist)):
+        yield from np.abs(dist[i:] - dist[i]).tolist()
+
+
+def pairwise_differences_sum(values) -> float:
+    """
+        Sum of |v_i - v_j| over all pairs i < j in O(n log n): after sorting, the k-th
+        smallest value is subtracted by the k values below it and subtracts the n - k - 1
+        values above it.
+    """
+    values = np.sort(np.asarray(values))
+    n = len(values)
+    return (values * (2 * np.arange(n) - n + 1)).sum()
+
+
+def mean_hrv_pairwise(ecg: ECG) -> float:
+    """
+        np.mean(hrvs_pairwise(ecg)) in O(n log n), the i == j pairs count as zeros.
+    """
+    dist = _pairwise_distances(ecg)
+    n = len(dist)
+    if n == 0:
+        # Mean of no pairs, nan like np.mean([])
+        return np.mean(dist)
+    return pairwise_differences_sum(dist) / (n * (n + 1) // 2)
 
 
 # --------------------------
@@ -70,3 +172,103 @@ def split_around_heartbeats(ecg: ECG):
         end = points[i] + split_half
         splits.append(ecg.data[start:end])
     return splits
+
+
+# --------------------------
+# FIXED WIDTH BEAT WINDOWS
+# --------------------------
+def _beat_window(points: np.ndarray, distances: np.ndarray, window: Optional[int], before: Optional[int]) -> Tuple[int, int]:
+    if window is None:
+        if len(distances) == 0:
+            raise ValueError("The window cannot be derived from less than two heart beats, pass a window")
+        # Median distance of neighbouring beats, about one heart beat
+        window = int(np.median(distances))
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    return window, window // 2 if before is None else before
+
+
+def _gather_windows(flat: np.ndarray, offsets: np.ndarray, starts: np.ndarray, lengths: np.ndarray,
+                    window: int, pad: bool) -> Tuple[np.ndarray, np.ndarray]:
+    # Windows flat[offset + start:offset + start + window] of the signals of length lengths
+    # stored back to back in flat, returns the windows and which of the starts they belong to
+    if pad:
+        dtype = np.result_type(flat.dtype, np.float32)
+        if len(starts) == 0 or len(flat) == 0:
+            return np.full((len(starts), window), np.nan, dtype=dtype), np.arange(len(starts))
+        index = starts[:, None] + np.arange(window)
+        inside = (index >= 0) & (index < lengths[:, None])
+        values = flat[offsets[:, None] + np.clip(index, 0, np.maximum(lengths[:, None] - 1, 0))]
+        return np.where(inside, values, np.nan).astype(dtype, copy=False), np.arange(len(starts))
+
+    keep = np.flatnonzero((starts >= 0) & (starts + window <= lengths))
+    if len(keep) == 0:
+        return np.empty((0, window), dtype=flat.dtype), keep
+    # Zero-copy (n - window + 1, window) view, indexing it copies only the beat windows
+    return sliding_window_view(flat, window)[offsets[keep] + starts[keep]], keep
+
+
+def beat_windows(ecg: Union[ECG, np.ndarray], window: Optional[int] = None, before: Optional[int] = None,
+                 points=None, pad: bool = False, a: float = 50, d: float = 180, r: float = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Fixed width windows around the heart beats of an ECG as one (n_beats, window) array,
+        e.g. windows.mean(axis=0) is the average heart beat.
+
+        window: samples per beat, defaults to the median distance of neighbouring beats
+        before: samples before the beat, defaults to half of the window
+        points: heart beat indices, detected with a, d and r (see bpm_points) if not given
+        pad: keep the beats whose window leaves the signal and fill the outside with NaN,
+             otherwise these beats are dropped
+
+        Returns the windows and the heart beat indices of their rows.
+    """
+    values = np.asarray(ecg.y if isinstance(ecg, ECG) else ecg)
+    if values.dtype.kind not in "fc":
+        values = values.astype(np.float64)
+    if points is None:
+        points = detect_beats(ecg_slopes(values), a, d)
+    points = np.asarray(points, dtype=np.int64)
+    window, before = _beat_window(points, np.diff(points), window, before)
+
+    n = len(points)
+    windows, rows = _gather_windows(values, np.zeros(n, dtype=np.int64), points - before,
+                                    np.full(n, len(values), dtype=np.int64), window, pad)
+    return windows, points[rows]
+
+
+def beat_windows_batch(ecgs: Union[np.ndarray, ECGCorpus], window: Optional[int] = None, before: Optional[int] = None,
+                       points: Optional[List[np.ndarray]] = None, pad: bool = False,
+                       a: float = 50, d: float = 180, r: float = 3, lengths=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        beat_windows for every row of an (n_ecgs, n_samples) matrix or ECGCorpus, the beats
+        of all ECGs stacked into one (n_beats, window) array. Windows never reach into the
+        NaN padding of a corpus unless pad is set.
+
+        window: samples per beat, defaults to the median distance of neighbouring beats of all ECGs
+        points: heart beat indices of every row, detected with bpm_points_batch if not given
+        lengths: number of samples of every row, defaults to the lengths of the corpus
+                 or the width of the matrix
+
+        Returns the windows, the row of the ECG of every window and its heart beat index.
+    """
+    if isinstance(ecgs, ECGCorpus):
+        samples, default_lengths = ecgs.samples, ecgs.lengths
+    else:
+        samples = np.asarray(ecgs)
+        default_lengths = np.full(len(samples), samples.shape[1], dtype=np.int64)
+    lengths = default_lengths if lengths is None else np.asarray(lengths, dtype=np.int64)
+    if points is None:
+        points = bpm_points_batch(ecgs, a, d, r)
+
+    counts = np.array([len(p) for p in points], dtype=np.int64)
+    rows = np.repeat(np.arange(len(points)), counts)
+    beats = np.concatenate(points).astype(np.int64) if len(points) else np.empty(0, dtype=np.int64)
+    distances = np.concatenate([np.diff(p) for p in points]) if len(points) else np.empty(0, dtype=np.int64)
+    window, before = _beat_window(beats, distances, window, before)
+
+    # The rows of a C-contiguous matrix are back to back in its flat view
+    flat = samples.reshape(-1)
+    width = samples.shape[1]
+    windows, keep = _gather_windows(flat, rows * width, beats - before, lengths[rows], window, pad)
+    return windows, rows[keep], beats[keep]
+
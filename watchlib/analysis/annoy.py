@@ -1,8 +1,12 @@
-from sklearn.decomposition import PCA
 from annoy import AnnoyIndex
-from typing import List
+from typing import List, Union
+import numpy as np
 
 from watchlib.utils import ECG
+# ecg_matrix and min_ecg_length are still exported from here
+from watchlib.data_handler.ecg_corpus import ECGCorpus, ecg_matrix, min_ecg_length
+from watchlib.analysis.ecg_embedding import ECGEmbedding
+from watchlib.analysis.ecg_resampling import resample_ecgs
 from watchlib.plot import plot_ecg
 from watchlib.analysis import heart_rate_variability_pairwise, bpm
 
@@ -12,53 +16,85 @@ from watchlib.analysis import heart_rate_variability_pairwise, bpm
 # Annoy
 # --------------------------
 
-def annoy_with_pca(ecgs: List[ECG], trees: int=10000) -> AnnoyIndex:
+def add_items(t: AnnoyIndex, items):
+    for i, item in enumerate(items):
+        # Annoy converts numpy rows element by element, a list is converted much faster
+        t.add_item(i, item.tolist() if isinstance(item, np.ndarray) else item)
 
-    min_features = min([len(ecg.y) for ecg in ecgs])
-    components = min(len(ecgs), min_features)
 
-    ecg_data = [ecg.y[:min_features] for ecg in ecgs]
+def _resampled(ecgs: Union[List[ECG], ECGCorpus], sample_rate: float, _from: int = None, _to: int = None) -> np.ndarray:
+    # Samples _from:_to of every ECG at sample_rate, ECGs shorter than _to are padded with zeros
+    if _from is None: _from = 0
+    duration = None if _to is None else (_to - _from) / sample_rate
+    return resample_ecgs(ecgs, sample_rate, duration, _from / sample_rate)
+
+
+def annoy_with_pca(ecgs: Union[List[ECG], ECGCorpus], trees: int=10000, components: int=32,
+                   sample_rate: float=512) -> AnnoyIndex:
+    """
+        components: number of principal components fitted incrementally (see ECGEmbedding), the
+                    index keeps this size however many ECGs there are
+        sample_rate: the ECGs are resampled to sample_rate Hz and the length of the longest one
+                     (see resample_ecgs) before the PCA
+    """
 
-    pca = PCA(n_components=components)
-    pca.fit(ecg_data) 
+    ecg_data = _resampled(ecgs, sample_rate)
+    # A PCA has at most as many components as rows and features
+    components = min(components, *ecg_data.shape)
 
-    ecgs_transformed = pca.transform(ecg_data)
+    ecgs_transformed = ECGEmbedding(components).fit(ecg_data).transform(ecg_data)
 
     t = AnnoyIndex(components, metric="angular")
-    for i, ecg in enumerate(ecgs_transformed):
-        t.add_item(i, ecg)
+    add_items(t, ecgs_transformed)
     t.build(trees)
 
     return t
 
 
-def annoy_with_interpolation(ecgs: List[ECG], trees: int=10000, res: int=5) -> AnnoyIndex:
-    
-    min_features = min([len(ecg.y) for ecg in ecgs])
-    
-    ecg_data = [ecg.y[:min_features][::res] for ecg in ecgs]
+def annoy_with_interpolation(ecgs: Union[List[ECG], ECGCorpus], trees: int=10000, res: int=5,
+                             sample_rate: float=512) -> AnnoyIndex:
+    """
+        Index of the ECGs downsampled by res, to sample_rate / res Hz. The ECGs are low-pass
+        filtered before (see fft_resample), a plain [::res] stride would alias.
+    """
 
-    t = AnnoyIndex(len(ecg_data[0]), metric="angular")
-    for i, ecg in enumerate(ecg_data):
-        t.add_item(i, ecg)
+    ecg_data = _resampled(ecgs, sample_rate / res)
+
+    t = AnnoyIndex(ecg_data.shape[1], metric="angular")
+    add_items(t, ecg_data)
     t.build(trees)
 
     return t
 
 
-def annoy(ecgs: List[ECG], _from: int=None, _to: int=None, trees: int=10000) -> AnnoyIndex:
+def annoy_with_resampling(ecgs: Union[List[ECG], ECGCorpus], trees: int=10000, sample_rate: float=128,
+                          duration: float=None, offset: float=0) -> AnnoyIndex:
+    """
+        Index of the ECGs resampled to the same sample rate and duration (see resample_ecgs),
+        short ECGs do not shorten the features of all others.
+    """
 
-    min_features = min([len(ecg.y) for ecg in ecgs])
-    
-    if _from is None: _from = 0
-    if _to is None: _to = min_features
-    features = _to - _from
+    ecg_data = resample_ecgs(ecgs, sample_rate, duration, offset)
+
+    t = AnnoyIndex(ecg_data.shape[1], metric="angular")
+    add_items(t, ecg_data)
+    t.build(trees)
+
+    return t
+
+
+def annoy(ecgs: Union[List[ECG], ECGCorpus], _from: int=None, _to: int=None, trees: int=10000,
+          sample_rate: float=512) -> AnnoyIndex:
+    """
+        Index of the samples _from:_to of every ECG at sample_rate Hz, the ECGs are resampled
+        first if they were recorded with another rate. _to defaults to the end of the longest
+        ECG, shorter ECGs are padded with zeros instead of cutting all others to their length.
+    """
 
-    ecg_data = [ecg.y[_from:_to] for ecg in ecgs]
+    ecg_data = _resampled(ecgs, sample_rate, _from, _to)
 
-    t = AnnoyIndex(features, metric="angular")
-    for i, ecg in enumerate(ecg_data):
-        t.add_item(i, ecg)
+    t = AnnoyIndex(ecg_data.shape[1], metric="angular")
+    add_items(t, ecg_data)
     t.build(trees)
 
     return t
@@ -66,7 +102,7 @@ def annoy(ecgs: List[ECG], _from: int=None, _to: int=None, trees: int=10000) ->
 def query_annoy(t: AnnoyIndex, query: int, count: int) -> List[int]:
     return t.get_nns_by_item(query, count)
 
-def query_and_plot_annoy(t: AnnoyIndex, ecgs: List[ECG], query: int, count: int):
+def query_and_plot_annoy(t: AnnoyIndex, ecgs: Union[List[ECG], ECGCorpus], query: int, count: int):
     items_for_0 = t.get_nns_by_item(query, count)
     for i, item in enumerate(items_for_0):
         print(item)
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from annoy import AnnoyIndex
+
+from watchlib.analysis.analysis_ecg_utils import beat_windows, beat_windows_batch, bpm_points_batch, detect_beats, ecg_slopes
+from watchlib.analysis.ecg_index import TREE_CANDIDATES, _ecg_signature, _saved_is_current, _write_meta, tune_trees
+from watchlib.analysis.exact_search import ExactIndex
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from watchlib.utils import ECG
+
+BACKENDS = ["annoy", "exact"]
+
+
+def _center(windows: np.ndarray) -> np.ndarray:
+    # Without the baseline of every beat, the angular distance compares the beat shapes
+    windows = np.asarray(windows, dtype=np.float32)
+    return windows - windows.mean(axis=1, keepdims=True)
+
+
+class BeatIndex:
+    """
+        Similarity index of single heart beats of all ECGs.
+
+        Every heart beat is cut out as a window of `window` samples starting `before` samples
+        before its R peak (see beat_windows, the fixed width version of split_around_heartbeats),
+        beats whose window leaves the ECG are skipped. Beats are compared by the angular
+        distance of their windows minus their mean.
+
+        path holds the windows as a float16 (n_beats, window) matrix (beat_windows.bin), the
+        back-references of every beat (beat_refs.npz: row of the ECG, number of the beat in
+        the ECG and its sample index), the annoy index (beats.ann) and beat_index.json with
+        the ECG names and lengths, the parameters and the fingerprint of the ECGs. Like
+        ECGIndex, ensure(ecgs) only rebuilds if the ECGs changed, without hashing the samples
+        of an unchanged corpus, and the index is memory-mapped.
+
+        backend: "annoy" for approximate or "exact" for exact search (see ExactIndex)
+        trees: number of annoy trees, "auto" tunes them on a sample of tune_sample beats,
+               trying at most max_trees trees
+        block_size: ECGs whose beats are detected and cut out at once
+    """
+
+    WINDOWS = "beat_windows.bin"
+    REFS = "beat_refs.npz"
+    INDEX = "beats.ann"
+    META = "beat_index.json"
+    VERSION = 1
+
+    def __init__(self, path: str, window: int = 256, before: Optional[int] = None, backend: str = "annoy",
+                 trees: Union[int, str] = "auto", target_recall: float = 0.95, tune_sample: int = 20000,
+                 max_trees: int = 256, a: float = 50, d: float = 180, r: float = 3, block_size: int = 1024):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, use one of {BACKENDS}")
+        self.path = path
+        self.window = window
+        self.before = window // 2 if before is None else before
+        self.backend = backend
+        self.trees = trees
+        self.target_recall = target_recall
+        self.tune_sample = tune_sample
+        self.max_trees = max_trees
+        self.a = a
+        self.d = d
+        self.r = r
+        self.block_size = block_size
+
+        self.meta: dict = {}
+        self.names: List[str] = []
+        self.ecgs = np.empty(0, dtype=np.int32)
+        self.beats = np.empty(0, dtype=np.int32)
+        self.samples = np.empty(0, dtype=np.int64)
+        self.windows = np.empty((0, window), dtype=np.float16)
+        self.index: Optional[Union[AnnoyIndex, ExactIndex]] = None
+
+    def __params(self) -> dict:
+        return {"version": self.VERSION, "window": self.window, "before": self.before, "backend": self.backend,
+                "trees": self.trees, "target_recall": self.target_recall, "max_trees": self.max_trees, "a": self.a, "d": self.d, "r": self.r}
+
+    def fingerprint(self, ecgs: Union[List[ECG], ECGCorpus]) -> str:
+        """
+            Hash of the parameters, the ECG names and all samples.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps(self.__params(), sort_keys=True).encode("utf-8"))
+        if isinstance(ecgs, ECGCorpus):
+            h.update(json.dumps(ecgs.names).encode("utf-8"))
+            for i in range(len(ecgs)):
+                h.update(np.ascontiguousarray(ecgs.values(i)).tobytes())
+        else:
+            h.update(json.dumps([ecg.name for ecg in ecgs]).encode("utf-8"))
+            for ecg in ecgs:
+                h.update(np.asarray(ecg.y, dtype=np.float32).tobytes())
+        return h.hexdigest()
+
+    # --------------------------
+    # Building
+    # --------------------------
+
+    def __beat_blocks(self, ecgs: Union[List[ECG], ECGCorpus]) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        # Windows, ECG rows, beat numbers and sample indices, block_size ECGs at a time
+        if isinstance(ecgs, ECGCorpus):
+            for start in range(0, len(ecgs), self.block_size):
+                samples = ecgs.samples[start:start + self.block_size]
+                lengths = ecgs.lengths[start:start + self.block_size]
+                points = bpm_points_batch(samples, self.a, self.d, self.r)
+                windows, rows, beats = beat_windows_batch(samples, self.window, self.before, points, lengths=lengths)
+                # Number of every beat among all beats of its ECG
+                keys = np.concatenate([i * samples.shape[1] + p for i, p in enumerate(points)] + [np.empty(0, dtype=np.int64)])
+                offsets = np.concatenate(([0], np.cumsum([len(p) for p in points])))
+                numbers = np.searchsorted(keys, rows * samples.shape[1] + beats) - offsets[rows]
+                yield windows, rows + start, numbers, beats
+        else:
+            for i, ecg in enumerate(ecgs):
+                values = np.asarray(ecg.y, dtype=np.float64)
+                points = detect_beats(ecg_slopes(values), self.a, self.d)
+                windows, beats = beat_windows(values, self.window, self.before, points)
+                yield windows, np.full(len(beats), i), np.searchsorted(points, beats), beats
+
+    def build(self, ecgs: Union[List[ECG], ECGCorpus], fingerprint: str = None) -> "BeatIndex":
+        """
+            Cuts out the beats of the ECGs, builds the index, saves it to path and opens it.
+        """
+        fingerprint = fingerprint or self.fingerprint(ecgs)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".beat_index", dir=self.path)
+        try:
+            t = AnnoyIndex(self.window, metric="angular") if self.backend == "annoy" else None
+            ecg_rows, numbers, samples = [], [], []
+            n_beats = 0
+            with open(os.path.join(tmp_path, self.WINDOWS), "wb") as f:
+                for windows, rows, beat_numbers, beats in self.__beat_blocks(ecgs):
+                    f.write(windows.astype(np.float16).tobytes())
+                    if t is not None:
+                        for j, vector in enumerate(_center(windows)):
+                            t.add_item(n_beats + j, vector.tolist())
+                    ecg_rows.append(rows.astype(np.int32))
+                    numbers.append(beat_numbers.astype(np.int32))
+                    samples.append(beats.astype(np.int64))
+                    n_beats += len(windows)
+
+            np.savez(os.path.join(tmp_path, self.REFS),
+                     ecgs=np.concatenate(ecg_rows) if ecg_rows else np.empty(0, dtype=np.int32),
+                     beats=np.concatenate(numbers) if numbers else np.empty(0, dtype=np.int32),
+                     samples=np.concatenate(samples) if samples else np.empty(0, dtype=np.int64))
+
+            trees, tuning = self.trees, None
+            if t is not None:
+                if trees == "auto" and n_beats == 0:
+                    trees = 1
+                elif trees == "auto":
+                    windows = self.__open_windows(tmp_path, n_beats)
+                    sample = np.random.default_rng(0).choice(n_beats, size=min(self.tune_sample, n_beats), replace=False)
+                    candidates = [trees for trees in TREE_CANDIDATES if trees <= self.max_trees]
+                    tuning = tune_trees(_center(windows[np.sort(sample)]), candidates, target_recall=self.target_recall)
+                    trees = int(tuning["trees"].iloc[-1]) if len(tuning) else 1
+                    del windows
+                t.build(trees)
+                t.save(os.path.join(tmp_path, self.INDEX))
+                t.unload()
+
+            meta = {**self.__params(), "fingerprint": fingerprint, **_ecg_signature(ecgs), "n_beats": n_beats,
+                    "built_trees": trees if t is not None else None,
+                    "tuning": None if tuning is None else tuning.to_dict(orient="records")}
+            with open(os.path.join(tmp_path, self.META), "w") as f:
+                json.dump(meta, f)
+
+            # The json is replaced last, it only ever describes a complete index
+            files = [self.WINDOWS, self.REFS] + ([self.INDEX] if t is not None else [])
+            for name in files + [self.META]:
+                os.replace(os.path.join(tmp_path, name), os.path.join(self.path, name))
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return self.load()
+
+    # --------------------------
+    # Saving and loading
+    # --------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, self.META))
+
+    def __read_meta(self) -> Optional[dict]:
+        if not self.exists():
+            return None
+        with open(os.path.join(self.path, self.META), "r") as f:
+            return json.load(f)
+
+    def is_current(self, ecgs: Union[List[ECG], ECGCorpus], fingerprint: str = None) -> bool:
+        meta = self.__read_meta()
+        if meta is None:
+            return False
+        return meta.get("fingerprint") == (fingerprint or self.fingerprint(ecgs))
+
+    def ensure(self, ecgs: Union[List[ECG], ECGCorpus]) -> "BeatIndex":
+        """
+            Opens the saved index if it was built from the same ECGs, rebuilds it otherwise.
+            Like ECGIndex.ensure, the samples are only hashed if the names and lengths are
+            unchanged and the ECGs are a list or a corpus whose sample file was replaced.
+        """
+        meta = self.__read_meta()
+        current, fingerprint = _saved_is_current(meta, self.__params(), ecgs, self.fingerprint)
+        if not current:
+            return self.build(ecgs, fingerprint)
+        if fingerprint is not None and isinstance(ecgs, ECGCorpus):
+            # Same samples in a new file, the next call does not have to hash them again
+            _write_meta(os.path.join(self.path, self.META), {**meta, **_ecg_signature(ecgs)})
+        return self.load()
+
+    def __open_windows(self, path: str, n_beats: int) -> np.ndarray:
+        if n_beats == 0:
+            # mmap cannot map empty files
+            return np.empty((0, self.window), dtype=np.float16)
+        return np.memmap(os.path.join(path, self.WINDOWS), dtype=np.float16, mode="r", shape=(n_beats, self.window))
+
+    def load(self) -> "BeatIndex":
+        with open(os.path.join(self.path, self.META), "r") as f:
+            self.meta = json.load(f)
+        self.names = self.meta["names"]
+        self.window, self.before, self.backend = self.meta["window"], self.meta["before"], self.meta["backend"]
+        with np.load(os.path.join(self.path, self.REFS)) as refs:
+            self.ecgs, self.beats, self.samples = refs["ecgs"], refs["beats"], refs["samples"]
+        self.windows = self.__open_windows(self.path, self.meta["n_beats"])
+
+        if self.backend == "annoy":
+            self.index = AnnoyIndex(self.window, metric="angular")
+            self.index.load(os.path.join(self.path, self.INDEX))
+        else:
+            self.index = ExactIndex.from_matrix(_center(self.windows))
+        return self
+
+    # --------------------------
+    # Queries
+    # --------------------------
+
+    def __len__(self) -> int:
+        return len(self.ecgs)
+
+    def references(self, items) -> pd.DataFrame:
+        """
+            ECG name, ECG row, beat number and sample index of beats.
+        """
+        items = np.asarray(items, dtype=np.int64)
+        return pd.DataFrame({
+            "name": [self.names[i] for i in self.ecgs[items]],
+            "ecg": self.ecgs[items],
+            "beat": self.beats[items],
+            "sample": self.samples[items],
+        })
+
+    def query(self, item: int, count: int) -> List[int]:
+        """
+            The count most similar beats of an indexed beat.
+        """
+        return self.index.get_nns_by_item(item, count)
+
+    def query_batch(self, windows: np.ndarray, count: int) -> np.ndarray:
+        """
+            The count most similar beats of every (window,) beat in windows as an (n_queries, count)
+            array, padded with -1 if the index has fewer beats.
+        """
+        vectors = _center(np.atleast_2d(windows))
+        if isinstance(self.index, ExactIndex):
+            items, _ = self.index.query_batch(vectors, count)
+            return np.pad(items, ((0, 0), (0, count - items.shape[1])), constant_values=-1)
+        items = np.full((len(vectors), count), -1, dtype=np.int64)
+        for i, vector in enumerate(vectors):
+            found = self.index.get_nns_by_vector(vector.tolist(), count)
+            items[i, :len(found)] = found
+        return items
+
+    def query_ecg(self, ecg: ECG, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            The count most similar beats of every beat of an ECG, which does not have to be
+            indexed. Returns the sample indices of the beats of the ECG and their neighbours.
+        """
+        values = np.asarray(ecg.y, dtype=np.float64)
+        points = detect_beats(ecg_slopes(values), self.meta["a"], self.meta["d"])
+        windows, beats = beat_windows(values, self.window, self.before, points)
+        return beats, self.query_batch(windows, count)
@@ -1,18 +1,20 @@
 import numpy as np
-from typing import List
+from typing import List, Union
 import matplotlib.pyplot as plt
 
 # Own imports
-from watchlib.analysis.analysis_ecg_utils import bpm_points, hrvs, hrvs_pairwise, split_between_heartbeats
-from watchlib.analysis.analysis_utils import slopes_for, slopes_of_slopes_for
+from watchlib.analysis.analysis_ecg_utils import bpm_points, bpm_points_batch, ecg_slopes, hrvs, mean_hrv_pairwise, split_between_heartbeats
+from watchlib.analysis.analysis_utils import slopes_of_slopes_for
+from watchlib.analysis.ecg_features import ECGFeatures
 from watchlib.utils import ECG, ECGWave
+from watchlib.data_handler.ecg_corpus import ECGCorpus
 
 
-def ecg_distributions(ecgs: List[ECG]):
+def ecg_distributions(ecgs: Union[List[ECG], ECGCorpus]):
 
-    bpms = [bpm(ecg) for ecg in ecgs]
-    hrvs = [heart_rate_variability(ecg) for ecg in ecgs]
-    hrvs_pair = [heart_rate_variability_pairwise(ecg) for ecg in ecgs]
+    # One pass, the heart beats of every ECG are only detected once
+    table = ECGFeatures().feature_table(ecgs)
+    bpms, hrvs, hrvs_pair = table["bpm"], table["hrv"], table["hrv_pairwise"]
 
     plt.hist(bpms, bins=35)
     plt.title("BPM distribution")
@@ -48,10 +50,24 @@ def bpm(ecg: ECG, a: float = 50, d: float = 180, r: float = 3, sample_rate: floa
     return bpm
 
 
+def bpm_batch(ecgs: Union[np.ndarray, ECGCorpus], lengths=None, a: float = 50, d: float = 180, r: float = 3,
+              sample_rate: float = 512) -> np.ndarray:
+    """
+        bpm for every row of an (n_ecgs, n_samples) matrix or ECGCorpus, see bpm_points_batch.
+
+        lengths: number of samples of every ECG, defaults to the lengths of the corpus
+                 or the width of the matrix
+    """
+    if lengths is None:
+        lengths = ecgs.lengths if isinstance(ecgs, ECGCorpus) else np.full(len(ecgs), np.shape(ecgs)[1])
+    counts = np.array([len(points) for points in bpm_points_batch(ecgs, a, d, r)])
+    return counts * (60 / (np.asarray(lengths) / sample_rate))
+
+
 def plot_ecg_with_slopes(ecg: ECG, figsize=(20, 5)):
 
     x, y = ecg.x, ecg.y
-    s = slopes_for(list(zip(x, y)))
+    s = ecg_slopes(y)
     slopes_of_s = slopes_of_slopes_for(list(zip(x, y)))
     points = bpm_points(ecg, slopes=s)
 
@@ -80,7 +96,7 @@ def heart_rate_variability(ecg: ECG, verbose: bool = False) -> float:
 def heart_rate_variability_pairwise(ecg: ECG, verbose: bool = False) -> float:
     if verbose:
         print(f"[ECG Analysis]\t\tCalculating pairwise hrv for {ecg.name} ...")
-    return np.mean(hrvs_pairwise(ecg))
+    return mean_hrv_pairwise(ecg)
 
 
 def plot_ecg_hrvs_overlay(ecg: ECG, figsize=(10, 5)):
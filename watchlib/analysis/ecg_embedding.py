@@ -0,0 +1,132 @@
+from typing import Iterable, Iterator, List, Union
+
+import numpy as np
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from watchlib.data_handler.ecg_corpus import ECGCorpus, ecg_matrix, min_ecg_length
+from watchlib.utils import ECG
+
+SOLVERS = ["incremental", "randomized", "full"]
+
+
+class ECGEmbedding:
+    """
+        Projection of the samples _from:_to:step of ECGs onto a fixed number of principal
+        components.
+
+        "incremental" fits an IncrementalPCA batch by batch, the rows of an ECGCorpus are
+        streamed from the mapped file, so memory only depends on batch_size and the number
+        of features. "randomized" and "full" fit a PCA on all rows at once.
+
+        The fitted projection is saved to an .npz file and transforms new ECGs without
+        fitting again.
+
+        components: number of principal components
+        _to: defaults to the length of the shortest ECG the embedding is fitted on
+    """
+
+    def __init__(self, components: int = 32, solver: str = "incremental", batch_size: int = 256,
+                 _from: int = 0, _to: int = None, step: int = 1, seed: int = 0):
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver}, use one of {SOLVERS}")
+        self.components = components
+        self.solver = solver
+        self.batch_size = max(batch_size, components)
+        self._from = _from
+        self._to = _to
+        self.step = step
+        self.seed = seed
+
+        self.mean = None
+        self.projection = None
+        self.explained_variance_ratio = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.projection is not None
+
+    def __matrix(self, ecgs: Union[List[ECG], ECGCorpus, np.ndarray]):
+        if isinstance(ecgs, np.ndarray):
+            return ecgs[:, self._from:self._to:self.step]
+        return ecg_matrix(ecgs, self._from, self._to, self.step)
+
+    def __batches(self, matrix) -> Iterator[np.ndarray]:
+        n = len(matrix)
+        starts = list(range(0, n, self.batch_size))
+        # IncrementalPCA needs at least components rows per batch, a short last batch joins the one before
+        if len(starts) > 1 and n - starts[-1] < self.components:
+            starts.pop()
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else n
+            yield np.asarray(matrix[start:end], dtype=np.float64)
+
+    def fit(self, ecgs: Union[List[ECG], ECGCorpus, np.ndarray, Iterable[np.ndarray]]) -> "ECGEmbedding":
+        """
+            Fits the projection on a list of ECGs, an ECGCorpus, an (n_ecgs, n_samples) matrix
+            or, with the incremental solver, an iterable of such matrices read one at a time.
+        """
+        if isinstance(ecgs, (list, ECGCorpus, np.ndarray)):
+            if self._to is None:
+                self._to = ecgs.shape[1] if isinstance(ecgs, np.ndarray) else min_ecg_length(ecgs)
+            matrix = self.__matrix(ecgs)
+            if self.solver != "incremental":
+                pca = PCA(n_components=self.components, svd_solver=self.solver, random_state=self.seed)
+                return self.__set(pca.fit(np.asarray(matrix, dtype=np.float64)))
+            batches = self.__batches(matrix)
+        elif self.solver != "incremental":
+            raise ValueError("Batches can only be fitted with the incremental solver")
+        else:
+            batches = (np.asarray(batch)[:, self._from:self._to:self.step] for batch in ecgs)
+
+        pca = IncrementalPCA(n_components=self.components)
+        for batch in batches:
+            pca.partial_fit(np.asarray(batch, dtype=np.float64))
+        if self._to is None:
+            # The last sample of the fitted window
+            self._to = self._from + (len(pca.mean_) - 1) * self.step + 1
+        return self.__set(pca)
+
+    def __set(self, pca) -> "ECGEmbedding":
+        self.mean = pca.mean_
+        self.projection = pca.components_
+        self.explained_variance_ratio = pca.explained_variance_ratio_
+        return self
+
+    def transform(self, ecgs: Union[ECG, List[ECG], ECGCorpus, np.ndarray]) -> np.ndarray:
+        """
+            (n_ecgs, components) float32 embedding of ECGs, a matrix of samples or the samples
+            of a single ECG ((components,) then). Rows are projected batch by batch.
+        """
+        if not self.fitted:
+            raise ValueError("The embedding has to be fitted or loaded first")
+        if isinstance(ecgs, ECG) or (isinstance(ecgs, np.ndarray) and ecgs.ndim == 1):
+            values = np.asarray(ecgs.y if isinstance(ecgs, ECG) else ecgs, dtype=np.float64)
+            return ((values[self._from:self._to:self.step] - self.mean) @ self.projection.T).astype(np.float32)
+
+        matrix = self.__matrix(ecgs)
+        embedding = np.empty((len(matrix), len(self.projection)), dtype=np.float32)
+        for start in range(0, len(matrix), self.batch_size):
+            batch = np.asarray(matrix[start:start + self.batch_size], dtype=np.float64)
+            embedding[start:start + len(batch)] = (batch - self.mean) @ self.projection.T
+        return embedding
+
+    def save(self, path: str):
+        if not self.fitted:
+            raise ValueError("The embedding has to be fitted first")
+        with open(path, "wb") as f:
+            np.savez(f, mean=self.mean, components=self.projection,
+                     explained_variance_ratio=self.explained_variance_ratio,
+                     window=np.array([self._from, self._to, self.step], dtype=np.int64),
+                     solver=np.array(self.solver))
+
+    @classmethod
+    def load(cls, path: str) -> "ECGEmbedding":
+        with np.load(path) as data:
+            _from, _to, step = data["window"].tolist() if "window" in data else (0, None, 1)
+            embedding = cls(len(data["components"]), str(data["solver"]) if "solver" in data else "full",
+                            _from=_from, _to=_to, step=step)
+            embedding.mean = data["mean"]
+            embedding.projection = data["components"]
+            if "explained_variance_ratio" in data:
+                embedding.explained_variance_ratio = data["explained_variance_ratio"]
+        return embedding
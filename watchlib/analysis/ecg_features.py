@@ -0,0 +1,209 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from watchlib.analysis.analysis_ecg_utils import beat_windows, bpm_points, bpm_points_batch, pairwise_differences_sum
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from watchlib.utils import ECG
+
+# Columns of ECGFeatures.feature_table next to the ECG name
+FEATURE_COLUMNS = ["length", "beats", "bpm", "mean_rr_ms", "hrv", "hrv_pairwise"]
+
+
+class ECGBeats:
+    """
+        Heart beats of one ECG, every feature is derived from these without detecting again.
+
+        points: sample indices of the heart beats (see bpm_points)
+        length: number of samples of the ECG
+        sample_rate: in Hz
+    """
+
+    def __init__(self, points: np.ndarray, length: int, sample_rate: float = 512):
+        self.points = np.asarray(points, dtype=np.int64)
+        self.length = length
+        self.sample_rate = sample_rate
+        # Distances between neighbouring beats in samples, see heartbeat_distances_ms
+        self.distances = np.diff(self.points)
+
+    @property
+    def bpm(self) -> float:
+        """
+            Same as bpm(ecg).
+        """
+        return len(self.points) * (60 / (self.length / self.sample_rate))
+
+    @property
+    def rr_intervals_ms(self) -> np.ndarray:
+        return self.distances * (1000 / self.sample_rate)
+
+    @property
+    def hrvs(self) -> np.ndarray:
+        """
+            Same values as hrvs(ecg).
+        """
+        return np.abs(np.diff(self.distances))
+
+    @property
+    def hrv(self) -> float:
+        """
+            Same as heart_rate_variability(ecg), NaN with less than three beats.
+        """
+        hrvs = self.hrvs
+        return float(np.mean(hrvs)) if len(hrvs) else np.nan
+
+    @property
+    def hrv_pairwise(self) -> float:
+        """
+            Same as heart_rate_variability_pairwise(ecg), NaN with less than three beats.
+        """
+        # The pairs never include the last distance, see hrvs_pairwise
+        dist = self.distances[:-1]
+        n = len(dist)
+        return float(pairwise_differences_sum(dist) / (n * (n + 1) // 2)) if n else np.nan
+
+    def features(self) -> Dict[str, float]:
+        rr_intervals = self.rr_intervals_ms
+        return {
+            "length": self.length,
+            "beats": len(self.points),
+            "bpm": self.bpm,
+            "mean_rr_ms": float(np.mean(rr_intervals)) if len(rr_intervals) else np.nan,
+            "hrv": self.hrv,
+            "hrv_pairwise": self.hrv_pairwise,
+        }
+
+    def split_between(self, values) -> list:
+        """
+            Same as split_between_heartbeats(ecg) for values = ecg.data.
+        """
+        points = self.points.tolist()
+        return [values[points[i]:points[i + 1]] for i in range(0, len(points) - 1)]
+
+    def split_around(self, values) -> list:
+        """
+            Same as split_around_heartbeats(ecg) for values = ecg.data.
+        """
+        points, distances = self.points.tolist(), self.distances.tolist()
+        splits = []
+        for i in range(1, len(distances) - 2):
+            split_half = int(distances[i] / 2)
+            splits.append(values[points[i] - split_half:points[i] + split_half])
+        return splits
+
+
+class ECGFeatures:
+    """
+        Feature engine running the heart beat detection once per ECG.
+
+        The ECGBeats of an ECG are memoized by ECG name, ECG length, a hash of its samples
+        and the detection parameters, so a re-exported ECG with the same name and length is
+        detected again. At most cache_size of them are kept, the least recently used ones
+        are evicted first.
+
+        a: heart beat slope amplitude threshold
+        d: heart beat distance threshold in samples
+        r: kept for compatibility, see bpm_points
+        sample_rate: in Hz
+    """
+
+    def __init__(self, a: float = 50, d: float = 180, r: float = 3, sample_rate: float = 512, cache_size: int = 1024):
+        self.a = a
+        self.d = d
+        self.r = r
+        self.sample_rate = sample_rate
+        self.cache_size = cache_size
+        self.__cache: "OrderedDict[Hashable, ECGBeats]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.__cache)
+
+    def __key(self, name: str, values: np.ndarray) -> Tuple:
+        digest = hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float32).tobytes(), digest_size=16).digest()
+        return (name, len(values), digest, self.a, self.d, self.r, self.sample_rate)
+
+    def __remember(self, key: Tuple, beats: ECGBeats) -> ECGBeats:
+        if self.cache_size > 0:
+            self.__cache[key] = beats
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+        return beats
+
+    def clear(self):
+        self.__cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def beats(self, ecg: ECG) -> ECGBeats:
+        key = self.__key(ecg.name, np.asarray(ecg.y))
+        if key in self.__cache:
+            self.hits += 1
+            self.__cache.move_to_end(key)
+            return self.__cache[key]
+        self.misses += 1
+        points = bpm_points(ecg, self.a, self.d, self.r)
+        return self.__remember(key, ECGBeats(points, len(ecg.y), self.sample_rate))
+
+    def bpm(self, ecg: ECG) -> float:
+        return self.beats(ecg).bpm
+
+    def rr_intervals_ms(self, ecg: ECG) -> np.ndarray:
+        return self.beats(ecg).rr_intervals_ms
+
+    def hrv(self, ecg: ECG) -> float:
+        return self.beats(ecg).hrv
+
+    def hrv_pairwise(self, ecg: ECG) -> float:
+        return self.beats(ecg).hrv_pairwise
+
+    def split_between_heartbeats(self, ecg: ECG) -> list:
+        return self.beats(ecg).split_between(ecg.data)
+
+    def split_around_heartbeats(self, ecg: ECG) -> list:
+        return self.beats(ecg).split_around(ecg.data)
+
+    def beat_windows(self, ecg: ECG, window: Optional[int] = None, before: Optional[int] = None,
+                     pad: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            beat_windows(ecg) around the memoized heart beats.
+        """
+        return beat_windows(ecg, window, before, self.beats(ecg).points, pad)
+
+    def features(self, ecg: ECG) -> Dict[str, float]:
+        return {"name": ecg.name, **self.beats(ecg).features()}
+
+    def __corpus_beats(self, corpus: ECGCorpus) -> List[ECGBeats]:
+        # Only the rows that are not memoized are detected, all of them in one batch
+        keys = [self.__key(name, corpus.values(i)) for i, name in enumerate(corpus.names)]
+        beats: List[ECGBeats] = [self.__cache.get(key) for key in keys]
+        missing = [i for i, b in enumerate(beats) if b is None]
+        self.hits += len(beats) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # The whole corpus is detected from the mapped file block by block
+            samples = corpus if len(missing) == len(keys) else corpus.samples[missing]
+            points = bpm_points_batch(samples, self.a, self.d, self.r)
+            for i, p in zip(missing, points):
+                beats[i] = ECGBeats(p, int(corpus.lengths[i]), self.sample_rate)
+        for key, b in zip(keys, beats):
+            self.__remember(key, b)
+        return beats
+
+    def feature_table(self, ecgs: Union[List[ECG], ECGCorpus]) -> pd.DataFrame:
+        """
+            One row of features per ECG: name, length, beats, bpm, mean_rr_ms, hrv and
+            hrv_pairwise. The heart beats of an ECGCorpus are detected in one batch.
+        """
+        if isinstance(ecgs, ECGCorpus):
+            names, beats = ecgs.names, self.__corpus_beats(ecgs)
+        else:
+            names, beats = [ecg.name for ecg in ecgs], [self.beats(ecg) for ecg in ecgs]
+        table = pd.DataFrame([b.features() for b in beats], columns=FEATURE_COLUMNS)
+        table.insert(0, "name", names)
+        return table
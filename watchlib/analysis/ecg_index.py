@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from annoy import AnnoyIndex
+
+from watchlib.analysis.annoy import add_items
+from watchlib.analysis.ecg_embedding import ECGEmbedding
+from watchlib.analysis.exact_search import ExactIndex
+from watchlib.data_handler.ecg_corpus import ECGCorpus, ecg_matrix, min_ecg_length
+from watchlib.utils import ECG
+
+METHODS = ["annoy", "interpolation", "pca"]
+
+# Tree counts tried by tune_trees
+TREE_CANDIDATES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+def tune_trees(vectors: np.ndarray, candidates: Iterable[int] = TREE_CANDIDATES, k: int = 10, queries: int = 100,
+               target_recall: Optional[float] = None, metric: str = "angular", seed: int = 0) -> pd.DataFrame:
+    """
+        Measures the build time and the recall@k of annoy indices of the vectors with every
+        number of trees in candidates, for the nearest neighbours of `queries` random items
+        against an ExactIndex. The items themselves do not count as their own neighbours.
+
+        The trees are only built once: every candidate adds a forest of the missing trees,
+        the neighbours of t trees are the nearest of the neighbours found by the forests of
+        the first t trees, each searched like an index of its own trees. build_time is the
+        time of all forests so far.
+
+        target_recall: stop after the first tree count reaching it
+
+        Returns a table with the columns trees, build_time (seconds) and recall.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    candidates = sorted(set(candidates))
+    k = min(k, n - 1)
+    if k < 1:
+        # Without other items every index finds all neighbours
+        return pd.DataFrame([{"trees": trees, "build_time": 0.0, "recall": 1.0} for trees in candidates[:1]],
+                            columns=["trees", "build_time", "recall"])
+
+    items = np.random.default_rng(seed).choice(n, size=min(queries, n), replace=False)
+    exact, _ = ExactIndex.from_matrix(vectors).nns_by_items(items, k + 1)
+    exact = [set(row[row != item][:k].tolist()) for item, row in zip(items, exact)]
+
+    rows = []
+    found = [{} for _ in items]
+    built, build_time = 0, 0.0
+    for trees in candidates:
+        start = time.perf_counter()
+        forest = AnnoyIndex(vectors.shape[1], metric=metric)
+        add_items(forest, vectors)
+        forest.build(trees - built)
+        build_time += time.perf_counter() - start
+        built = trees
+
+        hits = 0
+        for item, neighbours, expected in zip(items, found, exact):
+            neighbours.update(zip(*forest.get_nns_by_item(int(item), k + 1, include_distances=True)))
+            nearest = sorted((distance, i) for i, distance in neighbours.items() if i != item)[:k]
+            hits += len({i for _, i in nearest} & expected)
+        forest.unload()
+
+        recall = float(hits / (k * len(items)))
+        rows.append({"trees": trees, "build_time": build_time, "recall": recall})
+        if target_recall is not None and recall >= target_recall:
+            break
+    return pd.DataFrame(rows, columns=["trees", "build_time", "recall"])
+
+def _ecg_signature(ecgs: Union[List[ECG], ECGCorpus]) -> dict:
+    """
+        Names and lengths of the ECGs and, for a corpus, the inode, modification time and
+        size of its sample file (None for lists of ECGs). ECGCorpus.write replaces the
+        file, so a corpus with an unchanged signature has unchanged samples.
+    """
+    if isinstance(ecgs, ECGCorpus):
+        stat = os.stat(os.path.join(ecgs.path, ECGCorpus.SAMPLES))
+        return {"names": ecgs.names, "lengths": ecgs.lengths.tolist(),
+                "samples_file": [stat.st_ino, stat.st_mtime_ns, stat.st_size]}
+    return {"names": [ecg.name for ecg in ecgs], "lengths": [len(ecg.y) for ecg in ecgs], "samples_file": None}
+
+
+def _saved_is_current(meta: Optional[dict], params: dict, ecgs: Union[List[ECG], ECGCorpus],
+                      fingerprint: Callable[[Union[List[ECG], ECGCorpus]], str]) -> Tuple[bool, Optional[str]]:
+    """
+        Whether the saved index described by meta was built from the ECGs with params, and
+        the fingerprint of the ECGs if it had to be computed.
+
+        Changed parameters, names or lengths are detected without hashing the samples, a
+        corpus with the saved sample file signature is current without hashing them.
+    """
+    signature = _ecg_signature(ecgs)
+    if (meta is None or any(meta.get(key) != value for key, value in params.items())
+            or meta.get("names") != signature["names"] or meta.get("lengths") != signature["lengths"]):
+        return False, None
+    if signature["samples_file"] is not None and meta.get("samples_file") == signature["samples_file"]:
+        return True, None
+    fingerprint = fingerprint(ecgs)
+    return meta.get("fingerprint") == fingerprint, fingerprint
+
+
+def _write_meta(path: str, meta: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+class ECGIndex:
+    """
+        Annoy index of ECGs that is built once and saved to path.
+
+        path holds the annoy index (ecg_index.ann), the PCA of the "pca" method
+        (ecg_pca.npz) and ecg_index.json with the ECG name and length of every item, the
+        parameters and the fingerprint of the indexed samples. ensure(ecgs) reopens the
+        saved index if the fingerprint of the ECGs is unchanged and rebuilds it otherwise.
+        Changed names or lengths rebuild without hashing the samples, an unchanged sample
+        file of a corpus reopens without hashing them. The index is memory-mapped,
+        processes opening the same index share its pages.
+
+        method: "annoy" indexes the samples _from:_to, "interpolation" every res-th sample
+                and "pca" the principal components of the samples (see the annoy module)
+        components: number of principal components, min(n_ecgs, n_samples) by default
+        solver: PCA solver of the ECGEmbedding, "incremental" if components is given and
+                "full" otherwise by default
+        trees: number of annoy trees, "auto" picks the fewest trees reaching target_recall
+               (see tune_trees)
+    """
+
+    INDEX = "ecg_index.ann"
+    META = "ecg_index.json"
+    PCA = "ecg_pca.npz"
+    VERSION = 2
+
+    def __init__(self, path: str, method: str = "annoy", _from: int = None, _to: int = None, res: int = 5,
+                 components: int = None, solver: str = None, trees: Union[int, str] = "auto", target_recall: float = 0.95,
+                 metric: str = "angular"):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}, use one of {METHODS}")
+        self.path = path
+        self.method = method
+        self._from = _from
+        self._to = _to
+        self.res = res
+        self.components = components
+        self.solver = solver or ("incremental" if components else "full")
+        self.trees = trees
+        self.target_recall = target_recall
+        self.metric = metric
+
+        self.index: Optional[AnnoyIndex] = None
+        self.names: List[str] = []
+        self.meta: dict = {}
+        self.embedding: Optional[ECGEmbedding] = None
+        self.positions = {}
+
+    # --------------------------
+    # Fingerprint
+    # --------------------------
+
+    def __window(self, ecgs: Union[List[ECG], ECGCorpus]) -> slice:
+        min_length = min_ecg_length(ecgs)
+        if self.method == "annoy":
+            return slice(0 if self._from is None else self._from, min_length if self._to is None else self._to, 1)
+        return slice(0, min_length, self.res if self.method == "interpolation" else 1)
+
+    def __params(self, window: slice) -> dict:
+        return {"version": self.VERSION, "method": self.method, "window": [window.start, window.stop, window.step],
+                "components": self.components, "solver": self.solver, "trees": self.trees, "target_recall": self.target_recall,
+                "metric": self.metric}
+
+    def fingerprint(self, ecgs: Union[List[ECG], ECGCorpus]) -> str:
+        """
+            Hash of the parameters, the ECG names and the indexed samples.
+        """
+        window = self.__window(ecgs)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps(self.__params(window), sort_keys=True).encode("utf-8"))
+        names = ecgs.names if isinstance(ecgs, ECGCorpus) else [ecg.name for ecg in ecgs]
+        h.update(json.dumps(names).encode("utf-8"))
+        matrix = ecg_matrix(ecgs, window.start, window.stop, window.step)
+        # Rows of a corpus are hashed block by block straight from the mapped file
+        for start in range(0, len(matrix), 1024):
+            h.update(np.ascontiguousarray(np.asarray(matrix[start:start + 1024], dtype=np.float32)).tobytes())
+        return h.hexdigest()
+
+    # --------------------------
+    # Saving and loading
+    # --------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, self.META)) and os.path.exists(os.path.join(self.path, self.INDEX))
+
+    def __read_meta(self) -> Optional[dict]:
+        if not self.exists():
+            return None
+        with open(os.path.join(self.path, self.META), "r") as f:
+            return json.load(f)
+
+    def is_current(self, ecgs: Union[List[ECG], ECGCorpus], fingerprint: str = None) -> bool:
+        meta = self.__read_meta()
+        if meta is None:
+            return False
+        return meta.get("fingerprint") == (fingerprint or self.fingerprint(ecgs))
+
+    def load(self) -> "ECGIndex":
+        """
+            Opens the saved index memory-mapped.
+        """
+        with open(os.path.join(self.path, self.META), "r") as f:
+            self.meta = json.load(f)
+        self.names = self.meta["names"]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+
+        self.embedding = None
+        if self.meta["method"] == "pca":
+            self.embedding = ECGEmbedding.load(os.path.join(self.path, self.PCA))
+
+        self.index = AnnoyIndex(self.meta["dimension"], metric=self.meta["metric"])
+        self.index.load(os.path.join(self.path, self.INDEX))
+        return self
+
+    def build(self, ecgs: Union[List[ECG], ECGCorpus], fingerprint: str = None) -> "ECGIndex":
+        """
+            Builds the index of the ECGs, saves it to path and opens it.
+        """
+        fingerprint = fingerprint or self.fingerprint(ecgs)
+        window = self.__window(ecgs)
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".ecg_index", dir=self.path)
+        try:
+            if self.method == "pca":
+                # Only the (n_ecgs, components) embedding is held in memory
+                components = self.components or min(len(ecgs), window.stop - window.start)
+                embedding = ECGEmbedding(components, self.solver, _from=window.start, _to=window.stop)
+                embedding.fit(ecgs).save(os.path.join(tmp_path, self.PCA))
+                vectors = embedding.transform(ecgs)
+            else:
+                vectors = np.asarray(ecg_matrix(ecgs, window.start, window.stop, window.step), dtype=np.float32)
+
+            trees = self.trees
+            tuning = None
+            if trees == "auto":
+                tuning = tune_trees(vectors, target_recall=self.target_recall, metric=self.metric)
+                trees = int(tuning["trees"].iloc[-1])
+
+            t = AnnoyIndex(vectors.shape[1], metric=self.metric)
+            add_items(t, vectors)
+            t.build(trees)
+            t.save(os.path.join(tmp_path, self.INDEX))
+            t.unload()
+
+            meta = {**self.__params(window), "fingerprint": fingerprint, **_ecg_signature(ecgs),
+                    "dimension": int(vectors.shape[1]), "built_trees": trees,
+                    "tuning": None if tuning is None else tuning.to_dict(orient="records")}
+            with open(os.path.join(tmp_path, self.META), "w") as f:
+                json.dump(meta, f)
+
+            # The json is replaced last, it only ever describes a complete index
+            if self.method == "pca":
+                os.replace(os.path.join(tmp_path, self.PCA), os.path.join(self.path, self.PCA))
+            os.replace(os.path.join(tmp_path, self.INDEX), os.path.join(self.path, self.INDEX))
+            os.replace(os.path.join(tmp_path, self.META), os.path.join(self.path, self.META))
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return self.load()
+
+    def ensure(self, ecgs: Union[List[ECG], ECGCorpus]) -> "ECGIndex":
+        """
+            Opens the saved index if it was built from the same ECGs, rebuilds it otherwise.
+
+            The samples are only hashed if the parameters, names and lengths are unchanged
+            and the ECGs are a list or a corpus whose sample file was replaced.
+        """
+        meta = self.__read_meta()
+        current, fingerprint = _saved_is_current(meta, self.__params(self.__window(ecgs)), ecgs, self.fingerprint)
+        if not current:
+            return self.build(ecgs, fingerprint)
+        if fingerprint is not None and isinstance(ecgs, ECGCorpus):
+            # Same samples in a new file, the next call does not have to hash them again
+            _write_meta(os.path.join(self.path, self.META), {**meta, **_ecg_signature(ecgs)})
+        return self.load()
+
+    # --------------------------
+    # Queries
+    # --------------------------
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def transform(self, values) -> np.ndarray:
+        """
+            Item vector of the samples of a new ECG, which needs at least as many samples as
+            the end of the indexed window.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        start, stop, step = self.meta["window"]
+        if len(values) < stop:
+            raise ValueError(f"The ECG has {len(values)} samples, the index needs the samples {start}:{stop}")
+        if self.embedding is not None:
+            return self.embedding.transform(values)
+        return values[start:stop:step]
+
+    def query(self, item: Union[int, str], count: int) -> List[int]:
+        """
+            Items of the count nearest ECGs of an item, by position or ECG name.
+        """
+        i = self.positions[item] if isinstance(item, str) else item
+        return self.index.get_nns_by_item(i, count)
+
+    def query_names(self, item: Union[int, str], count: int) -> List[str]:
+        return [self.names[i] for i in self.query(item, count)]
+
+    def query_ecg(self, ecg: ECG, count: int) -> List[int]:
+        """
+            Items of the count nearest ECGs of an ECG that does not have to be indexed.
+            Raises a ValueError if the ECG is shorter than the indexed window.
+        """
+        return self.index.get_nns_by_vector(self.transform(ecg.y).tolist(), count)
@@ -0,0 +1,88 @@
+from typing import List, Optional, Union
+
+import numpy as np
+
+from watchlib.data_handler.ecg_corpus import ECGCorpus, ecg_metadata
+from watchlib.utils import ECG
+
+
+def fft_resample(x: np.ndarray, num: int) -> np.ndarray:
+    """
+        Resamples every row of x to num samples in the frequency domain, like
+        scipy.signal.resample. Frequencies above the Nyquist frequency of the shorter
+        length are removed, so downsampling does not alias.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    if num == n:
+        return x.copy()
+    if n == 0 or num == 0:
+        return np.zeros(x.shape[:-1] + (num,))
+
+    spectrum = np.fft.rfft(x, axis=-1)
+    resampled = np.zeros(x.shape[:-1] + (num // 2 + 1,), dtype=spectrum.dtype)
+    shorter = min(n, num)
+    resampled[..., :shorter // 2 + 1] = spectrum[..., :shorter // 2 + 1]
+    if shorter % 2 == 0:
+        # The Nyquist bin of the shorter length stands for both the positive and the negative frequency
+        resampled[..., shorter // 2] *= 2.0 if num < n else 0.5
+    return np.fft.irfft(resampled, num, axis=-1) * (num / n)
+
+
+def _sample_rates(ecgs: Union[List[ECG], ECGCorpus], default: float) -> np.ndarray:
+    if isinstance(ecgs, ECGCorpus):
+        rates = ecgs.metadata["sample_rate"].to_numpy(dtype=np.float64)
+    else:
+        lengths = np.array([len(ecg.y) for ecg in ecgs], dtype=np.int64)
+        rates = ecg_metadata([ecg.name for ecg in ecgs], lengths, [ecg.meta_data for ecg in ecgs])["sample_rate"]
+        rates = rates.to_numpy(dtype=np.float64)
+    return np.where(np.isnan(rates) | (rates <= 0), default, rates)
+
+
+def resample_ecgs(ecgs: Union[List[ECG], ECGCorpus], sample_rate: float = 128, duration: Optional[float] = None,
+                  offset: float = 0, fill: float = 0.0, default_sample_rate: float = 512,
+                  block_size: int = 256) -> np.ndarray:
+    """
+        Brings every ECG to the same sample rate and length as one dense (n_ecgs, n_samples)
+        float32 matrix, instead of truncating all ECGs to the shortest one.
+
+        The seconds offset:offset + duration of every ECG are resampled from its own sample
+        rate (meta data "Sample Rate", default_sample_rate if missing) with fft_resample,
+        which low-pass filters before downsampling. ECGs with the same sample rate and the
+        same number of samples in the window are resampled together, block_size at a time.
+
+        sample_rate: target sample rate in Hz, n_samples = round(duration * sample_rate)
+        duration: seconds per ECG, defaults to the longest ECG after offset
+        fill: value after the end of ECGs shorter than the window
+    """
+    rates = _sample_rates(ecgs, default_sample_rate)
+    lengths = ecgs.lengths if isinstance(ecgs, ECGCorpus) else np.array([len(ecg.y) for ecg in ecgs], dtype=np.int64)
+    if duration is None:
+        duration = max(float(np.max(lengths / rates)) - offset, 0) if len(lengths) else 0
+    n_samples = int(round(duration * sample_rate))
+
+    # Source samples of every ECG inside the window
+    starts = np.round(offset * rates).astype(np.int64)
+    stops = np.minimum(lengths, starts + np.round(duration * rates).astype(np.int64))
+    counts = np.maximum(stops - starts, 0)
+    # Target samples covered by the source samples, all of them if the ECG fills the window
+    covered = np.where(counts == np.round(duration * rates), n_samples,
+                       np.minimum(np.round(counts * sample_rate / rates), n_samples)).astype(np.int64)
+
+    resampled = np.full((len(lengths), n_samples), fill, dtype=np.float32)
+    groups = {}
+    for i, key in enumerate(zip(rates.tolist(), starts.tolist(), counts.tolist())):
+        groups.setdefault(key, []).append(i)
+
+    for (rate, start, count), rows in groups.items():
+        if count == 0:
+            continue
+        width = int(covered[rows[0]])
+        for block_start in range(0, len(rows), block_size):
+            block = rows[block_start:block_start + block_size]
+            if isinstance(ecgs, ECGCorpus):
+                values = ecgs.samples[block, start:start + count]
+            else:
+                values = np.array([ecgs[i].y[start:start + count] for i in block], dtype=np.float64)
+            resampled[block, :width] = fft_resample(values, width)
+    return resampled
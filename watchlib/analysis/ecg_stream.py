@@ -0,0 +1,141 @@
+from typing import Optional
+
+import numpy as np
+
+from watchlib.analysis.analysis_ecg_utils import detect_beats
+
+
+class StreamingBeatDetector:
+    """
+        bpm_points for ECG samples arriving in chunks, e.g. from a device.
+
+        The detector only keeps the last sample of the previous chunk (the slope across
+        the chunk boundary), the last heart beat and a ring buffer with the beats of the
+        last `window` seconds, so memory is constant however long the stream runs. A beat
+        is reported with the chunk containing the sample after it, and a chunk is
+        processed in time linear in its length.
+
+        The beats of all chunks are the beats bpm_points finds in the whole signal, bpm
+        and hrv equal bpm(ecg) and heart_rate_variability(ecg) of the samples so far.
+
+        a: heart beat slope amplitude threshold
+        d: heart beat distance threshold in samples
+        r: kept for compatibility, see bpm_points
+        sample_rate: in Hz
+        window: seconds covered by rolling_bpm and rolling_hrv
+    """
+
+    def __init__(self, a: float = 50, d: float = 180, r: float = 3, sample_rate: float = 512, window: float = 30):
+        if d <= 0:
+            raise ValueError("d must be positive")
+        self.a = a
+        self.d = d
+        self.r = r
+        self.sample_rate = sample_rate
+        self.window = window
+        self.window_samples = int(round(window * sample_rate))
+        # Beats are more than d samples apart, so this many fit into a window
+        self.__ring = np.empty(int(np.ceil(self.window_samples / d)) + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.beats = 0
+        self.__last_sample: Optional[float] = None
+        self.__last_beat: Optional[int] = None
+        self.__last_distance: Optional[int] = None
+        self.__hrv_sum = 0
+        self.__hrv_count = 0
+        self.__head = 0
+        self.__size = 0
+
+    @property
+    def last_beat(self) -> Optional[int]:
+        return self.__last_beat
+
+    def push(self, chunk) -> np.ndarray:
+        """
+            Adds the next samples of the stream, returns the stream indices of the new heart beats.
+        """
+        values = np.asarray(chunk, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        if self.__last_sample is None:
+            slopes, base = np.diff(values), self.samples
+        else:
+            # The slope between the last sample of the previous chunk and the first one of this
+            slopes, base = np.diff(values, prepend=self.__last_sample), self.samples - 1
+        # Without a beat yet, the first beat has to be after index 0 like in bpm_points
+        last = (-self.d if self.__last_beat is None else self.__last_beat) - base
+        beats = detect_beats(slopes, self.a, self.d, last) + base
+
+        self.samples += len(values)
+        self.__last_sample = values[-1]
+        self.__add(beats)
+        return beats
+
+    def __add(self, beats: np.ndarray):
+        if len(beats) == 0:
+            return
+        self.beats += len(beats)
+
+        previous = [] if self.__last_beat is None else [self.__last_beat]
+        distances = np.diff(np.concatenate((previous, beats))).astype(np.int64)
+        previous = [] if self.__last_distance is None else [self.__last_distance]
+        hrvs = np.abs(np.diff(np.concatenate((previous, distances)).astype(np.int64)))
+        self.__hrv_sum += int(hrvs.sum())
+        self.__hrv_count += len(hrvs)
+        self.__last_beat = int(beats[-1])
+        if len(distances):
+            self.__last_distance = int(distances[-1])
+
+        # Only the newest beats fitting into the ring are kept
+        beats = beats[-len(self.__ring):]
+        positions = (self.__head + np.arange(len(beats))) % len(self.__ring)
+        self.__ring[positions] = beats
+        self.__head = (self.__head + len(beats)) % len(self.__ring)
+        self.__size = min(self.__size + len(beats), len(self.__ring))
+
+    @property
+    def recent_beats(self) -> np.ndarray:
+        """
+            Stream indices of the heart beats within the last window seconds, oldest first.
+        """
+        positions = (self.__head - self.__size + np.arange(self.__size)) % len(self.__ring)
+        beats = self.__ring[positions]
+        return beats[beats >= self.samples - self.window_samples]
+
+    @property
+    def bpm(self) -> float:
+        """
+            bpm of all samples so far.
+        """
+        if self.samples == 0:
+            return np.nan
+        return self.beats * (60 / (self.samples / self.sample_rate))
+
+    @property
+    def hrv(self) -> float:
+        """
+            heart_rate_variability of all samples so far, NaN with less than three beats.
+        """
+        return self.__hrv_sum / self.__hrv_count if self.__hrv_count else np.nan
+
+    @property
+    def rolling_bpm(self) -> float:
+        """
+            bpm of the last window seconds.
+        """
+        samples = min(self.samples, self.window_samples)
+        if samples == 0:
+            return np.nan
+        return len(self.recent_beats) * (60 / (samples / self.sample_rate))
+
+    @property
+    def rolling_hrv(self) -> float:
+        """
+            heart_rate_variability of the last window seconds, NaN with less than three beats.
+        """
+        hrvs = np.abs(np.diff(self.recent_beats, n=2))
+        return float(np.mean(hrvs)) if len(hrvs) else np.nan
@@ -0,0 +1,133 @@
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from watchlib.data_handler.ecg_corpus import ECGCorpus, ecg_matrix, min_ecg_length
+from watchlib.utils import ECG
+
+
+class ExactIndex:
+    """
+        Exact nearest neighbour search over the cosine similarity of ECG vectors.
+
+        ExactIndex answers get_nns_by_item / get_nns_by_vector like an angular AnnoyIndex,
+        so it can be used with query_annoy and query_and_plot_annoy. The vectors are
+        normalized once, queries are answered block by block with one matrix multiply and
+        argpartition per block, query_batch answers many queries at once.
+
+        f: number of dimensions
+        block_size: rows of the vector matrix multiplied at once, bounds the memory of a
+                    query batch to block_size * n_queries similarities
+    """
+
+    def __init__(self, f: int, metric: str = "angular", block_size: int = 65536):
+        if metric != "angular":
+            raise ValueError("ExactIndex only supports the angular metric")
+        self.f = f
+        self.metric = metric
+        self.block_size = block_size
+        self.__items: List[np.ndarray] = []
+        self.vectors = np.empty((0, f), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def from_matrix(cls, vectors, block_size: int = 65536) -> "ExactIndex":
+        """
+            Index of the rows of an (n_items, f) matrix, item i is row i.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        index = cls(vectors.shape[1], block_size=block_size)
+        index.__set(vectors)
+        return index
+
+    def __set(self, vectors: np.ndarray):
+        self.norms = np.linalg.norm(vectors, axis=1)
+        # Zero vectors stay zero and are similar to nothing
+        self.vectors = vectors / np.where(self.norms == 0, 1, self.norms)[:, None]
+
+    def add_item(self, i: int, vector):
+        if i != len(self.__items):
+            raise ValueError("ExactIndex items have to be added in order")
+        self.__items.append(np.asarray(vector, dtype=np.float32))
+
+    def build(self, n_trees: int = None, n_jobs: int = -1) -> bool:
+        """
+            Normalizes the added items, the arguments only exist for compatibility with AnnoyIndex.
+        """
+        if self.__items:
+            self.__set(np.vstack([self.vectors * self.norms[:, None]] + [np.stack(self.__items)]))
+            self.__items = []
+        return True
+
+    def get_n_items(self) -> int:
+        return len(self.vectors)
+
+    def get_item_vector(self, i: int) -> List[float]:
+        return (self.vectors[i] * self.norms[i]).tolist()
+
+    def query_batch(self, queries, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Items and cosine similarities of the k most similar items of every query vector,
+            most similar first, as two (n_queries, k) arrays.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        k = min(k, len(self.vectors))
+
+        best_items = np.empty((len(queries), 0), dtype=np.int64)
+        best_similarities = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self.vectors), self.block_size):
+            similarities = queries @ self.vectors[start:start + self.block_size].T
+            block_k = min(k, similarities.shape[1])
+            top = np.argpartition(-similarities, block_k - 1, axis=1)[:, :block_k]
+            # Keep the k best of the previous blocks and this block
+            items = np.concatenate((best_items, top + start), axis=1)
+            similarities = np.concatenate((best_similarities, np.take_along_axis(similarities, top, axis=1)), axis=1)
+            if items.shape[1] > k:
+                top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+                items = np.take_along_axis(items, top, axis=1)
+                similarities = np.take_along_axis(similarities, top, axis=1)
+            best_items, best_similarities = items, similarities
+
+        # Most similar first, equal similarities by item
+        order = np.lexsort((best_items, -best_similarities), axis=1)
+        return np.take_along_axis(best_items, order, axis=1), np.take_along_axis(best_similarities, order, axis=1)
+
+    def nns_by_items(self, items, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            query_batch for the vectors of indexed items.
+        """
+        return self.query_batch(self.vectors[np.asarray(items)], k)
+
+    def __result(self, items: np.ndarray, similarities: np.ndarray, include_distances: bool):
+        if include_distances:
+            # Annoy's angular distance of normalized vectors
+            return items.tolist(), np.sqrt(np.maximum(2 - 2 * similarities.astype(np.float64), 0)).tolist()
+        return items.tolist()
+
+    def get_nns_by_item(self, i: int, n: int, search_k: int = -1, include_distances: bool = False):
+        items, similarities = self.nns_by_items([i], n)
+        return self.__result(items[0], similarities[0], include_distances)
+
+    def get_nns_by_vector(self, vector, n: int, search_k: int = -1, include_distances: bool = False):
+        items, similarities = self.query_batch(vector, n)
+        return self.__result(items[0], similarities[0], include_distances)
+
+
+def exact(ecgs: Union[List[ECG], ECGCorpus], _from: int = None, _to: int = None) -> ExactIndex:
+    """
+        Exact search over the samples _from:_to of every ECG. Raises a ValueError if _to lies
+        past the end of the shortest ECG instead of indexing padded rows, resample the ECGs
+        first (see resample_ecgs) to search ECGs of different lengths.
+    """
+    if _from is None: _from = 0
+    if _to is None: _to = min_ecg_length(ecgs)
+    return ExactIndex.from_matrix(ecg_matrix(ecgs, _from, _to))
+
+
+def query_exact_batch(t: ExactIndex, queries: List[int], count: int) -> List[List[int]]:
+    """
+        query_annoy for many items at once.
+    """
+    return t.nns_by_items(queries, count)[0].tolist()
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from watchlib.analysis.analysis_ecg_utils import bpm_points, bpm_points_batch, detect_beats, ecg_slopes
+from watchlib.analysis.analysis_utils import slopes_for
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from watchlib.utils import ECG
+
+SETTINGS = [(50, 180), (20, 100), (300, 400), (50, 0.5)]
+
+
+def ecg_values(samples: int = 15360, seed: int = 0) -> np.ndarray:
+    # Noisy baseline with R peaks of about 900 uV at 55-95 bpm and a varying RR interval
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 15, samples)
+    beat = rng.uniform(320, 560)
+    peak = 20
+    while peak < samples:
+        width = np.arange(max(peak - 5, 0), min(peak + 6, samples))
+        values[width] += 900 * (1 - np.abs(width - peak) / 6)
+        peak += int(beat * rng.uniform(0.9, 1.1))
+    return np.round(values, 3)
+
+
+def ecg(values: np.ndarray, name: str = "ecg_0.csv") -> ECG:
+    return ECG.from_values(values, {"Sample Rate": "512 Hertz"}, name)
+
+
+def bpm_points_loop(ecg: ECG, a: float = 50, d: float = 180) -> list:
+    # bpm_points before it was vectorized
+    x, y = ecg.x, ecg.y
+    slopes = slopes_for(list(zip(x, y)))
+    points = [-d]
+    for idx, slope in enumerate(slopes):
+        if np.abs(slope) > a and np.abs(points[-1] - x[idx]) > d:
+            points.append(x[idx])
+    return points[1:]
+
+
+@pytest.mark.parametrize("a, d", SETTINGS)
+def test_bpm_points_match_the_loop(a, d):
+    for seed in range(3):
+        e = ecg(ecg_values(seed=seed))
+
+        assert bpm_points(e, a, d) == bpm_points_loop(e, a, d)
+
+
+def test_ecg_slopes_match_slopes_for():
+    e = ecg(ecg_values(2000))
+
+    np.testing.assert_allclose(ecg_slopes(e.y), slopes_for(list(zip(e.x, e.y))))
+
+
+def test_detect_beats_continues_after_the_last_beat():
+    slopes = ecg_slopes(ecg_values())
+    beats = detect_beats(slopes)
+
+    # Detecting the rest of the signal after a beat finds the remaining beats
+    rest = detect_beats(slopes[beats[2] + 1:], last=-1) + beats[2] + 1
+
+    assert rest.tolist() == beats[3:].tolist()
+
+
+def test_detect_beats_without_steep_slopes():
+    assert detect_beats(np.zeros(100)).tolist() == []
+    assert detect_beats(np.empty(0)).tolist() == []
+
+
+@pytest.mark.parametrize("a, d", SETTINGS)
+@pytest.mark.parametrize("block_size", [1, 2, 256])
+def test_bpm_points_batch_matches_bpm_points(tmp_path, a, d, block_size):
+    # The shorter ECG is padded with NaN in the corpus, the padding must not find beats
+    values = [ecg_values(seed=i) for i in range(4)] + [ecg_values(5000, seed=4)]
+    ECGCorpus.write(str(tmp_path), ((f"ecg_{i}.csv", v, {}) for i, v in enumerate(values)))
+    corpus = ECGCorpus(str(tmp_path))
+    expected = [bpm_points(e, a, d) for e in corpus]
+
+    assert [points.tolist() for points in bpm_points_batch(corpus, a, d, block_size=block_size)] == expected
+    assert [points.tolist() for points in bpm_points_batch(corpus.samples[:4], a, d, block_size=block_size)] == expected[:4]
+
+
+def test_bpm_points_batch_of_an_empty_matrix():
+    assert bpm_points_batch(np.empty((0, 100))) == []
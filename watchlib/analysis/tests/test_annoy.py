@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from watchlib.analysis.annoy import annoy, annoy_with_interpolation, annoy_with_pca, query_annoy
+from watchlib.analysis.ecg_resampling import fft_resample
+from watchlib.utils import ECG
+
+
+def ecg_values(samples: int = 5120, beat: int = 400, seed: int = 0) -> np.ndarray:
+    # Noisy baseline with an R peak of about 900 uV every beat samples, like the exports
+    rng = np.random.default_rng(seed)
+    phase = np.arange(samples) % beat
+    peaks = np.where(np.abs(phase - 20) < 6, 900 * (1 - np.abs(phase - 20) / 6), 0)
+    return np.round(rng.normal(0, 15, samples) + peaks, 3)
+
+
+def ecgs(n: int, samples: int = 2048):
+    return [ECG.from_values(ecg_values(samples, beat=300 + 7 * i, seed=i), {"Sample Rate": "512 Hertz"}, f"ecg_{i}.csv")
+            for i in range(n)]
+
+
+@pytest.mark.parametrize("n", [40, 120])
+def test_pca_size_does_not_grow_with_the_ecgs(n):
+    t = annoy_with_pca(ecgs(n), trees=5)
+
+    assert t.f == 32 and t.get_n_items() == n
+    assert query_annoy(t, 3, 1) == [3]
+
+
+def test_pca_size_is_limited_by_the_ecgs():
+    assert annoy_with_pca(ecgs(10), trees=5).f == 10
+    assert annoy_with_pca(ecgs(40), trees=5, components=8).f == 8
+
+
+def item_vectors(t) -> np.ndarray:
+    return np.array([t.get_item_vector(i) for i in range(t.get_n_items())])
+
+
+@pytest.mark.parametrize("build,width", [
+    (lambda ecgs: annoy(ecgs, trees=5), 2048),
+    (lambda ecgs: annoy(ecgs, 100, 1100, trees=5), 1000),
+    (lambda ecgs: annoy_with_interpolation(ecgs, trees=5, res=4), 512),
+])
+def test_short_ecg_does_not_shrink_the_features(build, width):
+    full = ecgs(8)
+    short = ECG.from_values(ecg_values(600, seed=99), {"Sample Rate": "512 Hertz"}, "short.csv")
+
+    t = build(full + [short])
+
+    assert t.f == width and t.get_n_items() == 9
+    # The other ECGs keep their features, the short one is padded with zeros
+    assert np.allclose(item_vectors(t)[:8], item_vectors(build(full)), atol=1e-3)
+    assert not item_vectors(t)[8, -200:].any()
+
+
+def test_annoy_keeps_the_samples_of_the_window():
+    full = ecgs(4)
+
+    vectors = item_vectors(annoy(full, 100, 1100, trees=5))
+
+    assert np.allclose(vectors, [ecg.y[100:1100] for ecg in full], atol=1e-3)
+
+
+def test_interpolation_does_not_alias():
+    # 200 Hz lies above the Nyquist frequency of 512 / 4 Hz, a [::4] stride keeps it as a 72 Hz wave
+    t = np.arange(2048) / 512
+    noise = ECG.from_values(np.sin(2 * np.pi * 200 * t), {"Sample Rate": "512 Hertz"}, "noise.csv")
+
+    vector = item_vectors(annoy_with_interpolation([noise] + ecgs(1), trees=5, res=4))[0]
+
+    assert np.abs(vector).max() < 0.05
+    assert np.abs(noise.y[::4]).max() > 0.5
+
+
+def test_other_sample_rates_are_resampled():
+    values = ecg_values(2048)
+    ecg = ECG.from_values(values, {"Sample Rate": "512 Hertz"}, "ecg.csv")
+    half = ECG.from_values(fft_resample(values, 1024), {"Sample Rate": "256 Hertz"}, "half.csv")
+
+    t = annoy_with_interpolation([ecg, half], trees=5, res=4)
+
+    assert t.f == 512
+    assert np.allclose(item_vectors(t)[0], item_vectors(t)[1], atol=1e-2)
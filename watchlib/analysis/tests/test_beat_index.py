@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from watchlib.analysis.beat_index import BeatIndex
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+
+
+def ecg_values(samples: int = 5120, beat: int = 400, seed: int = 0) -> np.ndarray:
+    # Noisy baseline with an R peak of about 900 uV every beat samples, like the exports
+    rng = np.random.default_rng(seed)
+    phase = np.arange(samples) % beat
+    peaks = np.where(np.abs(phase - 20) < 6, 900 * (1 - np.abs(phase - 20) / 6), 0)
+    return np.round(rng.normal(0, 15, samples) + peaks, 3)
+
+
+def write_corpus(path, seeds) -> ECGCorpus:
+    ECGCorpus.write(str(path), ((f"ecg_{i}.csv", ecg_values(seed=seed, beat=300 + 40 * i), {})
+                                for i, seed in enumerate(seeds)))
+    return ECGCorpus(str(path))
+
+
+def fail(ecgs):
+    raise AssertionError("the samples must not be hashed")
+
+
+@pytest.fixture
+def index(tmp_path):
+    return BeatIndex(str(tmp_path / "index"), window=128, backend="exact")
+
+
+def test_unchanged_corpus_is_not_hashed(tmp_path, index, monkeypatch):
+    corpus = write_corpus(tmp_path / "corpus", [0, 1, 2])
+    index.ensure(corpus)
+    n_beats = len(index)
+
+    monkeypatch.setattr(BeatIndex, "fingerprint", fail)
+    reopened = BeatIndex(index.path, window=128, backend="exact").ensure(corpus)
+
+    assert len(reopened) == n_beats and n_beats > 0
+
+
+def test_changed_names_rebuild_without_hashing(tmp_path, index, monkeypatch):
+    index.ensure(write_corpus(tmp_path / "corpus", [0, 1, 2]))
+    corpus = write_corpus(tmp_path / "corpus", [0, 1])
+    fingerprint = BeatIndex.fingerprint
+    calls = []
+    monkeypatch.setattr(BeatIndex, "fingerprint", lambda self, ecgs: calls.append(1) or fingerprint(self, ecgs))
+
+    index.ensure(corpus)
+
+    # Only build hashes the samples, ensure does not
+    assert len(calls) == 1 and index.names == corpus.names
+
+
+def test_rewritten_corpus_is_hashed_once(tmp_path, index, monkeypatch):
+    index.ensure(write_corpus(tmp_path / "corpus", [0, 1, 2]))
+    built = os.path.getmtime(os.path.join(index.path, index.WINDOWS))
+
+    # The same samples in a new file are reopened, the next call needs no hash
+    corpus = write_corpus(tmp_path / "corpus", [0, 1, 2])
+    index.ensure(corpus)
+    assert os.path.getmtime(os.path.join(index.path, index.WINDOWS)) == built
+    monkeypatch.setattr(BeatIndex, "fingerprint", fail)
+    BeatIndex(index.path, window=128, backend="exact").ensure(corpus)
+
+
+def test_changed_samples_rebuild(tmp_path, index):
+    index.ensure(write_corpus(tmp_path / "corpus", [0, 1, 2]))
+    corpus = write_corpus(tmp_path / "corpus", [3, 4, 5])
+
+    index.ensure(corpus)
+
+    assert index.is_current(corpus)
+    assert np.allclose(index.windows[0], corpus.values(0)[index.samples[0] - index.before:][:128], rtol=1e-3, atol=0.5)
+
+
+def test_lists_of_ecgs_are_hashed(tmp_path, index):
+    corpus = write_corpus(tmp_path / "corpus", [0, 1])
+    ecgs = list(corpus)
+    index.ensure(ecgs)
+    ecgs[0].y = (np.asarray(ecgs[0].y) + 1).tolist()
+
+    assert not index.is_current(ecgs)
+    index.ensure(ecgs)
+    assert index.is_current(ecgs)
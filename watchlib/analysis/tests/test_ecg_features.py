@@ -0,0 +1,65 @@
+import numpy as np
+
+from watchlib.analysis.analysis_ecg_utils import bpm_points
+from watchlib.analysis.ecg_features import ECGFeatures
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from watchlib.utils import ECG
+
+
+def ecg_values(samples: int = 15360, beat: int = 400, seed: int = 0) -> np.ndarray:
+    # Noisy baseline with an R peak of about 900 uV every beat samples, like the exports
+    rng = np.random.default_rng(seed)
+    phase = np.arange(samples) % beat
+    peaks = np.where(np.abs(phase - 20) < 6, 900 * (1 - np.abs(phase - 20) / 6), 0)
+    return np.round(rng.normal(0, 15, samples) + peaks, 3)
+
+
+def ecg(values: np.ndarray, name: str = "ecg_0.csv") -> ECG:
+    return ECG.from_values(values, {"Sample Rate": "512 Hertz"}, name)
+
+
+def test_memoized_beats():
+    features = ECGFeatures()
+    first = ecg(ecg_values())
+
+    beats = features.beats(first)
+
+    assert np.array_equal(beats.points, bpm_points(first))
+    assert features.beats(ecg(ecg_values())) is beats
+    assert features.hits == 1 and features.misses == 1
+
+
+def test_reexported_ecg_with_the_same_name_and_length_is_detected_again():
+    features = ECGFeatures()
+    features.beats(ecg(ecg_values(beat=400)))
+    reexported = ecg(ecg_values(beat=300, seed=1))
+
+    beats = features.beats(reexported)
+
+    assert np.array_equal(beats.points, bpm_points(reexported))
+    assert features.misses == 2 and len(features) == 2
+
+
+def test_corpus_rows_share_the_memoized_beats(tmp_path):
+    values = [ecg_values(seed=i, beat=300 + 50 * i) for i in range(3)]
+    ECGCorpus.write(str(tmp_path), ((f"ecg_{i}.csv", v, {"Sample Rate": "512 Hertz"}) for i, v in enumerate(values)))
+    corpus = ECGCorpus(str(tmp_path))
+    features = ECGFeatures()
+
+    table = features.feature_table(corpus)
+    for i in range(3):
+        features.beats(corpus[i])
+
+    assert table["name"].tolist() == corpus.names
+    assert features.misses == 3 and features.hits == 3
+
+
+def test_least_recently_used_beats_are_evicted():
+    features = ECGFeatures(cache_size=2)
+    ecgs = [ecg(ecg_values(seed=i), f"ecg_{i}.csv") for i in range(3)]
+
+    for e in ecgs:
+        features.beats(e)
+    features.beats(ecgs[0])
+
+    assert len(features) == 2 and features.misses == 4
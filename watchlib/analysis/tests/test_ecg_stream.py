@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from watchlib.analysis.analysis_ecg_utils import bpm_points
+from watchlib.analysis.ecg_analysis import bpm, heart_rate_variability
+from watchlib.analysis.ecg_stream import StreamingBeatDetector
+from watchlib.utils import ECG
+
+
+def ecg_values(samples: int = 60 * 512, seed: int = 0) -> np.ndarray:
+    # Noisy baseline with R peaks of about 900 uV at 55-95 bpm and a varying RR interval
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 15, samples)
+    beat = rng.uniform(320, 560)
+    peak = 20
+    while peak < samples:
+        width = np.arange(max(peak - 5, 0), min(peak + 6, samples))
+        values[width] += 900 * (1 - np.abs(width - peak) / 6)
+        peak += int(beat * rng.uniform(0.9, 1.1))
+    return np.round(values, 3)
+
+
+def chunk_bounds(samples: int, mean: int, seed: int = 0) -> np.ndarray:
+    # Chunks of 0 to 2 * mean samples, including empty chunks and single samples
+    sizes = np.random.default_rng(seed).integers(0, 2 * mean + 1, size=2 * samples // mean + 1)
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    return np.concatenate((bounds[bounds < samples], [samples]))
+
+
+def stream(detector: StreamingBeatDetector, values: np.ndarray, bounds: np.ndarray) -> list:
+    beats = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        beats.extend(detector.push(values[start:end]).tolist())
+    return beats
+
+
+@pytest.mark.parametrize("mean", [1, 7, 256, 4096])
+def test_streamed_beats_match_the_whole_recording(mean):
+    values = ecg_values()
+    ecg = ECG.from_values(values, {}, "ecg")
+    detector = StreamingBeatDetector()
+
+    beats = stream(detector, values, chunk_bounds(len(values), mean))
+
+    assert beats == bpm_points(ecg)
+    assert detector.beats == len(beats) and detector.last_beat == beats[-1]
+    assert detector.bpm == bpm(ecg)
+    assert detector.hrv == heart_rate_variability(ecg)
+
+
+def test_single_samples():
+    values = ecg_values(10 * 512)
+    detector = StreamingBeatDetector()
+
+    beats = [b for value in values for b in detector.push([value]).tolist()]
+
+    assert beats == bpm_points(ECG.from_values(values, {}, "ecg"))
+
+
+@pytest.mark.parametrize("window", [1, 5, 30])
+def test_rolling_values_are_those_of_the_last_window(window):
+    values = ecg_values()
+    detector = StreamingBeatDetector(window=window)
+    window_samples = window * 512
+
+    bounds = chunk_bounds(len(values), 300, seed=1)
+
+    beats = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        beats.extend(detector.push(values[start:end]).tolist())
+        recent = [b for b in beats if b >= end - window_samples]
+        expected_hrv = np.mean(np.abs(np.diff(recent, n=2))) if len(recent) > 2 else np.nan
+
+        assert detector.recent_beats.tolist() == recent
+        assert np.array_equal(detector.rolling_hrv, expected_hrv, equal_nan=True)
+        if end:
+            assert detector.rolling_bpm == len(recent) * (60 / (min(end, window_samples) / 512))
+
+
+def test_empty_stream():
+    detector = StreamingBeatDetector()
+
+    assert detector.push([]).tolist() == []
+    assert np.isnan(detector.bpm) and np.isnan(detector.hrv)
+    assert np.isnan(detector.rolling_bpm) and np.isnan(detector.rolling_hrv)
+    assert detector.last_beat is None
+
+
+def test_reset_starts_a_new_stream():
+    values = ecg_values(20 * 512)
+    detector = StreamingBeatDetector()
+    stream(detector, ecg_values(20 * 512, seed=1), chunk_bounds(20 * 512, 256))
+
+    detector.reset()
+    beats = stream(detector, values, chunk_bounds(len(values), 256))
+
+    assert beats == bpm_points(ECG.from_values(values, {}, "ecg"))
+    assert detector.samples == len(values)
+
+
+def test_invalid_distance():
+    with pytest.raises(ValueError):
+        StreamingBeatDetector(d=0)
@@ -1 +1,7 @@
 from watchlib.data_handler.data_handler import *
+from watchlib.data_handler.export_parser import ExportStream, RecordColumns, RecordFilter, parse_records
+from watchlib.data_handler.cache_backend import CacheBackend, CSVBackend, ColumnarBackend, get_cache_backend
+from watchlib.data_handler.route_store import RouteStore
+from watchlib.data_handler.loader_pool import LoaderPool
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from watchlib.data_handler.ecg_codec import ECGCodec
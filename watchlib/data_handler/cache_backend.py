@@ -0,0 +1,161 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from datetime import timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+class CacheBackend(ABC):
+    """
+        File format used to cache DataFrames.
+
+        name: identifier used to select the backend, e.g. CacheHandler(path, backend="csv")
+        extension: file extension of the cached files
+    """
+
+    name: str
+    extension: str
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame, path: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, path: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class CSVBackend(CacheBackend):
+
+    name = "csv"
+    extension = ".csv"
+
+    def write(self, df: pd.DataFrame, path: str):
+        df.to_csv(path, index=False)
+
+    def read(self, path: str) -> pd.DataFrame:
+        return pd.read_csv(path)
+
+
+class ColumnarBackend(CacheBackend):
+    """
+        Stores every column as a typed NumPy array in a compressed .npz file.
+
+        - datetimes: int64 nanoseconds since epoch (UTC) plus the column time zone
+        - numbers: their dtype (ints, floats and bools)
+        - strings of numeric_columns that all parse as numbers: float64
+        - other strings: categorical codes plus the list of categories, read back
+          as a pandas categorical column with the exact strings
+
+        numeric_columns: string columns holding numbers, e.g. the value of a record.
+                         Other strings like sourceVersion "17.10" are never converted.
+    """
+
+    name = "columnar"
+    extension = ".npz"
+
+    SCHEMA = "__schema__"
+    NUMERIC_COLUMNS = ("value",)
+
+    def __init__(self, numeric_columns: Iterable[str] = NUMERIC_COLUMNS):
+        self.numeric_columns = set(numeric_columns)
+
+    @staticmethod
+    def __tz_to_json(tz) -> Union[str, int, None]:
+        if tz is None:
+            return None
+        offset = tz.utcoffset(None)
+        if offset is not None:
+            return int(offset.total_seconds() // 60)
+        return str(tz)
+
+    @staticmethod
+    def __tz_from_json(tz: Union[str, int, None]):
+        if isinstance(tz, int):
+            return timezone(timedelta(minutes=tz))
+        return tz
+
+    @staticmethod
+    def __encode(column: pd.Series, numeric: bool) -> Tuple[dict, Dict[str, np.ndarray]]:
+        if pd.api.types.is_datetime64_any_dtype(column):
+            tz = column.dt.tz
+            if tz is not None:
+                column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+            epoch = column.to_numpy(dtype="datetime64[ns]").view(np.int64)
+            return {"kind": "datetime", "tz": ColumnarBackend.__tz_to_json(tz)}, {"values": epoch}
+
+        if pd.api.types.is_bool_dtype(column) or pd.api.types.is_numeric_dtype(column):
+            return {"kind": "numeric"}, {"values": column.to_numpy()}
+
+        # Datetimes with mixed utc offsets end up as objects, they are stored in UTC
+        if pd.api.types.infer_dtype(column, skipna=True) == "datetime":
+            return ColumnarBackend.__encode(pd.to_datetime(column, utc=True), numeric)
+
+        if numeric:
+            values = pd.to_numeric(column, errors="coerce")
+            if values.notna().sum() == column.notna().sum() and column.notna().any():
+                return {"kind": "numeric"}, {"values": values.to_numpy(dtype=np.float64)}
+
+        categorical = pd.Categorical(column)
+        categories = np.array([str(c) for c in categorical.categories], dtype=str)
+        codes = categorical.codes.astype(np.min_scalar_type(-max(len(categories), 1)))
+        return {"kind": "category"}, {"codes": codes, "categories": categories}
+
+    @staticmethod
+    def __decode(meta: dict, arrays: Dict[str, np.ndarray]):
+        if meta["kind"] == "datetime":
+            values = pd.to_datetime(arrays["values"].view("datetime64[ns]"))
+            if meta["tz"] is not None:
+                values = values.tz_localize("UTC").tz_convert(ColumnarBackend.__tz_from_json(meta["tz"]))
+            return values
+        if meta["kind"] == "category":
+            return pd.Categorical.from_codes(arrays["codes"].astype(np.int64), arrays["categories"])
+        return arrays["values"]
+
+    def write(self, df: pd.DataFrame, path: str):
+        schema = []
+        arrays = {}
+        for i, name in enumerate(df.columns):
+            meta, column_arrays = self.__encode(df[name], str(name) in self.numeric_columns)
+            schema.append({"name": str(name), **meta})
+            for key, array in column_arrays.items():
+                arrays[f"{i}_{key}"] = array
+
+        arrays[self.SCHEMA] = np.array(json.dumps(schema))
+        # np.savez appends .npz to paths without it
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    def read(self, path: str) -> pd.DataFrame:
+        with np.load(path, allow_pickle=False) as npz:
+            schema = json.loads(str(npz[self.SCHEMA]))
+            data = {}
+            for i, meta in enumerate(schema):
+                prefix = f"{i}_"
+                arrays = {key[len(prefix):]: npz[key] for key in npz.files if key.startswith(prefix)}
+                data[meta["name"]] = self.__decode(meta, arrays)
+        return pd.DataFrame(data)
+
+
+CACHE_BACKENDS: Dict[str, CacheBackend] = {
+    backend.name: backend for backend in [ColumnarBackend(), CSVBackend()]
+}
+
+
+def get_cache_backend(backend: Union[str, CacheBackend]) -> CacheBackend:
+    if isinstance(backend, CacheBackend):
+        return backend
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend {backend}, use one of {list(CACHE_BACKENDS)}")
+    return CACHE_BACKENDS[backend]
+
+
+def cache_backend_for(filename: str) -> Optional[CacheBackend]:
+    extension = os.path.splitext(filename)[1]
+    for backend in CACHE_BACKENDS.values():
+        if backend.extension == extension:
+            return backend
+    return None
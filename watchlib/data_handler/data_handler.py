@@ -1,12 +1,19 @@
-import multiprocessing
 import xml.etree.ElementTree as ET
 import pandas as pd
 import os
-from typing import List, Dict
-from watchlib.utils import ECG, WorkoutRoute
+from typing import List, Dict, Union
+from watchlib.utils import ECG, LazyWorkoutRoute, WorkoutRoute
+from watchlib.data_handler.export_parser import RecordFilter, parse_records
+from watchlib.data_handler.cache_backend import CACHE_BACKENDS, CacheBackend, cache_backend_for, get_cache_backend
+from watchlib.data_handler.route_store import RouteStore
+from watchlib.data_handler.loader_pool import LoaderPool
+from watchlib.data_handler.ecg_corpus import ECGCorpus
+from watchlib.data_handler.ecg_codec import ECGCodec
+from watchlib.utils.ecg_csv import read_ecg_csv
 from abc import ABC
-from multiprocessing import Pool
+from functools import partial
 import json
+import shutil
 import numpy as np
 import logging
 
@@ -39,8 +46,37 @@ class DataManager(ABC):
 
 class DataLoader(DataManager):
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, pool: LoaderPool = None) -> None:
+        """
+            pool: process pool used by the parallel loaders, it is kept between calls
+                  and can be shared by several DataLoaders. Defaults to a LoaderPool
+                  with one worker per cpu, created by the first parallel load and
+                  closed by close() or at the end of a with block. A pool passed in
+                  is left open for its owner.
+        """
         super().__init__(path)
+        self.__pool = pool
+        self.__owns_pool = pool is None
+
+    @property
+    def pool(self) -> LoaderPool:
+        if self.__pool is None:
+            self.__pool = LoaderPool()
+        return self.__pool
+
+    def close(self):
+        """
+            Stops the worker processes of the default pool.
+        """
+        if self.__owns_pool and self.__pool is not None:
+            self.__pool.close()
+            self.__pool = None
+
+    def __enter__(self) -> "DataLoader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def supports(self, data: str):
         if data == "ecg":
@@ -50,18 +86,36 @@ class DataLoader(DataManager):
         if data == "health":
             return os.path.exists(self.export_path)
 
-    def load_health_data(self) -> Dict[str, pd.DataFrame]:
+    def load_health_data(self, streaming: bool = True, workers: int = 1, types: List[str] = None,
+                         start=None, end=None) -> Dict[str, pd.DataFrame]:
+        """
+            Loads one (time, value) DataFrame per record type from Export.xml.
+
+            streaming: stream the file instead of parsing the whole tree
+            workers: number of processes parsing the file when streaming
+            types: only load these record types, e.g. ["HeartRate", "StepCount"]
+            start, end: only load records with start <= startDate < end
+        """
 
         if self.supports("health"):
+            record_filter = None
+            if types is not None or start is not None or end is not None:
+                record_filter = RecordFilter(types, start, end)
+
+            if streaming:
+                return self.__load_health_data_streaming(workers, record_filter)
+
             tree = ET.parse(self.export_path)
             root = tree.getroot()
             records = root.findall('Record')
+            if record_filter is not None:
+                records = [record for record in records if record_filter.accepts(record.attrib)]
 
             data = {}
 
             # Init all arrays
             for record in records:
-                data[record.get("type")] = []
+                data[self.get_identifier_name(record.get("type"))] = []
 
             logging.info(f"[Data Loader] Loading {len(data)} health dataframes")
 
@@ -82,6 +136,12 @@ class DataLoader(DataManager):
             logging.error("The health data path (Export.xml) doesnt exist")
             return {}
 
+    def __load_health_data_streaming(self, workers: int, record_filter: RecordFilter) -> Dict[str, pd.DataFrame]:
+        columns = parse_records(self.export_path, attributes=["creationDate", "value"],
+                                workers=workers, record_filter=record_filter)
+        logging.info(f"[Data Loader] Loading {len(columns.types)} health dataframes from {len(columns)} records")
+        return columns.to_health_frames(key=self.get_identifier_name)
+
     # ----------
     # ECG
     # ----------
@@ -90,8 +150,10 @@ class DataLoader(DataManager):
         with open(os.path.join(self.ecg_path, ecg_name), "r", encoding="utf-8") as f:
             return ECG(f.read(), ecg_name)
 
-    def load_ecgs(self) -> List[ECG]:
+    def load_ecgs(self, parallel: bool = False) -> List[ECG]:
         if self.supports("ecg"):
+            if parallel:
+                return self.load_ecgs_par()
             filenames = self.get_filenames_for(self.ecg_path)
             logging.info(f"[Data Loader]\t\tLoading {len(filenames)} ECGs")
             return [self.load_ecg(filename) for filename in filenames]
@@ -99,15 +161,19 @@ class DataLoader(DataManager):
             logging.error("The ecg path doesnt exist")
             return []
 
+    def load_ecgs_par(self) -> List[ECG]:
+        filenames = self.get_filenames_for(self.ecg_path)
+        logging.info(f"[Data Loader]\t\tLoading {len(filenames)} ECGs with {self.pool.workers} workers")
+        ecgs = self.pool.load_ecgs(self.ecg_path, filenames)
+        return [ECG.from_values(values, meta_data, filename) for filename, (values, meta_data) in zip(filenames, ecgs)]
+
     # ----------
     # Workout Routes
     # ----------
 
     def load_route(self, route_name: str) -> WorkoutRoute:
         with open(os.path.join(self.workout_path, route_name), "rb") as f:
-            route = ET.parse(f, parser=ET.XMLParser(
-                encoding="utf-8")).getroot()
-            return WorkoutRoute(route, route_name)
+            return WorkoutRoute(f.read(), route_name)
 
     def load_routes(self, parallel=True) -> List[WorkoutRoute]:
         if not self.supports("routes"):
@@ -124,13 +190,13 @@ class DataLoader(DataManager):
         return [self.load_route(filename) for filename in filenames]
 
     def load_routes_par(self) -> List[WorkoutRoute]:
+        """
+            Loads the routes with the process pool of this DataLoader, see LoaderPool.
+        """
         filenames = self.get_filenames_for(self.workout_path)
-        pool = Pool(multiprocessing.cpu_count())
-        routes = pool.map(self.load_route, filenames)
-        pool.close()
-        pool.join()
-        print(f"[Data Loader]\t\tLoading {len(filenames)} workout routes in parallel...")
-        return routes
+        print(f"[Data Loader]\t\tLoading {len(filenames)} workout routes with {self.pool.workers} workers...")
+        routes = self.pool.load_routes(self.workout_path, filenames)
+        return [WorkoutRoute(pd.DataFrame(route, copy=False), filename) for filename, route in zip(filenames, routes)]
         
     def count_routes(self):
         return len(self.get_filenames_for(self.workout_path))
@@ -138,13 +204,19 @@ class DataLoader(DataManager):
 
 class CacheHandler(DataManager):
 
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, backend: Union[str, CacheBackend] = "columnar") -> None:
 
         super().__init__(path)
+
+        self.backend = get_cache_backend(backend)
         
         self.cached_routes_path = os.path.join(self.workout_path, "cached_routes")
         self.cached_export_data_path = os.path.join(path, "cached_export_data")
         self.cached_route_animations_path = os.path.join(self.workout_path, "cached_animations")
+        self.cached_ecgs_path = os.path.join(self.ecg_path, "cached_ecgs")
+        self.compressed_ecgs_path = os.path.join(self.ecg_path, "compressed_ecgs")
+        # Saved ECGIndex (watchlib.analysis) of the cached ECGs
+        self.ecg_index_path = os.path.join(self.ecg_path, "ecg_index")
         self.__check_folders()
 
     def __check_folders(self):
@@ -159,6 +231,7 @@ class CacheHandler(DataManager):
     def delete_all_caches(self):
         self.delete_all_health_data_caches()
         self.delete_all_route_caches()
+        self.delete_ecg_cache()
 
     def delete_all_health_data_caches(self):
         for file in self.get_filenames_for(self.cached_export_data_path):
@@ -197,21 +270,37 @@ class CacheHandler(DataManager):
     # Cache routes
     # ----------
 
-    def __cache_route(self, route: WorkoutRoute):
-        route.route.to_csv(os.path.join(
-            self.cached_routes_path, route.name), index=False)
-
     def cache_routes(self, routes: List[WorkoutRoute]):
+        """
+            Writes all routes into a single memory-mapped RouteStore, replacing the cached routes.
+        """
         self.__check_folders()
         logging.info(f"[Cache Handler] Caching {len(routes)} routes" )
-        for route in routes:
-            self.__cache_route(route)
+        RouteStore.write(self.cached_routes_path, ((route.name, route.route) for route in routes))
+        # Remove the csv files of caches written before the RouteStore
+        for file in self.get_filenames_for(self.cached_routes_path):
+            if file not in (RouteStore.POINTS, RouteStore.INDEX):
+                self.delete_route_cache(file)
 
     def __load_route(self, filename) -> WorkoutRoute:
         return WorkoutRoute(pd.read_csv(os.path.join(self.cached_routes_path, filename)), filename)
 
-    def load_routes(self) -> List[WorkoutRoute]:
-        if self.is_routes_cached():    
+    def load_routes(self, lazy: bool = False) -> List[WorkoutRoute]:
+        """
+            Loads the cached routes. Routes from the RouteStore are zero-copy views of the
+            mapped file, caches written before the RouteStore hold one csv file per route.
+
+            lazy: return LazyWorkoutRoutes built from the stored route summaries, their points
+                  are only read when they are accessed (RouteStore caches only)
+        """
+        if RouteStore.exists(self.cached_routes_path):
+            store = RouteStore(self.cached_routes_path)
+            print(f"[Cache Handler]\t\tLoading {len(store)} cached routes...")
+            if lazy:
+                return [LazyWorkoutRoute(store.summary(i), name, partial(store.frame, i))
+                        for i, name in enumerate(store.names)]
+            return [WorkoutRoute(route, name) for name, route in store.frames()]
+        elif self.is_routes_cached():    
             routes = []
             filenames = self.get_filenames_for(self.cached_routes_path)
             print(f"[Cache Handler]\t\tLoadig {len(filenames)} cached routes...")
@@ -226,6 +315,68 @@ class CacheHandler(DataManager):
         self.__check_folders()
         return self.isCached("routes")
 
+    # ----------
+    # Cache ECGs
+    # ----------
+
+    def cache_ecgs(self, pool: LoaderPool = None) -> ECGCorpus:
+        """
+            Builds the ECGCorpus of all ECGs in the electrocardiograms folder, replacing the cached ECGs.
+
+            pool: optional LoaderPool parsing the ECGs in parallel
+        """
+        logging.info(f"[Cache Handler] Caching ECGs of {self.ecg_path}")
+        return ECGCorpus.build(self.ecg_path, self.cached_ecgs_path, pool)
+
+    def load_ecg_corpus(self) -> ECGCorpus:
+        """
+            Opens the cached ECGCorpus, it is built on first use.
+        """
+        if self.is_ecgs_cached():
+            return ECGCorpus(self.cached_ecgs_path)
+        return self.cache_ecgs()
+
+    def load_ecgs(self) -> List[ECG]:
+        return list(self.load_ecg_corpus())
+
+    def cache_compressed_ecgs(self, codec: ECGCodec = None):
+        """
+            Writes every ECG of the electrocardiograms folder as a quantized, delta encoded and
+            compressed .ecgz file, see ECGCodec for the reconstruction error.
+        """
+        codec = codec if codec is not None else ECGCodec()
+        os.makedirs(self.compressed_ecgs_path, exist_ok=True)
+        filenames = self.get_filenames_for(self.ecg_path)
+        logging.info(f"[Cache Handler] Compressing {len(filenames)} ECGs")
+        for filename in filenames:
+            with open(os.path.join(self.ecg_path, filename), "rb") as f:
+                values, meta_data = read_ecg_csv(f.read())
+            codec.write(os.path.join(self.compressed_ecgs_path, filename + codec.extension), values, meta_data)
+
+    def load_compressed_ecg(self, name: str, start: int = 0, end: int = None) -> ECG:
+        """
+            Decodes the samples start:end of a compressed ECG, name is the name of its csv file.
+        """
+        values, meta_data = ECGCodec().read(os.path.join(self.compressed_ecgs_path, name + ECGCodec.extension), start, end)
+        return ECG.from_values(values, meta_data, name)
+
+    def load_compressed_ecgs(self) -> List[ECG]:
+        names = [f[:-len(ECGCodec.extension)] for f in self.get_filenames_for(self.compressed_ecgs_path)
+                 if f.endswith(ECGCodec.extension)]
+        print(f"[Cache Handler]\t\tLoading {len(names)} compressed ECGs...")
+        return [self.load_compressed_ecg(name) for name in names]
+
+    def delete_ecg_cache(self):
+        if os.path.exists(self.cached_ecgs_path):
+            shutil.rmtree(self.cached_ecgs_path)
+        if os.path.exists(self.compressed_ecgs_path):
+            shutil.rmtree(self.compressed_ecgs_path)
+        if os.path.exists(self.ecg_index_path):
+            shutil.rmtree(self.ecg_index_path)
+
+    def is_ecgs_cached(self):
+        return ECGCorpus.exists(self.cached_ecgs_path)
+
     # ---------
     # Cache route animations
     # ---------
@@ -255,20 +406,35 @@ class CacheHandler(DataManager):
         self.__check_folders()
         print(f"[Cache Handler]\t\tCaching {len(data)} health dataframes...")
         for key in data:
-            df = data[key]
-            df.to_csv(os.path.join(self.cached_export_data_path,
-                      f"{key}.csv"), index=False)
+            self.backend.write(data[key], os.path.join(self.cached_export_data_path, f"{key}{self.backend.extension}"))
+            # Remove caches of the same data in other formats so they cant shadow the new one
+            for backend in CACHE_BACKENDS.values():
+                stale = os.path.join(self.cached_export_data_path, f"{key}{backend.extension}")
+                if backend is not self.backend and os.path.exists(stale):
+                    os.remove(stale)
+
+    def export_health_data(self, path: str, backend: Union[str, CacheBackend] = "csv"):
+        """
+            Writes the cached health data to path, as one csv file per record type by default.
+        """
+        backend = get_cache_backend(backend)
+        os.makedirs(path, exist_ok=True)
+        data = self.load_health_data()
+        for key in data:
+            backend.write(data[key], os.path.join(path, f"{key}{backend.extension}"))
 
     def load_health_data_by_key(self, key: str) -> pd.DataFrame:
-        return pd.read_csv(os.path.join(self.cached_export_data_path, key))
+        backend = cache_backend_for(key) or self.backend
+        return backend.read(os.path.join(self.cached_export_data_path, key))
 
     def load_health_data(self) -> Dict[str, pd.DataFrame]:
         if self.is_health_data_cached():
             data = {}
-            filenames = self.get_filenames_for(self.cached_export_data_path)
+            filenames = [f for f in self.get_filenames_for(self.cached_export_data_path) if cache_backend_for(f)]
             print(f"[Cache Handler]\t\tLoading {len(filenames)} cached health dataframes...")
             for filename in filenames:
-                id = self.get_identifier_name(filename.split(".csv")[0])
+                key = os.path.splitext(filename)[0]
+                id = self.get_identifier_name(key) if key.startswith("HK") else key
                 data[id] = self.load_health_data_by_key(filename)
             return data
         else:
@@ -0,0 +1,163 @@
+import io
+import json
+import struct
+import zlib
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"WECG"
+VERSION = 1
+# magic, version, length of the json header
+PREAMBLE = struct.Struct("<4sHI")
+
+# Largest quantized value, the smallest int16 marks missing (NaN) samples
+INT16_MAX = 32767
+MISSING = -32768
+
+
+class ECGCodec:
+    """
+        Compact on-disk format for ECG samples.
+
+        The samples are quantized to int16 steps, split into blocks of `block_size`
+        samples, delta encoded within every block and compressed block by block with
+        zlib. Sample ranges only decompress the blocks they touch.
+
+        The step of an ECG is max(resolution, peak / 32767) microvolts, where peak is
+        its largest absolute sample (see step_for). By default (resolution=None) it is
+        peak / 32767, the finest step int16 can hold, e.g. 0.06 uV for a 2000 uV peak.
+        A resolution only makes steps coarser, which compresses better. The
+        reconstruction error of a sample is at most half a step (see error_bound), ECGs
+        with values on a resolution grid whose peak fits into int16 steps of resolution
+        are stored exactly up to float rounding.
+
+        A file holds a preamble, a json header (step, sample count, block sizes and the
+        ECG meta data) and the compressed blocks.
+    """
+
+    extension = ".ecgz"
+
+    def __init__(self, resolution: Optional[float] = None, block_size: int = 4096, level: int = 6):
+        if resolution is not None and resolution <= 0:
+            raise ValueError("resolution must be positive")
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.resolution = resolution
+        self.block_size = block_size
+        self.level = level
+
+    def step_for(self, values: np.ndarray) -> float:
+        """
+            Quantization step of an ECG in microvolts.
+        """
+        peak = np.nanmax(np.abs(values)) if len(values) and not np.isnan(values).all() else 0.0
+        step = max(self.resolution or 0.0, peak / INT16_MAX)
+        # Every step stores ECGs without a peak (only zeros or missing samples) exactly
+        return float(step) if step > 0 else 1.0
+
+    @staticmethod
+    def error_bound(step: float) -> float:
+        """
+            Largest difference between a sample and its decoded value.
+        """
+        return step / 2
+
+    def quantize(self, values: np.ndarray, step: float) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        quantized = np.rint(np.where(missing, 0, values) / step)
+        quantized = np.clip(quantized, -INT16_MAX, INT16_MAX).astype(np.int16)
+        quantized[missing] = MISSING
+        return quantized
+
+    def encode(self, values: np.ndarray, meta_data: Optional[Dict[str, str]] = None) -> bytes:
+        """
+            Encodes the samples and meta data of an ECG into the bytes of an .ecgz file.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        step = self.step_for(values)
+        quantized = self.quantize(values, step)
+
+        blocks = []
+        for start in range(0, len(quantized), self.block_size):
+            block = quantized[start:start + self.block_size]
+            # int16 differences wrap around, decoding wraps them back exactly
+            deltas = np.diff(block, prepend=np.int16(0))
+            blocks.append(zlib.compress(deltas.astype("<i2").tobytes(), self.level))
+
+        header = json.dumps({
+            "step": step,
+            "samples": len(values),
+            "block_size": self.block_size,
+            "blocks": [len(block) for block in blocks],
+            "meta_data": meta_data or {},
+        }).encode("utf-8")
+        return PREAMBLE.pack(MAGIC, VERSION, len(header)) + header + b"".join(blocks)
+
+    @staticmethod
+    def __read_header(f: BinaryIO) -> dict:
+        magic, version, length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError("Not an encoded ECG")
+        if version > VERSION:
+            raise ValueError(f"Unsupported ECG codec version {version}")
+        header = json.loads(f.read(length).decode("utf-8"))
+        header["offset"] = PREAMBLE.size + length
+        return header
+
+    @staticmethod
+    def __decode_block(compressed: bytes, step: float) -> np.ndarray:
+        deltas = np.frombuffer(zlib.decompress(compressed), dtype="<i2")
+        quantized = np.cumsum(deltas, dtype=np.int16)
+        values = quantized.astype(np.float64) * step
+        values[quantized == MISSING] = np.nan
+        return values
+
+    def __decode(self, f: BinaryIO, start: int, end: Optional[int]) -> Tuple[np.ndarray, Dict[str, str], float]:
+        header = self.__read_header(f)
+        samples, block_size = header["samples"], header["block_size"]
+        start, end, _ = slice(start, end).indices(samples)
+        if end <= start:
+            return np.empty(0, dtype=np.float64), header["meta_data"], header["step"]
+
+        offsets = np.concatenate(([0], np.cumsum(header["blocks"], dtype=np.int64))) + header["offset"]
+        first, last = start // block_size, (end - 1) // block_size
+        f.seek(int(offsets[first]))
+        data = f.read(int(offsets[last + 1] - offsets[first]))
+
+        blocks: List[np.ndarray] = []
+        position = 0
+        for i in range(first, last + 1):
+            length = header["blocks"][i]
+            blocks.append(self.__decode_block(data[position:position + length], header["step"]))
+            position += length
+        values = np.concatenate(blocks)[start - first * block_size:end - first * block_size]
+        return values, header["meta_data"], header["step"]
+
+    def decode(self, data: bytes, start: int = 0, end: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, str]]:
+        """
+            Decodes the samples start:end and the meta data of an encoded ECG.
+        """
+        values, meta_data, _ = self.__decode(io.BytesIO(data), start, end)
+        return values, meta_data
+
+    def write(self, path: str, values: np.ndarray, meta_data: Optional[Dict[str, str]] = None):
+        with open(path, "wb") as f:
+            f.write(self.encode(values, meta_data))
+
+    def read(self, path: str, start: int = 0, end: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, str]]:
+        """
+            Reads the samples start:end and the meta data of an .ecgz file, only the blocks
+            containing the range are read and decompressed.
+        """
+        with open(path, "rb") as f:
+            values, meta_data, _ = self.__decode(f, start, end)
+        return values, meta_data
+
+    def read_header(self, path: str) -> dict:
+        """
+            Quantization step, sample count, block layout and meta data of an .ecgz file.
+        """
+        with open(path, "rb") as f:
+            return self.__read_header(f)
@@ -0,0 +1,197 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from watchlib.utils.ecg_csv import read_ecg_csv
+from watchlib.utils.structs import ECG
+
+# Columns of the meta data table next to the ECG name and length
+METADATA_COLUMNS = ["classification", "date", "sample_rate"]
+
+
+def _sample_rate(value: str) -> float:
+    # e.g. "512 Hertz" or "512.000 Hertz"
+    try:
+        return float(value.split()[0])
+    except (AttributeError, IndexError, ValueError):
+        return np.nan
+
+
+def ecg_metadata(names: List[str], lengths: np.ndarray, meta_data: List[Dict[str, str]]) -> pd.DataFrame:
+    """
+        Table with one row per ECG: name, length, classification, date (UTC) and sample rate (Hz).
+    """
+    return pd.DataFrame({
+        "name": names,
+        "length": lengths,
+        "classification": [m.get("Classification") for m in meta_data],
+        "date": pd.to_datetime(pd.Series([m.get("Recorded Date") for m in meta_data], dtype=object),
+                               utc=True, errors="coerce", format="%Y-%m-%d %H:%M:%S %z"),
+        "sample_rate": [_sample_rate(m.get("Sample Rate")) for m in meta_data],
+    })
+
+
+class ECGCorpus:
+    """
+        All ECGs of an export as one memory-mapped (n_ecgs, n_samples) float32 matrix.
+
+        ecg_samples.bin holds the samples row by row, ECGs shorter than the longest one are
+        padded with NaN. ecg_index.json holds the names, the lengths and the meta data of
+        every ECG. Rows, sample windows and the matrix itself are views of the mapped file.
+
+        An ECGCorpus can be used like a list of ECGs, corpus[i] creates the ECG of a row.
+    """
+
+    SAMPLES = "ecg_samples.bin"
+    INDEX = "ecg_index.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, self.INDEX), "r") as f:
+            index = json.load(f)
+
+        self.names: List[str] = index["names"]
+        self.lengths = np.array(index["lengths"], dtype=np.int64)
+        self.meta_data: List[Dict[str, str]] = index["meta_data"]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.metadata = ecg_metadata(self.names, self.lengths, self.meta_data)
+
+        shape = tuple(index["shape"])
+        if shape[0] * shape[1]:
+            self.samples = np.memmap(os.path.join(path, self.SAMPLES), dtype=np.float32, mode="r", shape=shape)
+        else:
+            # mmap cannot map empty files
+            self.samples = np.empty(shape, dtype=np.float32)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.INDEX)) and os.path.exists(os.path.join(path, cls.SAMPLES))
+
+    @classmethod
+    def build(cls, ecg_path: str, path: str, pool=None) -> "ECGCorpus":
+        """
+            Reads every ECG of the electrocardiograms folder at ecg_path and writes the corpus to path.
+
+            pool: optional LoaderPool parsing the files in parallel
+        """
+        filenames = sorted(f for f in os.listdir(ecg_path)
+                           if os.path.isfile(os.path.join(ecg_path, f)) and not f.startswith("."))
+
+        if pool is not None:
+            ecgs = ((name, values, meta_data) for name, (values, meta_data)
+                    in zip(filenames, pool.load_ecgs(ecg_path, filenames)))
+        else:
+            ecgs = ((name,) + cls.__read(os.path.join(ecg_path, name)) for name in filenames)
+        cls.write(path, ecgs)
+        return cls(path)
+
+    @staticmethod
+    def __read(path: str) -> Tuple[np.ndarray, Dict[str, str]]:
+        with open(path, "rb") as f:
+            return read_ecg_csv(f.read())
+
+    @classmethod
+    def write(cls, path: str, ecgs: Iterable[Tuple[str, np.ndarray, Dict[str, str]]]):
+        """
+            Writes (name, values, meta data) triples into a new corpus at path, replacing an
+            existing one. The values are spooled to disk first, so only one ECG is held in
+            memory at a time.
+        """
+        os.makedirs(path, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".ecg_corpus", dir=path)
+        try:
+            names, lengths, meta_data = [], [], []
+            spool_path = os.path.join(tmp_path, "spool")
+            with open(spool_path, "wb") as spool:
+                for name, values, meta in ecgs:
+                    values = np.asarray(values, dtype=np.float32)
+                    spool.write(values.tobytes())
+                    names.append(str(name))
+                    lengths.append(len(values))
+                    meta_data.append(meta)
+
+            shape = (len(names), max(lengths, default=0))
+            samples_path = os.path.join(tmp_path, cls.SAMPLES)
+            if shape[0] * shape[1]:
+                spooled = np.memmap(spool_path, dtype=np.float32, mode="r")
+                samples = np.memmap(samples_path, dtype=np.float32, mode="w+", shape=shape)
+                offset = 0
+                for i, length in enumerate(lengths):
+                    samples[i, :length] = spooled[offset:offset + length]
+                    samples[i, length:] = np.nan
+                    offset += length
+                samples.flush()
+                del samples, spooled
+            else:
+                open(samples_path, "wb").close()
+
+            index_path = os.path.join(tmp_path, cls.INDEX)
+            with open(index_path, "w") as f:
+                json.dump({"shape": shape, "names": names, "lengths": lengths, "meta_data": meta_data}, f)
+
+            # The index is replaced last, a reader never sees an index pointing past the samples
+            os.replace(samples_path, os.path.join(path, cls.SAMPLES))
+            os.replace(index_path, os.path.join(path, cls.INDEX))
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.positions
+
+    def __getitem__(self, key: Union[int, str]) -> ECG:
+        i = self.positions[key] if isinstance(key, str) else key
+        return ECG.from_values(self.values(i), self.meta_data[i], self.names[i])
+
+    def __iter__(self) -> Iterator[ECG]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def min_length(self) -> int:
+        return int(self.lengths.min()) if len(self) else 0
+
+    def values(self, key: Union[int, str]) -> np.ndarray:
+        """
+            Zero-copy view of the samples of an ECG, by position or name.
+        """
+        i = self.positions[key] if isinstance(key, str) else key
+        return self.samples[i, :self.lengths[i]]
+
+    def matrix(self, _from: int = None, _to: int = None, step: int = 1) -> np.ndarray:
+        """
+            Zero-copy (n_ecgs, n_features) view of the samples _from:_to:step of every ECG.
+            _to defaults to the length of the shortest ECG, so the view never contains padding.
+        """
+        if _from is None:
+            _from = 0
+        if _to is None:
+            _to = self.min_length
+        return self.samples[:, _from:_to:step]
+
+
+def min_ecg_length(ecgs: Union[List[ECG], ECGCorpus]) -> int:
+    if isinstance(ecgs, ECGCorpus):
+        return ecgs.min_length
+    return min([len(ecg.y) for ecg in ecgs])
+
+
+def ecg_matrix(ecgs: Union[List[ECG], ECGCorpus], _from: int, _to: int, step: int = 1):
+    """
+        Samples _from:_to:step of every ECG, a zero-copy view of the matrix of an ECGCorpus.
+        Raises a ValueError if _to lies past the end of the shortest ECG, the rows of shorter
+        ECGs would be cut short (or padded with NaN in an ECGCorpus).
+    """
+    min_length = min_ecg_length(ecgs) if len(ecgs) else 0
+    if _to is not None and _to > min_length:
+        raise ValueError(f"_to={_to} lies past the end of the shortest ECG ({min_length} samples)")
+    if isinstance(ecgs, ECGCorpus):
+        return ecgs.matrix(_from, _to, step)
+    return [ecg.y[_from:_to][::step] for ecg in ecgs]
@@ -0,0 +1,417 @@
+import mmap
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime as dt
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Apple indents every top level element of Export.xml by exactly one space,
+# nested elements (MetadataEntry, WorkoutEvent, Records of a Correlation, ...) deeper
+TOP_LEVEL_START = re.compile(rb"\n <(?=[A-Za-z])")
+# Bytes a match of TOP_LEVEL_START needs to be seen, including its lookahead
+TOP_LEVEL_START_LENGTH = 4
+ROOT_START = re.compile(rb"<HealthData[\s>]")
+ROOT_END = b"</HealthData>"
+TAG = re.compile(rb"\s*<([^\s/>]+)")
+
+BLOCK_SIZE = 1 << 20
+# Bytes without a top level element start after which the pushdown gives up
+PUSHDOWN_LIMIT = 64 * BLOCK_SIZE
+
+
+def _top_level_elements(events, tags: Optional[Set[str]]) -> Iterator[ET.Element]:
+    root = None
+    depth = 0
+
+    for event, elem in events:
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue
+
+        if tags is None or elem.tag in tags:
+            yield elem
+        # Drop the consumed element so the tree never grows beyond one child
+        root.remove(elem)
+
+
+class ExportStream:
+    """
+        Streams the top level elements (Record, Workout, ActivitySummary, ...) of an
+        Apple Health Export.xml without building the whole tree in memory.
+
+        Every yielded element is detached from the root once the consumer moves on,
+        so only the element currently being processed is kept alive.
+    """
+
+    def __init__(self, source) -> None:
+        self.source = source
+        self.root_attrib: Dict[str, str] = {}
+
+    def _events(self):
+        for event, elem in ET.iterparse(self.source, events=("start", "end")):
+            if event == "start" and not self.root_attrib:
+                self.root_attrib = dict(elem.attrib)
+            yield event, elem
+
+    def elements(self, tags: Optional[Iterable[str]] = None) -> Iterator[ET.Element]:
+        tags = set(tags) if tags is not None else None
+        return _top_level_elements(self._events(), tags)
+
+
+class RecordColumns:
+    """
+        Columnar buffer for Record attributes.
+
+        Record types are stored as integer codes into `types` so that millions of
+        rows do not each hold their own copy of the identifier string.
+
+        attributes: record attributes to keep, None keeps every attribute seen
+    """
+
+    def __init__(self, attributes: Optional[Iterable[str]] = None) -> None:
+        self.attributes = list(attributes) if attributes is not None else None
+        self.types: List[str] = []
+        self.type_codes: List[int] = []
+        self.columns: Dict[str, list] = {a: [] for a in self.attributes or []}
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.type_codes)
+
+    def _code_for(self, record_type: str) -> int:
+        code = self._codes.get(record_type)
+        if code is None:
+            code = self._codes[record_type] = len(self.types)
+            self.types.append(record_type)
+        return code
+
+    def append(self, attrib: Dict[str, str]):
+        self.type_codes.append(self._code_for(attrib.get("type")))
+
+        if self.attributes is None:
+            for key in attrib:
+                if key != "type" and key not in self.columns:
+                    self.columns[key] = [None] * (len(self.type_codes) - 1)
+
+        for key, column in self.columns.items():
+            column.append(attrib.get(key))
+
+    def extend(self, other: "RecordColumns"):
+        """
+            Appends the rows of another buffer, e.g. the chunk parsed by a worker.
+        """
+        size = len(self)
+        remap = np.array([self._code_for(t) for t in other.types], dtype=np.int64)
+        self.type_codes.extend(remap[np.asarray(other.type_codes, dtype=np.int64)].tolist())
+
+        for key in other.columns:
+            if key not in self.columns:
+                self.columns[key] = [None] * size
+        for key, column in self.columns.items():
+            column.extend(other.columns.get(key, [None] * len(other)))
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+            Returns all buffered records as one DataFrame with a type column.
+        """
+        types = np.array(self.types, dtype=object)[np.asarray(self.type_codes, dtype=np.int64)]
+        df = pd.DataFrame({"type": types, **self.columns})
+        return df.fillna(value=np.nan)
+
+    def to_health_frames(self, key: Callable[[str], str] = lambda t: t) -> Dict[str, pd.DataFrame]:
+        """
+            Splits the buffer into one (time, value) DataFrame per record type in a
+            single pass. Expects the buffer to hold the creationDate and value attributes.
+
+            key: maps the full record type to the dictionary key
+        """
+        keys = list(dict.fromkeys(key(t) for t in self.types))
+        key_codes = np.array([keys.index(key(t)) for t in self.types], dtype=np.int64)
+        codes = key_codes[np.asarray(self.type_codes, dtype=np.int64)]
+
+        # Stable sort keeps the original record order within every type
+        order = np.argsort(codes, kind="stable")
+        bounds = np.cumsum(np.bincount(codes, minlength=len(keys)))
+        times = np.asarray(self.columns["creationDate"], dtype=object)[order]
+        values = np.asarray(self.columns["value"], dtype=object)[order]
+
+        data = {}
+        start = 0
+        for k, end in zip(keys, bounds):
+            df = pd.DataFrame({"time": times[start:end], "value": values[start:end]})
+            df["time"] = pd.to_datetime(df["time"])
+            data[k] = df
+            start = end
+        return data
+
+
+def identifier_name(record_type: str) -> str:
+    if "Identifier" in record_type:
+        return record_type.split("Identifier")[1]
+    return record_type.split("Type")[1]
+
+
+class RecordFilter:
+    """
+        Allowlist of record types and a startDate range for selective parsing.
+
+        types: full identifiers (HKQuantityTypeIdentifierHeartRate) or short names (HeartRate)
+        start: earliest startDate (inclusive), datetime or "YYYY-MM-DD[ HH:MM:SS]"
+        end: latest startDate (exclusive), datetime or "YYYY-MM-DD[ HH:MM:SS]"
+
+        Dates are compared in the local time written to the export.
+    """
+
+    TYPE = re.compile(rb' type="([^"]*)"')
+    START_DATE = re.compile(rb' startDate="([^"]*)"')
+
+    def __init__(self, types: Optional[Iterable[str]] = None, start=None, end=None) -> None:
+        self.types = set(types) if types is not None else None
+        self.start = self.__date(start)
+        self.end = self.__date(end)
+        self.__type_cache: Dict[str, bool] = {}
+
+    @staticmethod
+    def __date(value) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, dt):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value)
+
+    def accepts_type(self, record_type: str) -> bool:
+        if self.types is None:
+            return True
+        accepted = self.__type_cache.get(record_type)
+        if accepted is None:
+            accepted = record_type in self.types or identifier_name(record_type) in self.types
+            self.__type_cache[record_type] = accepted
+        return accepted
+
+    def accepts_date(self, start_date: Optional[str]) -> bool:
+        if self.start is None and self.end is None:
+            return True
+        if start_date is None:
+            return False
+        # "YYYY-MM-DD HH:MM:SS" compares correctly as a string, also against date-only bounds
+        stamp = start_date[:19]
+        if self.start is not None and stamp < self.start:
+            return False
+        if self.end is not None and stamp >= self.end:
+            return False
+        return True
+
+    def accepts(self, attrib: Dict[str, str]) -> bool:
+        return self.accepts_type(attrib.get("type", "")) and self.accepts_date(attrib.get("startDate"))
+
+    def accepts_head(self, head: bytes) -> bool:
+        """
+            Checks the raw opening tag of a record without parsing it.
+        """
+        if self.types is not None:
+            match = self.TYPE.search(head)
+            if match is None or not self.accepts_type(match.group(1).decode()):
+                return False
+        if self.start is not None or self.end is not None:
+            match = self.START_DATE.search(head)
+            return self.accepts_date(match.group(1).decode() if match else None)
+        return True
+
+
+def export_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """
+        Splits the body of Export.xml into at most `parts` byte ranges. Every range
+        starts at a top level element, so each one can be parsed on its own.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        root = ROOT_START.search(mm)
+        end = mm.rfind(ROOT_END)
+        if root is None or end == -1:
+            raise ValueError(f"{path} is not an Apple Health export")
+        start = mm.find(b">", root.end() - 1) + 1
+
+        bounds = [start]
+        for i in range(1, parts):
+            target = start + (end - start) * i // parts
+            match = TOP_LEVEL_START.search(mm, max(target, bounds[-1]), end)
+            if match is None:
+                break
+            if match.start() > bounds[-1]:
+                bounds.append(match.start())
+        bounds.append(end)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def export_root_attrib(path: str) -> Dict[str, str]:
+    """
+        Reads the attributes of the HealthData root element (e.g. locale).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        root = ROOT_START.search(mm)
+        if root is None:
+            raise ValueError(f"{path} is not an Apple Health export")
+        end = mm.find(b">", root.end() - 1) + 1
+        return dict(ET.fromstring(mm[root.start():end] + ROOT_END).attrib)
+
+
+def _range_blocks(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def _pushdown_blocks(blocks: Iterable[bytes], accepts_head: Callable[[bytes], bool]) -> Iterator[bytes]:
+    """
+        Cuts the raw bytes into top level elements and only passes on the elements
+        whose opening line is accepted by accepts_head, so everything else never
+        reaches the XML parser.
+
+        Every byte is searched for element starts once. If PUSHDOWN_LIMIT bytes pass
+        without the start of a top level element, the file is not laid out like Apple
+        writes it, and the rest is passed on unfiltered; the parsed elements still
+        have to be checked.
+    """
+    pending = bytearray()
+    # Matches of TOP_LEVEL_START starting before searched were already found
+    searched = 0
+    leading = True
+
+    def accepted(element: bytes) -> bool:
+        head_end = element.find(b"\n", 1)
+        return accepts_head(element[:head_end] if head_end != -1 else element)
+
+    blocks = iter(blocks)
+    for block in blocks:
+        pending += block
+        starts = [match.start() for match in TOP_LEVEL_START.finditer(pending, searched)]
+        if starts:
+            # Bytes before the first element are passed through untouched
+            if leading:
+                if starts[0] > 0:
+                    yield bytes(pending[:starts[0]])
+                leading = False
+            else:
+                starts.insert(0, 0)
+
+            for element_start, element_end in zip(starts[:-1], starts[1:]):
+                element = bytes(pending[element_start:element_end])
+                if accepted(element):
+                    yield element
+            pending = pending[starts[-1]:]
+
+        # A start may begin in the last bytes, its lookahead is still missing
+        searched = max(len(pending) - TOP_LEVEL_START_LENGTH + 1, 0 if leading else 1)
+        if len(pending) > PUSHDOWN_LIMIT:
+            yield bytes(pending)
+            yield from blocks
+            return
+
+    if leading or accepted(bytes(pending)):
+        yield bytes(pending)
+
+
+def element_tag(head: bytes) -> bytes:
+    """
+        Returns the tag of a top level element from its raw opening line.
+    """
+    return TAG.match(head).group(1)
+
+
+def stream_elements(path: str, accepts_head: Callable[[bytes], bool]) -> Iterator[ET.Element]:
+    """
+        Streams the top level elements of an export whose raw opening line (e.g.
+        b'\\n <Record type="..." ...>') passes accepts_head. Rejected elements are
+        skipped before they are parsed.
+    """
+    start, end = export_ranges(path, 1)[0]
+    blocks = _pushdown_blocks(_range_blocks(path, start, end), accepts_head)
+    return _top_level_elements(_range_events(blocks), None)
+
+
+def scan_elements(path: str, accepts_head: Callable[[bytes], bool]):
+    """
+        Passes the raw opening line of every top level element of an export to
+        accepts_head without parsing any element, e.g. to count elements.
+    """
+    start, end = export_ranges(path, 1)[0]
+    for _ in _pushdown_blocks(_range_blocks(path, start, end), accepts_head):
+        pass
+
+
+def _range_events(blocks: Iterable[bytes]):
+    parser = ET.XMLPullParser(events=("start", "end"))
+    parser.feed(b"<HealthData>")
+    for block in blocks:
+        parser.feed(block)
+        yield from parser.read_events()
+    parser.feed(ROOT_END)
+    yield from parser.read_events()
+    parser.close()
+
+
+def _parse_records_range(path: str, start: int, end: int, attributes: Optional[List[str]],
+                         record_filter: Optional[RecordFilter] = None) -> RecordColumns:
+    blocks = _range_blocks(path, start, end)
+    if record_filter is not None:
+        blocks = _pushdown_blocks(
+            blocks, lambda head: element_tag(head) == b"Record" and record_filter.accepts_head(head)
+        )
+
+    columns = RecordColumns(attributes)
+    for record in _top_level_elements(_range_events(blocks), {"Record"}):
+        if record_filter is None or record_filter.accepts(record.attrib):
+            columns.append(record.attrib)
+    return columns
+
+
+def parse_records(source, attributes: Optional[Iterable[str]] = None, workers: int = 1,
+                  record_filter: Optional[RecordFilter] = None) -> RecordColumns:
+    """
+        Collects the Record elements of an export into a RecordColumns buffer.
+
+        attributes: record attributes to keep, None keeps every attribute
+        workers: number of processes, each parsing its own byte range of the file
+        record_filter: only keep records of these types and dates, all other
+            records are skipped before they are parsed
+    """
+    attributes = list(attributes) if attributes is not None else None
+
+    if workers <= 1:
+        if record_filter is not None:
+            start, end = export_ranges(source, 1)[0]
+            return _parse_records_range(source, start, end, attributes, record_filter)
+
+        columns = RecordColumns(attributes)
+        for record in ExportStream(source).elements(tags=["Record"]):
+            columns.append(record.attrib)
+        return columns
+
+    ranges = export_ranges(source, workers)
+    with Pool(min(workers, len(ranges))) as pool:
+        chunks = pool.starmap(
+            _parse_records_range,
+            [(source, start, end, attributes, record_filter) for start, end in ranges]
+        )
+
+    # Chunks are returned in file order, so merging keeps the original record order
+    columns = chunks[0]
+    for chunk in chunks[1:]:
+        columns.extend(chunk)
+    return columns
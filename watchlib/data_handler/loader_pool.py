@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+from functools import partial
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from watchlib.utils.gpx import GPX_COLUMNS, read_gpx
+from watchlib.utils.ecg_csv import read_ecg_csv
+
+# (dtype, length) of every array in a shared memory block
+Layout = List[Tuple[str, int]]
+
+
+def _to_shared(arrays: List[np.ndarray]) -> Tuple[str, Layout]:
+    """
+        Copies arrays back to back into a new shared memory block, only its name and
+        the layout are sent back to the parent.
+    """
+    size = sum(values.nbytes for values in arrays)
+    # Blocks cannot be empty
+    shm = SharedMemory(create=True, size=max(size, 1))
+    offset = 0
+    for values in arrays:
+        target = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=offset)
+        target[:] = values
+        offset += values.nbytes
+        # The block cannot be closed while views of it exist
+        del target
+    shm.close()
+    return shm.name, [(values.dtype.str, len(values)) for values in arrays]
+
+
+def _from_shared(name: str, layout: Layout) -> List[np.ndarray]:
+    """
+        Copies a shared memory block out with a single copy and frees it, the arrays
+        are views of that copy.
+    """
+    shm = SharedMemory(name=name)
+    try:
+        size = sum(np.dtype(dtype).itemsize * length for dtype, length in layout)
+        buffer = np.frombuffer(shm.buf, dtype=np.uint8, count=size).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    arrays = []
+    offset = 0
+    for dtype, length in layout:
+        dtype = np.dtype(dtype)
+        arrays.append(np.frombuffer(buffer, dtype=dtype, count=length, offset=offset))
+        offset += dtype.itemsize * length
+    return arrays
+
+
+def _load_route_chunk(folder: str, filenames: List[str], shared: bool):
+    routes = []
+    for filename in filenames:
+        with open(os.path.join(folder, filename), "rb") as f:
+            routes.append(read_gpx(f.read()))
+    lengths = [len(route["lon"]) for route in routes]
+    # One array per column for the whole chunk
+    columns = [np.concatenate([route[column] for route in routes]) for column in GPX_COLUMNS]
+    if shared:
+        return _to_shared(columns), lengths
+    return columns, lengths
+
+
+def _load_ecg_chunk(folder: str, filenames: List[str], shared: bool):
+    ecgs = []
+    for filename in filenames:
+        with open(os.path.join(folder, filename), "rb") as f:
+            ecgs.append(read_ecg_csv(f.read()))
+    lengths = [len(values) for values, _ in ecgs]
+    values = [np.concatenate([values for values, _ in ecgs])]
+    meta_data = [meta_data for _, meta_data in ecgs]
+    if shared:
+        return _to_shared(values), lengths, meta_data
+    return values, lengths, meta_data
+
+
+def _split(values: np.ndarray, lengths: List[int]) -> List[np.ndarray]:
+    return np.split(values, np.cumsum(lengths)[:-1]) if lengths else []
+
+
+class LoaderPool:
+    """
+        Persistent process pool for loading workout routes and ECGs.
+
+        Filenames are sent to the workers in chunks of chunk_size files. Workers return
+        the parsed values of a chunk through one shared memory block instead of pickled
+        DataFrames, only the block name, lengths and ECG meta data are pickled.
+        The processes are started on first use and kept until close().
+
+        workers: number of processes, defaults to the number of cpus.
+                 With workers <= 1 files are loaded sequentially in the calling process.
+        chunk_size: number of files parsed by one task
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 16):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.__pool = None
+
+    @property
+    def sequential(self) -> bool:
+        return self.workers <= 1
+
+    def __enter__(self) -> "LoaderPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+
+    def __map(self, load_chunk: Callable, folder: str, filenames: List[str]) -> List:
+        chunks = [filenames[i:i + self.chunk_size] for i in range(0, len(filenames), self.chunk_size)]
+        if self.sequential or len(chunks) <= 1:
+            return [load_chunk(folder, chunk, shared=False) for chunk in chunks]
+        if self.__pool is None:
+            # Workers have to share the resource tracker of this process, otherwise their
+            # trackers would try to free the blocks already freed by _from_shared
+            resource_tracker.ensure_running()
+            self.__pool = Pool(self.workers)
+        return self.__pool.map(partial(load_chunk, folder, shared=True), chunks, chunksize=1)
+
+    def load_routes(self, folder: str, filenames: List[str]) -> List[Dict[str, np.ndarray]]:
+        """
+            Parses the GPX files into one dict of columns (see read_gpx) per file.
+        """
+        routes = []
+        for columns, lengths in self.__map(_load_route_chunk, folder, filenames):
+            if isinstance(columns, tuple):
+                columns = _from_shared(*columns)
+            split = [_split(values, lengths) for values in columns]
+            routes.extend(dict(zip(GPX_COLUMNS, points)) for points in zip(*split))
+        return routes
+
+    def load_ecgs(self, folder: str, filenames: List[str]) -> List[Tuple[np.ndarray, dict]]:
+        """
+            Parses the ECG files into (voltage values, meta data) pairs.
+        """
+        ecgs = []
+        for values, lengths, meta_data in self.__map(_load_ecg_chunk, folder, filenames):
+            if isinstance(values, tuple):
+                values = _from_shared(*values)
+            ecgs.extend(zip(_split(values[0], lengths), meta_data))
+        return ecgs
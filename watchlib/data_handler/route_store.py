@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from watchlib.utils.gpx import parse_gpx_times, route_frame
+from watchlib.utils.route_summary import RouteSummary
+
+# Point columns of a workout route, every column is stored as one contiguous array
+ROUTE_COLUMNS: Dict[str, np.dtype] = {
+    "lon": np.dtype(np.float64),
+    "lat": np.dtype(np.float64),
+    "time": np.dtype("datetime64[s]"),
+    "elevation": np.dtype(np.float64),
+    "speed": np.dtype(np.float64),
+    "course": np.dtype(np.float64),
+    "hAcc": np.dtype(np.float64),
+    "vAcc": np.dtype(np.float64),
+}
+
+
+def route_columns(route: Union[pd.DataFrame, Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+        Converts the points of a route to the typed store columns.
+        GPX times (e.g. 2021-05-01T10:00:00Z) become naive UTC datetime64[s] values,
+        missing columns are filled with NaN / NaT.
+    """
+    length = len(next(iter(route.values()))) if isinstance(route, dict) else len(route)
+    columns = {}
+    for name, dtype in ROUTE_COLUMNS.items():
+        if name not in route:
+            columns[name] = np.full(length, np.nan if dtype.kind == "f" else np.datetime64("NaT"), dtype=dtype)
+        elif dtype.kind == "M":
+            columns[name] = parse_gpx_times(route[name]).astype(dtype)
+        else:
+            columns[name] = np.asarray(route[name], dtype=dtype)
+    return columns
+
+
+class RouteStoreWriter:
+    """
+        Writes routes one after another into a RouteStore folder.
+
+        Every column is spooled into its own temporary file, close() concatenates them
+        into a single points file and replaces the previous store at once, so a store
+        can be rewritten while its routes are still being read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = tempfile.mkdtemp(prefix=".route_store", dir=path)
+        self.files = {name: open(os.path.join(self.tmp_path, name), "wb") for name in ROUTE_COLUMNS}
+        self.names: List[str] = []
+        self.offsets: List[int] = [0]
+        self.summaries: List[dict] = []
+
+    def add(self, name: str, route: Union[pd.DataFrame, Dict[str, np.ndarray]]):
+        columns = route_columns(route)
+        for column, values in columns.items():
+            self.files[column].write(np.ascontiguousarray(values).tobytes())
+        self.names.append(str(name))
+        self.summaries.append(RouteSummary.from_points(columns["lon"], columns["lat"], columns["time"]).to_dict())
+        self.offsets.append(self.offsets[-1] + len(columns["lon"]))
+
+    def close(self):
+        try:
+            for f in self.files.values():
+                f.close()
+
+            points_path = os.path.join(self.tmp_path, RouteStore.POINTS)
+            layout = []
+            offset = 0
+            with open(points_path, "wb") as points:
+                for name, dtype in ROUTE_COLUMNS.items():
+                    with open(os.path.join(self.tmp_path, name), "rb") as f:
+                        shutil.copyfileobj(f, points)
+                    layout.append({"name": name, "dtype": dtype.str, "offset": offset})
+                    offset += self.offsets[-1] * dtype.itemsize
+
+            index = {
+                "points": self.offsets[-1],
+                "columns": layout,
+                "names": self.names,
+                "offsets": self.offsets,
+                "summaries": self.summaries,
+            }
+            index_path = os.path.join(self.tmp_path, RouteStore.INDEX)
+            with open(index_path, "w") as f:
+                json.dump(index, f)
+
+            # The index is replaced last, a reader never sees an index pointing past the points
+            os.replace(points_path, os.path.join(self.path, RouteStore.POINTS))
+            os.replace(index_path, os.path.join(self.path, RouteStore.INDEX))
+        finally:
+            self.abort()
+
+    def abort(self):
+        """
+            Removes the temporary files and keeps the previous store.
+        """
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class RouteStore:
+    """
+        All points of all cached routes in one memory-mapped file.
+
+        route_points.bin holds one contiguous array per column (see ROUTE_COLUMNS),
+        route_index.json the column layout, the route names, the offsets of every
+        route within the columns and a RouteSummary per route. The points of a route
+        are zero-copy slices of the mapped columns, summaries never touch them.
+    """
+
+    POINTS = "route_points.bin"
+    INDEX = "route_index.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, self.INDEX), "r") as f:
+            index = json.load(f)
+
+        self.names: List[str] = index["names"]
+        self.offsets = np.array(index["offsets"], dtype=np.int64)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        # Stores written before summaries were added compute them on demand
+        self.summaries: List[Union[dict, None]] = index.get("summaries", [None] * len(self.names))
+
+        points = index["points"]
+        # mmap cannot map empty files
+        buffer = np.memmap(os.path.join(path, self.POINTS), dtype=np.uint8, mode="r") if points else None
+        self.columns: Dict[str, np.ndarray] = {}
+        for column in index["columns"]:
+            dtype = np.dtype(column["dtype"])
+            if buffer is None:
+                self.columns[column["name"]] = np.empty(0, dtype=dtype)
+            else:
+                self.columns[column["name"]] = np.ndarray(
+                    shape=(points,), dtype=dtype, buffer=buffer, offset=column["offset"])
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.INDEX)) and os.path.exists(os.path.join(path, cls.POINTS))
+
+    @staticmethod
+    def write(path: str, routes: Iterable[Tuple[str, Union[pd.DataFrame, Dict[str, np.ndarray]]]]):
+        """
+            Writes (name, points) pairs into a new store at path, replacing an existing one.
+        """
+        writer = RouteStoreWriter(path)
+        try:
+            for name, route in routes:
+                writer.add(name, route)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.positions
+
+    def points(self, key: Union[int, str]) -> Dict[str, np.ndarray]:
+        """
+            Zero-copy views of the point columns of a route, by position or name.
+        """
+        i = self.positions[key] if isinstance(key, str) else key
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {name: values[start:end] for name, values in self.columns.items()}
+
+    def summary(self, key: Union[int, str]) -> RouteSummary:
+        """
+            Start, end, duration, bounding box, distance and point count of a route
+            without reading its points.
+        """
+        i = self.positions[key] if isinstance(key, str) else key
+        if self.summaries[i] is None:
+            points = self.points(i)
+            return RouteSummary.from_points(points["lon"], points["lat"], points["time"])
+        return RouteSummary.from_dict(self.summaries[i])
+
+    def frame(self, key: Union[int, str]) -> pd.DataFrame:
+        """
+            The points of a route as a DataFrame backed by the mapped file, the times are
+            tz-aware UTC timestamps like the ones of WorkoutRoute.
+        """
+        return route_frame(self.points(key))
+
+    def frames(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        for i, name in enumerate(self.names):
+            yield name, self.frame(i)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from watchlib.data_handler.ecg_codec import INT16_MAX, ECGCodec
+
+
+def ecg_values(samples: int = 15360, seed: int = 0) -> np.ndarray:
+    # Noisy baseline with an R peak of about 900 uV every 400 samples, like the exports
+    rng = np.random.default_rng(seed)
+    phase = np.arange(samples) % 400
+    peaks = np.where(np.abs(phase - 20) < 6, 900 * (1 - np.abs(phase - 20) / 6), 0)
+    return np.round(rng.normal(0, 15, samples) + peaks, 3)
+
+
+def test_round_trip_within_error_bound():
+    codec = ECGCodec(block_size=1024)
+    values = ecg_values()
+    meta_data = {"Sample Rate": "512 Hertz", "Classification": "Sinus Rhythm"}
+
+    decoded, decoded_meta_data = codec.decode(codec.encode(values, meta_data))
+
+    bound = codec.error_bound(codec.step_for(values))
+    assert decoded.shape == values.shape
+    assert np.max(np.abs(decoded - values)) <= bound * (1 + 1e-9)
+    assert decoded_meta_data == meta_data
+
+
+def test_default_step_is_the_finest_int16_step():
+    values = ecg_values()
+    peak = np.max(np.abs(values))
+
+    assert ECGCodec().step_for(values) == pytest.approx(peak / INT16_MAX)
+    assert ECGCodec(resolution=0.5).step_for(values) == 0.5
+    # A resolution never makes the step too fine for the peak
+    assert ECGCodec(resolution=1e-6).step_for(values) == pytest.approx(peak / INT16_MAX)
+
+
+def test_values_on_the_resolution_grid_are_exact():
+    codec = ECGCodec(resolution=0.5)
+    values = np.round(ecg_values() * 2) / 2
+
+    decoded, _ = codec.decode(codec.encode(values))
+
+    np.testing.assert_allclose(decoded, values, rtol=0, atol=1e-9)
+
+
+def test_missing_samples_stay_missing():
+    codec = ECGCodec()
+    values = ecg_values(3000)
+    values[[0, 17, 2999]] = np.nan
+
+    decoded, _ = codec.decode(codec.encode(values))
+
+    assert np.array_equal(np.isnan(decoded), np.isnan(values))
+
+
+@pytest.mark.parametrize("values", [np.empty(0), np.zeros(100), np.full(10, np.nan)])
+def test_ecgs_without_peak(values):
+    codec = ECGCodec()
+
+    decoded, _ = codec.decode(codec.encode(values))
+
+    np.testing.assert_array_equal(decoded, values)
+
+
+@pytest.mark.parametrize("start, end", [(0, 10), (1000, 1030), (1020, 2100), (5000, None), (-50, None), (300, 200)])
+def test_ranges_match_the_full_decode(tmp_path, start, end):
+    codec = ECGCodec(block_size=1024)
+    values = ecg_values(5000)
+    path = str(tmp_path / f"ecg{codec.extension}")
+    codec.write(path, values)
+
+    full, _ = codec.read(path)
+    part, _ = codec.read(path, start, end)
+
+    np.testing.assert_array_equal(part, full[start:end])
+
+
+def test_header(tmp_path):
+    codec = ECGCodec(block_size=1000)
+    values = ecg_values(4500)
+    path = str(tmp_path / f"ecg{codec.extension}")
+    codec.write(path, values, {"Sample Rate": "512 Hertz"})
+
+    header = codec.read_header(path)
+
+    assert header["samples"] == 4500
+    assert len(header["blocks"]) == 5
+    assert header["step"] == codec.step_for(values)
+    assert header["meta_data"] == {"Sample Rate": "512 Hertz"}
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ECGCodec(resolution=0)
+    with pytest.raises(ValueError):
+        ECGCodec(block_size=0)
+    with pytest.raises(ValueError):
+        ECGCodec().decode(b"not an encoded ECG")
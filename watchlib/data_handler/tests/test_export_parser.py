@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from watchlib.data_handler import export_parser
+from watchlib.data_handler.export_parser import RecordFilter, _pushdown_blocks, parse_records
+
+TYPES = [
+    ("HKQuantityTypeIdentifierHeartRate", ' unit="count/min"', "71"),
+    ("HKQuantityTypeIdentifierStepCount", ' unit="count"', "12"),
+    ("HKCategoryTypeIdentifierSleepAnalysis", "", "HKCategoryValueSleepAnalysisAsleep"),
+]
+
+
+def record(i: int, start: datetime, indent: str = " ") -> str:
+    record_type, unit, value = TYPES[i % len(TYPES)]
+    stamp = start.strftime("%Y-%m-%d %H:%M:%S +0100")
+    line = (f'{indent}<Record type="{record_type}" sourceName="Apple Watch"{unit} creationDate="{stamp}" '
+            f'startDate="{stamp}" endDate="{stamp}" value="{value}"')
+    if i % 7 == 0:
+        return line + f'>\n{indent}  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n{indent}</Record>\n'
+    return line + "/>\n"
+
+
+def write_export(path, records: int, start: datetime = datetime(2021, 1, 1), indent: str = " ") -> str:
+    # Apple's layout: every top level element on its own line, indented by one space, nested ones deeper
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="de_DE">\n',
+             f'{indent}<ExportDate value="2021-02-01 00:00:00 +0100"/>\n']
+    for i in range(records):
+        lines.append(record(i, start + timedelta(hours=i), indent))
+        if i % 50 == 0:
+            stamp = (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S +0100")
+            # Records inside a Correlation are not top level records
+            lines.append(f'{indent}<Correlation type="HKCorrelationTypeIdentifierBloodPressure" startDate="{stamp}">\n'
+                         f'{indent}  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" startDate="{stamp}" value="120"/>\n'
+                         f'{indent}</Correlation>\n')
+    lines.append("</HealthData>\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(lines))
+    return str(path)
+
+
+def blocks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.fixture
+def export(tmp_path):
+    return write_export(tmp_path / "Export.xml", 2000)
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+@pytest.mark.parametrize("attributes", [None, ["creationDate", "value"]])
+def test_parallel_parse_matches_sequential(export, workers, attributes):
+    expected = parse_records(export, attributes).to_frame()
+
+    frame = parse_records(export, attributes, workers=workers).to_frame()
+
+    assert len(expected) == 2000
+    pd.testing.assert_frame_equal(frame, expected)
+
+
+@pytest.mark.parametrize("size", [1, 3, 4, 5, 100, 1 << 20])
+def test_pushdown_does_not_depend_on_block_boundaries(export, size):
+    with open(export, "rb") as f:
+        data = f.read()
+    accepts = lambda head: b"HeartRate" in head or b"Correlation" in head
+
+    expected = list(_pushdown_blocks([data], accepts))
+    pushed = list(_pushdown_blocks(blocks(data, size), accepts))
+
+    assert b"".join(pushed) == b"".join(expected)
+    assert len(expected) == 1 + (2000 + 2) // 3 + 40
+
+
+def test_pushdown_passes_everything_after_the_limit(monkeypatch):
+    # Without Apple's indentation no element start is ever found
+    data = b"<HealthData>" + b"".join(record(i, datetime(2021, 1, 1)).strip().encode() for i in range(100)) + b"</HealthData>"
+    monkeypatch.setattr(export_parser, "PUSHDOWN_LIMIT", 256)
+
+    pushed = b"".join(_pushdown_blocks(blocks(data, 64), lambda head: False))
+
+    assert pushed == data
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_filtered_parse_of_other_layouts(tmp_path, monkeypatch, workers):
+    export = write_export(tmp_path / "Export.xml", 300, indent="")
+    monkeypatch.setattr(export_parser, "PUSHDOWN_LIMIT", 1024)
+    expected = parse_records(export).to_frame()
+    expected = expected[expected["type"] == "HKQuantityTypeIdentifierHeartRate"].reset_index(drop=True)
+
+    frame = parse_records(export, workers=workers, record_filter=RecordFilter(types=["HeartRate"])).to_frame()
+
+    pd.testing.assert_frame_equal(frame, expected)
+
+
+def test_filter_accepts_full_and_short_type_names():
+    record_filter = RecordFilter(types=["HeartRate", "HKCategoryTypeIdentifierSleepAnalysis"])
+
+    assert record_filter.accepts_type("HKQuantityTypeIdentifierHeartRate")
+    assert record_filter.accepts_type("HKCategoryTypeIdentifierSleepAnalysis")
+    assert not record_filter.accepts_type("HKQuantityTypeIdentifierStepCount")
+    assert RecordFilter().accepts_type("HKQuantityTypeIdentifierStepCount")
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2021-01-02 10:00:00", "2021-01-02 12:00:00"),
+    (datetime(2021, 1, 2, 10), datetime(2021, 1, 2, 12)),
+])
+def test_filter_start_is_inclusive_and_end_exclusive(start, end):
+    record_filter = RecordFilter(start=start, end=end)
+
+    assert not record_filter.accepts_date("2021-01-02 09:59:59 +0100")
+    assert record_filter.accepts_date("2021-01-02 10:00:00 +0100")
+    assert record_filter.accepts_date("2021-01-02 11:59:59 +0100")
+    assert not record_filter.accepts_date("2021-01-02 12:00:00 +0100")
+
+
+def test_filter_date_only_bounds_cover_whole_days():
+    record_filter = RecordFilter(start="2021-01-02", end="2021-01-03")
+
+    assert not record_filter.accepts_date("2021-01-01 23:59:59 +0100")
+    assert record_filter.accepts_date("2021-01-02 00:00:00 +0100")
+    assert record_filter.accepts_date("2021-01-02 23:59:59 +0100")
+    assert not record_filter.accepts_date("2021-01-03 00:00:00 +0100")
+
+
+def test_filter_compares_the_local_time_of_the_export():
+    record_filter = RecordFilter(end="2021-01-02")
+
+    # 00:30 local time is still 2021-01-01 in UTC, but the local date counts
+    assert not record_filter.accepts_date("2021-01-02 00:30:00 +0100")
+    assert record_filter.accepts_date("2021-01-01 23:30:00 -0500")
+
+
+def test_filter_rejects_records_without_start_date():
+    assert not RecordFilter(start="2021-01-01").accepts({"type": "HKQuantityTypeIdentifierHeartRate"})
+    assert RecordFilter().accepts({"type": "HKQuantityTypeIdentifierHeartRate"})
+
+
+def test_filter_heads_match_parsed_attributes():
+    record_filter = RecordFilter(types=["HeartRate"], start="2021-01-02", end=datetime(2021, 1, 3, 12))
+    for i in range(0, 96):
+        line = record(i, datetime(2021, 1, 1, 12) + timedelta(hours=i))
+        head = ("\n" + line.split("\n")[0]).encode()
+        record_type = TYPES[i % len(TYPES)][0]
+        start_date = line.split('startDate="')[1].split('"')[0]
+
+        assert record_filter.accepts_head(head) == record_filter.accepts({"type": record_type, "startDate": start_date})
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_filtered_parse_matches_filtering_all_records(export, workers):
+    record_filter = RecordFilter(types=["HeartRate", "StepCount"], start="2021-01-10", end=datetime(2021, 2, 1, 6))
+    records = parse_records(export).to_frame()
+    local = records["startDate"].str.slice(0, 19)
+    expected = records[records["type"].isin(["HKQuantityTypeIdentifierHeartRate", "HKQuantityTypeIdentifierStepCount"])
+                       & (local >= "2021-01-10") & (local < "2021-02-01 06:00:00")].reset_index(drop=True)
+
+    frame = parse_records(export, workers=workers, record_filter=record_filter).to_frame()
+
+    assert 0 < len(frame) < len(records)
+    pd.testing.assert_frame_equal(frame, expected)
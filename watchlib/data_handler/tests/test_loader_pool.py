@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from watchlib.data_handler.loader_pool import _from_shared, _to_shared
+
+
+@pytest.mark.parametrize("arrays", [
+    [],
+    [np.empty(0)],
+    [np.arange(5, dtype=np.float64), np.array([1, 2], dtype=np.int64), np.empty(0, dtype=np.float32)],
+])
+def test_shared_memory_round_trip(arrays):
+    copied = _from_shared(*_to_shared(arrays))
+
+    assert len(copied) == len(arrays)
+    for values, expected in zip(copied, arrays):
+        assert values.dtype == expected.dtype
+        np.testing.assert_array_equal(values, expected)
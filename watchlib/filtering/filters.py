@@ -41,9 +41,8 @@ class BBoxFilter(Filter):
     def route_bboxes(self, routes: List[WorkoutRoute]) -> List[BBox]:
         bboxes = []
         for route in self.routes:
-            lat_min, lat_max = route["lat"].min(), route["lat"].max()
-            lon_min, lon_max = route["lon"].min(), route["lon"].max()
-            bboxes.append(BBox(lon_min, lat_min, lon_max, lat_max))
+            # Uses the route summary, lazy routes are not loaded
+            bboxes.append(BBox(*route.bbox))
         return bboxes
 
 
@@ -66,8 +65,7 @@ class DiagonalBBoxFilter(BBoxFilter):
         return d
 
     def __haversine_for_route(route: WorkoutRoute) -> float:
-        lat1, lat2 = route["lat"].min(), route["lat"].max()
-        lon1, lon2 = route["lon"].min(), route["lon"].max()
+        lon1, lat1, lon2, lat2 = route.bbox
         return DiagonalBBoxFilter.__haversine(lat1, lat2, lon1, lon2)
 
     @staticmethod
@@ -161,8 +159,9 @@ class CountryFilter(BBoxFilter):
 
         filtered_routes = []
         for route in routes:
-            if (route["lon"].min() >= min_lon) and (route["lon"].max() <= max_lon):
-                if (route["lat"].min() >= min_lat) and (route["lat"].max() <= max_lat):
+            lon_min, lat_min, lon_max, lat_max = route.bbox
+            if (lon_min >= min_lon) and (lon_max <= max_lon):
+                if (lat_min >= min_lat) and (lat_max <= max_lat):
                     filtered_routes.append(route)
         return filtered_routes
 
@@ -1 +1,4 @@
 from watchlib.utils.structs import *
+from watchlib.utils.gpx import read_gpx
+from watchlib.utils.route_summary import RouteSummary
+from watchlib.utils.ecg_csv import read_ecg_csv
@@ -0,0 +1,67 @@
+import warnings
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+# Lines before the voltage values: 12 lines of meta data and one empty line
+META_LINES = 12
+HEADER_LINES = 13
+
+
+def _read_meta_data(lines) -> Dict[str, str]:
+    meta_data = {}
+    for m in lines:
+        if m != "" and "," in m:  # makes sure that the row isnt empty and that it is a key,value pair
+            x = m.split(",")
+            if len(x) == 3:  # if commas were used instead of points for floats
+                meta_data[x[0]] = x[1] + "." + x[2]
+            else:
+                meta_data[x[0]] = x[1]
+    return meta_data
+
+
+def _parse_values(block: bytes) -> Optional[np.ndarray]:
+    """
+        Parses one number per line in bulk, numpy converts the numbers in C without
+        creating a Python object per line. Returns None if the block cannot be parsed
+        this way, e.g. a line that is not a number.
+    """
+    # Lines with more than one number would be split into several values
+    if b" " in block or b"\t" in block:
+        return None
+    text = block.replace(b",", b".").decode("utf-8")
+    try:
+        with warnings.catch_warnings():
+            # Older numpy versions only warn and stop at unparsable data
+            warnings.simplefilter("error", DeprecationWarning)
+            return np.fromstring(text, dtype=np.float64, sep=" ")
+    except (ValueError, DeprecationWarning):
+        return None
+
+
+def read_ecg_csv(source: Union[str, bytes]) -> Tuple[np.ndarray, Dict[str, str]]:
+    """
+        Reads an ECG export of the Apple Health app.
+
+        source: content of the .csv file
+
+        Returns the voltage values as a float64 array and the meta data of the 12 header
+        lines (Name, Recorded Date, Sample Rate, ...). Values and meta data may use a comma
+        as decimal separator, empty lines are skipped.
+    """
+    data = source.encode("utf-8") if isinstance(source, str) else bytes(source)
+
+    end = 0
+    for _ in range(HEADER_LINES):
+        end = data.find(b"\n", end) + 1
+        if end == 0:
+            end = len(data)
+            break
+    meta_data = _read_meta_data(data[:end].decode("utf-8").split("\n")[:META_LINES])
+
+    values = _parse_values(data[end:])
+    if values is None:
+        # Same result or error as parsing line by line
+        lines = data[end:].decode("utf-8").split("\n")
+        values = np.array([float(d.replace(",", ".")) for d in lines if d != ""], dtype=np.float64)
+    return values, meta_data
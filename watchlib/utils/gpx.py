@@ -0,0 +1,194 @@
+import re
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+# Route column -> GPX tag of the values, lon and lat are trkpt attributes
+GPX_FIELDS = {
+    "elevation": "ele",
+    "time": "time",
+    "speed": "speed",
+    "course": "course",
+    "hAcc": "hAcc",
+    "vAcc": "vAcc",
+}
+
+GPX_COLUMNS = ["lon", "lat", "time", "elevation", "speed", "course", "hAcc", "vAcc"]
+
+TRKPT = re.compile(rb"<([\w.-]+:)?trkpt\b")
+LON = re.compile(rb"\blon\s*=\s*[\"']([^\"']*)")
+LAT = re.compile(rb"\blat\s*=\s*[\"']([^\"']*)")
+
+# Missing times in GPX files and in route csv files read with pandas
+MISSING_TIMES = [b"", b"nan", b"NaN", b"None", b"NaT"]
+
+
+@lru_cache(maxsize=None)
+def _patterns(prefix: bytes) -> Dict[str, re.Pattern]:
+    # Patterns starting with a literal are much faster than ones with an optional
+    # namespace prefix, so they are built for the prefix the file uses
+    patterns = {"trkpt": re.compile(rb"<" + re.escape(prefix) + rb"trkpt\b([^>]*)>"),
+                "end": re.compile(rb"</" + re.escape(prefix) + rb"trkpt\s*>")}
+    for column, tag in GPX_FIELDS.items():
+        patterns[column] = re.compile(rb"<" + re.escape(prefix) + tag.encode() + rb">([^<]*)<")
+    return patterns
+
+
+def _empty_points(n: int) -> Dict[str, np.ndarray]:
+    points = {column: np.full(n, np.nan) for column in GPX_COLUMNS}
+    points["time"] = np.full(n, np.datetime64("NaT"), dtype="datetime64[s]")
+    return points
+
+
+def parse_gpx_times(values) -> np.ndarray:
+    """
+        Converts GPX times (2021-05-01T10:00:00Z) or times written to csv files
+        (2021-05-01 10:00:00) to naive UTC datetime64[s] values, missing times become NaT.
+        Times with another utc offset (2021-05-01 12:00:00+02:00) are converted by pandas.
+    """
+    if isinstance(getattr(values, "dtype", None), pd.DatetimeTZDtype):
+        values = pd.Series(values).dt.tz_convert("UTC").dt.tz_localize(None)
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[s]")
+    try:
+        # numpy does not parse the UTC designator, fractions of seconds are dropped
+        times = np.char.strip(np.array(values, dtype=bytes), b" \t\r\nZ")
+        offsets = (np.char.rfind(times, b"+") >= 10) | (np.char.rfind(times, b"-") >= 10)
+        if not offsets.any():
+            times = np.where(np.isin(times, MISSING_TIMES), b"NaT", times)
+            return times.astype("datetime64[ms]").astype("datetime64[s]")
+    except ValueError:
+        pass
+    # Without format="ISO8601", which needs pandas 2
+    times = pd.to_datetime(pd.Series(values), utc=True).dt.tz_localize(None)
+    return times.to_numpy().astype("datetime64[s]")
+
+
+def utc_times(values) -> pd.DatetimeIndex:
+    """
+        Times of route points (see parse_gpx_times) as tz-aware UTC timestamps, the type
+        of the time column of WorkoutRoute.
+    """
+    if isinstance(getattr(values, "dtype", None), pd.DatetimeTZDtype):
+        return pd.DatetimeIndex(values).tz_convert("UTC")
+    return pd.DatetimeIndex(parse_gpx_times(values)).tz_localize("UTC")
+
+
+def route_frame(points) -> pd.DataFrame:
+    """
+        DataFrame of the points of a route (a dict of arrays like read_gpx returns or a
+        DataFrame) with tz-aware UTC times. The other columns are not copied.
+    """
+    columns = {column: points[column] for column in points}
+    if "time" in columns:
+        columns["time"] = utc_times(columns["time"])
+    return pd.DataFrame(columns, copy=False)
+
+
+def _to_array(column: str, values) -> np.ndarray:
+    if column == "time":
+        return parse_gpx_times(values)
+    values = np.array(values, dtype=bytes)
+    return np.where(values == b"", b"nan", values).astype(np.float64)
+
+
+def _read_gpx_bytes(data: bytes) -> Dict[str, np.ndarray]:
+    """
+        Reads the track points with regular expressions over the raw bytes. Every value is
+        assigned to the track point it lies in, values outside of track points (e.g. the
+        time of the metadata) are ignored. Files the expressions cannot read reliably
+        (comments, CDATA, self-closing track points or a field twice in one point) are
+        parsed with ElementTree instead.
+    """
+    first = TRKPT.search(data)
+    if first is None:
+        return _empty_points(0)
+    prefix = first.group(1) or b""
+    patterns = _patterns(prefix)
+
+    start, end = first.start(), len(data)
+    if data.find(b"<!--", start) != -1 or data.find(b"<![CDATA[", start) != -1:
+        return _read_gpx_element(ET.fromstring(data))
+
+    heads = list(patterns["trkpt"].finditer(data, start, end))
+    n = len(heads)
+    starts = np.array([head.end() for head in heads], dtype=np.int64)
+    ends = np.array([match.start() for match in patterns["end"].finditer(data, start, end)], dtype=np.int64)
+    # Every point has to be closed before the next one starts
+    if len(ends) != n or np.any(ends < starts) or np.any(ends[:-1] > starts[1:]):
+        return _read_gpx_element(ET.fromstring(data))
+
+    points = _empty_points(n)
+    attributes = b"\0".join(head.group(1) for head in heads)
+    for column, pattern in (("lon", LON), ("lat", LAT)):
+        values = pattern.findall(attributes)
+        if len(values) == n:
+            points[column] = _to_array(column, values)
+        else:
+            for i, head in enumerate(heads):
+                match = pattern.search(head.group(1))
+                if match is not None:
+                    points[column][i] = _to_array(column, [match.group(1)])[0]
+
+    for column in GPX_FIELDS:
+        matches = list(patterns[column].finditer(data, start, end))
+        if not matches:
+            continue
+        positions = np.array([match.start() for match in matches], dtype=np.int64)
+        index = np.searchsorted(starts, positions, side="right") - 1
+        inside = (index >= 0) & (positions < ends[np.maximum(index, 0)])
+        index = index[inside]
+        if np.any(np.diff(index) == 0):
+            return _read_gpx_element(ET.fromstring(data))
+        values = [match.group(1) for match, keep in zip(matches, inside) if keep]
+        if len(index) == n:
+            points[column] = _to_array(column, values)
+        elif len(index):
+            points[column][index] = _to_array(column, values)
+    return points
+
+
+def _read_gpx_element(root: ET.Element) -> Dict[str, np.ndarray]:
+    track_points = [element for element in root.iter() if element.tag.endswith("trkpt")]
+    points = _empty_points(len(track_points))
+    times = [None] * len(track_points)
+    for i, track_point in enumerate(track_points):
+        for column in ("lon", "lat"):
+            value = track_point.get(column)
+            if value is not None:
+                points[column][i] = float(value)
+        for element in track_point.iter():
+            # Strips the namespace, extensions are children of <extensions>
+            tag = element.tag.rsplit("}", 1)[-1]
+            if element.text is None or not element.text.strip():
+                continue
+            if tag == "time":
+                times[i] = element.text.strip().encode()
+            elif tag in ("ele", "speed", "course", "hAcc", "vAcc"):
+                points["elevation" if tag == "ele" else tag][i] = float(element.text)
+    known = [i for i, time in enumerate(times) if time is not None]
+    if known:
+        points["time"][known] = _to_array("time", [times[i] for i in known])
+    return points
+
+
+def read_gpx(source: Union[str, bytes, ET.Element]) -> Dict[str, np.ndarray]:
+    """
+        Reads all track points of a GPX workout route into NumPy arrays.
+
+        source: path of a .gpx file, its content as bytes or an already parsed root element
+
+        Returns one array per column of GPX_COLUMNS. Times are naive UTC datetime64[s]
+        values (route_frame makes them tz-aware), values a track point does not have
+        (e.g. points without <extensions>) are NaN / NaT.
+    """
+    if isinstance(source, ET.Element):
+        return _read_gpx_element(source)
+    if isinstance(source, (bytes, bytearray)):
+        return _read_gpx_bytes(bytes(source))
+    with open(source, "rb") as f:
+        return _read_gpx_bytes(f.read())
@@ -0,0 +1,88 @@
+from datetime import datetime as dt
+from typing import Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6372800.0
+
+
+def haversine_distance(lon: np.ndarray, lat: np.ndarray) -> float:
+    """
+        Length of the path through all points in meters, gaps (NaN) are skipped.
+    """
+    lon, lat = np.deg2rad(np.asarray(lon, dtype=np.float64)), np.deg2rad(np.asarray(lat, dtype=np.float64))
+    valid = ~(np.isnan(lon) | np.isnan(lat))
+    lon, lat = lon[valid], lat[valid]
+    if len(lon) < 2:
+        return 0.0
+    latd = np.diff(lat)
+    lond = np.diff(lon)
+    a = np.sin(latd / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(lond / 2) ** 2
+    return float(np.sum(2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))))
+
+
+def route_bbox(lon: np.ndarray, lat: np.ndarray) -> Tuple[float, float, float, float]:
+    """
+        (min_lon, min_lat, max_lon, max_lat) of all points, NaN for routes without coordinates.
+    """
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    if np.isnan(lon).all() or np.isnan(lat).all():
+        return (np.nan, np.nan, np.nan, np.nan)
+    return (float(np.nanmin(lon)), float(np.nanmin(lat)), float(np.nanmax(lon)), float(np.nanmax(lat)))
+
+
+class RouteSummary:
+    """
+        Everything needed to list and filter a route without its points.
+
+        start, end: times of the first and last point (naive UTC)
+        duration_sec: seconds between start and end
+        bbox: (min_lon, min_lat, max_lon, max_lat)
+        distance: length of the route in meters
+        point_count: number of track points
+    """
+
+    def __init__(self, start: Optional[dt], end: Optional[dt], duration_sec: float,
+                 bbox: Tuple[float, float, float, float], distance: float, point_count: int):
+        self.start = start
+        self.end = end
+        self.duration_sec = duration_sec
+        self.bbox = bbox
+        self.distance = distance
+        self.point_count = point_count
+
+    @classmethod
+    def from_points(cls, lon: np.ndarray, lat: np.ndarray, time: np.ndarray) -> "RouteSummary":
+        """
+            lon, lat: coordinates of the track points
+            time: datetime64 times of the track points
+        """
+        lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+        time = np.asarray(time, dtype="datetime64[s]")
+        if len(time) and not np.isnat(time[0]) and not np.isnat(time[-1]):
+            start, end = time[0].astype(dt), time[-1].astype(dt)
+            duration_sec = (end - start).total_seconds()
+        else:
+            start, end, duration_sec = None, None, 0
+        return cls(start, end, duration_sec, route_bbox(lon, lat), haversine_distance(lon, lat), len(lon))
+
+    def to_dict(self) -> dict:
+        return {
+            "start": None if self.start is None else self.start.isoformat(),
+            "end": None if self.end is None else self.end.isoformat(),
+            "duration_sec": self.duration_sec,
+            "bbox": [None if np.isnan(value) else value for value in self.bbox],
+            "distance": self.distance,
+            "point_count": self.point_count,
+        }
+
+    @classmethod
+    def from_dict(cls, summary: dict) -> "RouteSummary":
+        return cls(
+            start=None if summary["start"] is None else dt.fromisoformat(summary["start"]),
+            end=None if summary["end"] is None else dt.fromisoformat(summary["end"]),
+            duration_sec=summary["duration_sec"],
+            bbox=tuple(np.nan if value is None else value for value in summary["bbox"]),
+            distance=summary["distance"],
+            point_count=summary["point_count"],
+        )
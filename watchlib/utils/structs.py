@@ -1,8 +1,12 @@
-from typing import Tuple
+from typing import Callable, Dict, Tuple, Union
+import numpy as np
 import pandas as pd
 import xml.etree.ElementTree as ET
 from abc import ABC, abstractmethod
 from datetime import datetime as dt
+from watchlib.utils.ecg_csv import read_ecg_csv
+from watchlib.utils.gpx import GPX_COLUMNS, parse_gpx_times, read_gpx, route_frame, utc_times
+from watchlib.utils.route_summary import RouteSummary, haversine_distance, route_bbox
 
 
 class ECG:
@@ -10,32 +14,25 @@ class ECG:
     def __init__(self, data: str, name: str):
         self.data, self.meta_data = self.__read_ecg(data)
         self.name = name
-        self.x = [xx for xx in range(0, len(self.data))]
+        self.x = list(range(0, len(self.data)))
         self.y = self.data
 
-    def __read_ecg(self, ecg: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        data = ecg.split("\n")
-        m_data = data[:12]
-        meta_data = {}
-        for m in m_data:
-            if m != "" and "," in m: # makes sure that the row isnt empty and that it is a key,value pair
-                x = m.split(",")
-                if len(x) == 3:  # if commas were used instead of points for floats
-                    meta_data[x[0]] = x[1] + "." + x[2]
-                else:
-                    meta_data[x[0]] = x[1]
-
-        data = data[13:]
-        
-        values = []
-        for d in data:
-            if d != "":
-                values.append(float(d.replace(",", ".")))
-
-        #print(meta_data)
-
-        return values, meta_data
-
+    @classmethod
+    def from_values(cls, values: list, meta_data: dict, name: str) -> "ECG":
+        """
+            ECG from already parsed voltage values and meta data.
+        """
+        ecg = cls.__new__(cls)
+        ecg.data = values.tolist() if isinstance(values, np.ndarray) else list(values)
+        ecg.meta_data = meta_data
+        ecg.name = name
+        ecg.x = list(range(0, len(ecg.data)))
+        ecg.y = ecg.data
+        return ecg
+
+    def __read_ecg(self, ecg: str) -> Tuple[list, dict]:
+        values, meta_data = read_ecg_csv(ecg)
+        return values.tolist(), meta_data
 
     def __getitem__(self, key):
         return self.meta_data[key]
@@ -114,8 +111,9 @@ class WorkoutRoute:
 
     def __init__(self, data, name: str):
         if isinstance(data, pd.DataFrame):
-            self.route = data
-        elif isinstance(data, ET.Element):
+            # Times of csv caches are strings, of the route store naive UTC datetimes
+            self.route = route_frame(data)
+        elif isinstance(data, (ET.Element, bytes)):
             self.route = self.__read_route(data)
         else:
             raise ValueError("This workout type does not exist")
@@ -163,59 +161,222 @@ class WorkoutRoute:
     def vAcc(self):
         return self.route["vAcc"]
 
+    @property
+    def summary(self) -> RouteSummary:
+        if getattr(self, "_summary", None) is None:
+            lon, lat = self.lon.to_numpy(dtype=float), self.lat.to_numpy(dtype=float)
+            self._summary = RouteSummary(self.start, self.end, self.duration_sec, route_bbox(lon, lat),
+                                         haversine_distance(lon, lat), len(lon))
+        return self._summary
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """
+            (min_lon, min_lat, max_lon, max_lat)
+        """
+        return self.summary.bbox
+
+    @property
+    def distance(self) -> float:
+        """
+            Length of the route in meters.
+        """
+        return self.summary.distance
+
+    @property
+    def point_count(self) -> int:
+        return self.summary.point_count
 
     def __times(self):
-        if not self["time"].empty:
-            start = self["time"].iloc[0]
-            end = self["time"].iloc[-1]
-            start = dt.strptime(start, "%Y-%m-%dT%H:%M:%SZ")
-            end = dt.strptime(end, "%Y-%m-%dT%H:%M:%SZ")
+        if "time" in self.route and not self["time"].empty:
+            # start and end stay naive UTC datetimes
+            start = self["time"].iloc[0].tz_convert(None).to_pydatetime()
+            end = self["time"].iloc[-1].tz_convert(None).to_pydatetime()
             time = (end - start).total_seconds()
 
             return start, end, time
         else:
             return None, None, 0
 
-    def __read_route(self, data: ET.Element) -> pd.DataFrame:
-
-        ns = {"gpx": "http://www.topografix.com/GPX/1/1"}
-        tracks = data.findall('gpx:trk', ns)
-
-        data = {
-            "lon": [],
-            "lat": [],
-            "time": [],
-            "elevation": [],
-            "speed": [],
-            "course": [],
-            "hAcc": [],
-            "vAcc": []
-        }
-
-        for track in tracks:
-            track_segments = track.findall('gpx:trkseg', ns)
-            for track_segment in track_segments:
-                track_points = track_segment.findall('gpx:trkpt', ns)
-                for track_point in track_points:
-
-                    elevation = track_point.find('gpx:ele', ns).text
-                    time = track_point.find('gpx:time', ns).text
-                    extension = track_point.find('gpx:extensions', ns)
-
-                    lon = track_point.get("lon")
-                    lat = track_point.get("lat")
-                    speed = extension.find('gpx:speed', ns).text
-                    course = extension.find('gpx:course', ns).text
-                    hAcc = extension.find('gpx:hAcc', ns).text
-                    vAcc = extension.find('gpx:vAcc', ns).text
-
-                    data["lon"].append(float(lon))
-                    data["lat"].append(float(lat))
-                    data["elevation"].append(float(elevation))
-                    data["time"].append(time)
-                    data["speed"].append(float(speed))
-                    data["course"].append(float(course))
-                    data["hAcc"].append(float(hAcc))
-                    data["vAcc"].append(float(vAcc))
-
-        return pd.DataFrame(data)
+    def __read_route(self, data: Union[ET.Element, bytes]) -> pd.DataFrame:
+        return route_frame(read_gpx(data))
+
+
+class LazyWorkoutRoute(WorkoutRoute):
+    """
+        WorkoutRoute created from a persisted RouteSummary. name, start, end, duration_sec,
+        bbox, distance and point_count come from the summary, the points are only read
+        by calling load() when a point column (lon, lat, elevation, ...) is first accessed.
+    """
+
+    def __init__(self, summary: RouteSummary, name: str, load: Callable[[], pd.DataFrame]):
+        self.name = name
+        self._summary = summary
+        self.start = summary.start
+        self.end = summary.end
+        self.duration_sec = summary.duration_sec
+        self.__load = load
+        self.__route = None
+
+    @property
+    def route(self) -> pd.DataFrame:
+        if self.__route is None:
+            self.__route = self.__load()
+        return self.__route
+
+    @property
+    def loaded(self) -> bool:
+        return self.__route is not None
+
+
+class CompactWorkoutRoute:
+    """
+        Memory efficient WorkoutRoute for holding many routes at once.
+
+        Every column is a contiguous NumPy array and times are int64 seconds since the epoch (UTC),
+        no DataFrame is kept. The properties (lon, lat, time, ...) and __getitem__ return the same
+        pandas Series as the ones of WorkoutRoute, the point columns wrap the arrays without
+        copying, time converts the epochs to tz-aware UTC timestamps.
+
+        float32: store elevation, speed, course, hAcc and vAcc as float32. lon and lat always stay
+                 float64, float32 coordinates are only accurate to about a meter.
+    """
+
+    __slots__ = ("name", "float32", "_summary", "_lon", "_lat", "_time", "_elevation",
+                 "_speed", "_course", "_hAcc", "_vAcc")
+
+    COORDINATES = ("lon", "lat")
+    # NaT as int64, missing times stay missing
+    NAT = np.iinfo(np.int64).min
+
+    def __init__(self, data, name: str, float32: bool = False):
+        if isinstance(data, (ET.Element, bytes)):
+            data = read_gpx(data)
+        elif not isinstance(data, (pd.DataFrame, dict)):
+            raise ValueError("This workout type does not exist")
+
+        self.name = name
+        self.float32 = float32
+        self._summary = None
+        length = len(data) if isinstance(data, pd.DataFrame) else len(next(iter(data.values()), []))
+        for column in GPX_COLUMNS:
+            if column == "time":
+                values = self.__epochs(data["time"]) if "time" in data else np.full(length, self.NAT)
+            else:
+                dtype = np.float32 if float32 and column not in self.COORDINATES else np.float64
+                # Copies, views would keep the whole source DataFrame alive
+                values = np.array(data[column], dtype=dtype) if column in data else np.full(length, np.nan, dtype=dtype)
+            setattr(self, "_" + column, values)
+
+    @classmethod
+    def from_route(cls, route: WorkoutRoute, float32: bool = False) -> "CompactWorkoutRoute":
+        return cls(route.route, route.name, float32)
+
+    @staticmethod
+    def __epochs(time) -> np.ndarray:
+        # GPX times (2021-05-01T10:00:00Z) or datetimes written to csv (2021-05-01 10:00:00)
+        return parse_gpx_times(time).view(np.int64)
+
+    def __getitem__(self, key):
+        if (key == "name"):
+            return self.name
+        if key not in GPX_COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __len__(self) -> int:
+        return len(self._time)
+
+    def __column(self, column: str) -> pd.Series:
+        return pd.Series(getattr(self, "_" + column), name=column, copy=False)
+
+    @property
+    def lon(self):
+        return self.__column("lon")
+
+    @property
+    def lat(self):
+        return self.__column("lat")
+
+    @property
+    def time(self):
+        # tz-aware UTC timestamps like WorkoutRoute.time
+        return pd.Series(utc_times(self._time.view("datetime64[s]")), name="time")
+
+    @property
+    def epochs(self) -> np.ndarray:
+        """
+            Seconds since the epoch (UTC) of every point.
+        """
+        return self._time
+
+    @property
+    def elevation(self):
+        return self.__column("elevation")
+
+    @property
+    def speed(self):
+        return self.__column("speed")
+
+    @property
+    def course(self):
+        return self.__column("course")
+
+    @property
+    def hAcc(self):
+        return self.__column("hAcc")
+
+    @property
+    def vAcc(self):
+        return self.__column("vAcc")
+
+    @property
+    def route(self) -> pd.DataFrame:
+        """
+            The points as a DataFrame backed by the arrays of this route.
+        """
+        return pd.DataFrame({column: self[column] for column in GPX_COLUMNS}, copy=False)
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {column: getattr(self, "_" + column) for column in GPX_COLUMNS}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+    @property
+    def start(self) -> dt:
+        return self.summary.start
+
+    @property
+    def end(self) -> dt:
+        return self.summary.end
+
+    @property
+    def duration_sec(self) -> float:
+        return self.summary.duration_sec
+
+    @property
+    def summary(self) -> RouteSummary:
+        if self._summary is None:
+            self._summary = RouteSummary.from_points(self._lon, self._lat, self._time.view("datetime64[s]"))
+        return self._summary
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """
+            (min_lon, min_lat, max_lon, max_lat)
+        """
+        return self.summary.bbox
+
+    @property
+    def distance(self) -> float:
+        """
+            Length of the route in meters.
+        """
+        return self.summary.distance
+
+    @property
+    def point_count(self) -> int:
+        return len(self)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from watchlib.utils.gpx import GPX_COLUMNS
+from watchlib.utils.structs import CompactWorkoutRoute, WorkoutRoute
+from watchlib.utils.tests.test_gpx import gpx, track_point
+
+
+@pytest.fixture
+def data() -> bytes:
+    return gpx([track_point(i, extensions=i % 4 != 0) for i in range(12)])
+
+
+@pytest.mark.parametrize("float32", [False, True])
+def test_columns_match_the_workout_route(data, float32):
+    route = WorkoutRoute(data, "route.gpx")
+
+    for compact in (CompactWorkoutRoute(data, "route.gpx", float32), CompactWorkoutRoute.from_route(route, float32)):
+        for column in GPX_COLUMNS:
+            expected = route[column]
+            if float32 and column in ("elevation", "speed", "course", "hAcc", "vAcc"):
+                expected = expected.astype(np.float32)
+            pd.testing.assert_series_equal(compact[column], expected, check_index_type=False)
+            pd.testing.assert_series_equal(getattr(compact, column), compact[column])
+        assert compact["name"] == route.name
+        pd.testing.assert_frame_equal(compact.route, route.route.astype(compact.route.dtypes.to_dict()))
+
+
+def test_times_and_summary_match_the_workout_route(data):
+    route = WorkoutRoute(data, "route.gpx")
+    compact = CompactWorkoutRoute(data, "route.gpx")
+
+    assert str(compact.time.dt.tz) == "UTC"
+    assert compact.epochs.tolist() == (route.time - pd.Timestamp(0, tz="UTC")).dt.total_seconds().astype(int).tolist()
+    assert (compact.start, compact.end, compact.duration_sec) == (route.start, route.end, route.duration_sec)
+    assert compact.bbox == route.bbox and compact.point_count == route.point_count
+    assert compact.distance == pytest.approx(route.distance)
+
+
+def test_unknown_columns():
+    compact = CompactWorkoutRoute(gpx([track_point(0)]), "route.gpx")
+
+    with pytest.raises(KeyError):
+        compact["heart_rate"]
@@ -0,0 +1,119 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from watchlib.utils.gpx import GPX_COLUMNS, read_gpx, route_frame
+from watchlib.utils.structs import WorkoutRoute
+
+HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<{p}gpx version="1.1" creator="Apple Health Export" {ns}>\n'
+          '<{p}metadata><{p}time>2021-05-01T09:00:00Z</{p}time></{p}metadata>\n'
+          '<{p}trk><{p}name>Route</{p}name><{p}trkseg>\n')
+FOOTER = "</{p}trkseg></{p}trk></{p}gpx>\n"
+
+
+def track_point(i: int, p: str = "", extensions: bool = True) -> str:
+    point = (f'<{p}trkpt lon="{8.4 + i * 1e-4:.6f}" lat="{49.0 - i * 1e-4:.6f}"><{p}ele>{110 + i * 0.5:.6f}</{p}ele>'
+             f'<{p}time>2021-05-01T10:{i // 60:02d}:{i % 60:02d}Z</{p}time>')
+    if extensions:
+        point += (f'<{p}extensions><{p}speed>{2 + i % 3}</{p}speed><{p}course>{i % 360}</{p}course>'
+                  f'<{p}hAcc>{1 + i % 4}</{p}hAcc><{p}vAcc>{1 + i % 5}</{p}vAcc></{p}extensions>')
+    return point + f"</{p}trkpt>\n"
+
+
+def gpx(points, prefix: str = "") -> bytes:
+    p = f"{prefix}:" if prefix else ""
+    ns = f'xmlns{":" + prefix if prefix else ""}="http://www.topografix.com/GPX/1/1"'
+    return (HEADER.format(p=p, ns=ns) + "".join(points) + FOOTER.format(p=p)).encode()
+
+
+def assert_points_equal(points, expected):
+    assert list(points) == GPX_COLUMNS
+    for column in GPX_COLUMNS:
+        np.testing.assert_array_equal(points[column], expected[column], err_msg=column)
+
+
+@pytest.mark.parametrize("prefix", ["", "gpx"])
+@pytest.mark.parametrize("missing", [(), (0,), (3, 4, 9), tuple(range(10))])
+def test_bytes_match_the_element_tree(prefix, missing):
+    p = f"{prefix}:" if prefix else ""
+    data = gpx([track_point(i, p, extensions=i not in missing) for i in range(10)], prefix)
+
+    points = read_gpx(data)
+
+    assert_points_equal(points, read_gpx(ET.fromstring(data)))
+    assert np.isnan(points["speed"][list(missing)]).all()
+    assert points["time"][0] == np.datetime64("2021-05-01T10:00:00")
+
+
+def test_commented_out_points_are_skipped():
+    points = [track_point(i) for i in range(6)]
+    points.insert(2, "<!--" + track_point(99, extensions=False) + "-->\n")
+    data = gpx(points)
+
+    result = read_gpx(data)
+
+    assert len(result["lon"]) == 6
+    assert_points_equal(result, read_gpx(ET.fromstring(data)))
+    assert_points_equal(result, read_gpx(gpx([track_point(i) for i in range(6)])))
+
+
+def test_values_outside_of_points_do_not_shift_the_points():
+    # One time more than points, but it belongs to no point
+    points = [track_point(i, extensions=i != 1) for i in range(5)]
+    points.insert(3, "<time>2021-05-01T11:00:00Z</time>\n")
+    data = gpx(points)
+
+    result = read_gpx(data)
+
+    assert_points_equal(result, read_gpx(ET.fromstring(data)))
+    assert_points_equal(result, read_gpx(gpx([track_point(i, extensions=i != 1) for i in range(5)])))
+
+
+def test_self_closing_points():
+    data = gpx([track_point(0), '<trkpt lon="8.5" lat="49.1"/>\n', track_point(2)])
+
+    result = read_gpx(data)
+
+    assert_points_equal(result, read_gpx(ET.fromstring(data)))
+    assert result["lon"][1] == 8.5 and np.isnat(result["time"][1]) and np.isnan(result["elevation"][1])
+
+
+def test_route_without_points():
+    assert all(len(values) == 0 for values in read_gpx(gpx([])).values())
+
+
+def test_route_times_are_utc_timestamps():
+    data = gpx([track_point(i) for i in range(3)])
+    route = WorkoutRoute(data, "route.gpx")
+
+    assert str(route.time.dt.tz) == "UTC"
+    assert route.time.iloc[1] == pd.Timestamp("2021-05-01T10:00:01Z")
+    assert route.start == datetime(2021, 5, 1, 10, 0, 0) and route.start.tzinfo is None
+    assert route.duration_sec == 2
+
+
+@pytest.mark.parametrize("times", [
+    ["2021-05-01T10:00:00Z", "2021-05-01T10:00:01Z"],
+    ["2021-05-01 10:00:00", "2021-05-01 10:00:01"],
+    ["2021-05-01 12:00:00+02:00", "2021-05-01 12:00:01+02:00"],
+    np.array(["2021-05-01T10:00:00", "2021-05-01T10:00:01"], dtype="datetime64[s]"),
+    pd.Series(["2021-05-01T12:00:00", "2021-05-01T12:00:01"], dtype="datetime64[ns]").dt.tz_localize("Europe/Berlin"),
+])
+def test_every_source_gives_the_same_times(times):
+    # GPX strings, csv caches, offsets, the route store and tz-aware frames
+    route = WorkoutRoute(pd.DataFrame({"lon": [8.4, 8.5], "lat": [49.0, 49.1], "time": times}), "route")
+
+    expected = pd.Series(pd.to_datetime(["2021-05-01T10:00:00Z", "2021-05-01T10:00:01Z"]), name="time")
+    pd.testing.assert_series_equal(route.time, expected, check_dtype=False)
+    assert str(route.time.dt.tz) == "UTC"
+    assert route.start == datetime(2021, 5, 1, 10)
+
+
+def test_route_frame_keeps_missing_times():
+    frame = route_frame({"lon": np.array([8.4, 8.5]), "time": np.array(["2021-05-01T10:00:00Z", ""])})
+
+    assert pd.isna(frame["time"].iloc[1]) and str(frame["time"].dt.tz) == "UTC"
@@ -1,5 +1,7 @@
 from .file import *
+from .ingest import *
 from .loader import *
 from .manager import *
 from .reader import *
+from .records import *
 from .writer import *
@@ -3,6 +3,9 @@ from pathlib import Path
 from typing import List
 
 import pandas as pd
+from pandas.errors import EmptyDataError
+from watchlib.data_handler.cache_backend import CACHE_BACKENDS
+from watchlib.data_handler.cache_backend import CacheBackend
 
 
 class FileSystemManager:
@@ -39,6 +42,60 @@ class FileSystemManager:
         """
         df.to_csv(path / f"{name}.csv", index=False)
 
+    @staticmethod
+    def read_processed(path: Path | str, name: str) -> pd.DataFrame:
+        """
+        Reads a csv file written by ``to_processed``. Empty DataFrames are
+        written as empty files and read back as empty DataFrames.
+
+        Parameters
+        ----------
+        path : Path | str
+            Path to the folder.
+        name : str
+            Name of the file.
+        """
+        try:
+            return pd.read_csv(Path(path) / f"{name}.csv")
+        except EmptyDataError:
+            return pd.DataFrame()
+
+    @staticmethod
+    def to_cache(path: Path | str, df: pd.DataFrame, name: str, backend: CacheBackend):
+        """
+        Writes a DataFrame in the file format of a cache backend.
+
+        Parameters
+        ----------
+        path : Path | str
+            Path to the folder.
+        df : pd.DataFrame
+            DataFrame to write.
+        name : str
+            Name of the file without extension.
+        backend : CacheBackend
+            Backend deciding the file format, e.g. csv or columnar.
+        """
+        backend.write(df, str(Path(path) / f"{name}{backend.extension}"))
+
+    @staticmethod
+    def read_cached(path: Path | str, name: str) -> pd.DataFrame:
+        """
+        Reads a DataFrame written by ``to_cache`` in any of the cache formats.
+
+        Parameters
+        ----------
+        path : Path | str
+            Path to the folder.
+        name : str
+            Name of the file without extension.
+        """
+        for backend in CACHE_BACKENDS.values():
+            file = Path(path) / f"{name}{backend.extension}"
+            if file.exists():
+                return backend.read(str(file))
+        raise FileNotFoundError(f"No cached file {name} in {path}")
+
     @staticmethod
     def delete_files_in(path: Path | str):
         """
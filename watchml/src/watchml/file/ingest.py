@@ -0,0 +1,404 @@
+import csv
+import hashlib
+import re
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict
+from typing import IO
+from typing import Iterable
+from typing import List
+from typing import Protocol
+from uuid import uuid4
+
+import pandas as pd
+from watchlib.data_handler.export_parser import element_tag
+from watchlib.data_handler.export_parser import export_root_attrib
+from watchlib.data_handler.export_parser import ExportStream
+from watchlib.data_handler.export_parser import stream_elements
+
+from .file import FileSystemManager
+from .records import DATE_FORMAT
+from .records import RECORD_COLUMNS
+from .records import RecordPartitionWriter
+
+CREATION_DATE = re.compile(rb' creationDate="([^"]*)"')
+
+
+class Sink(Protocol):
+    def add(self, element: ET.Element):
+        ...
+
+    def close(self, root_attrib: Dict[str, str]):
+        ...
+
+
+class RecordSink:
+    """
+    Buffers Record rows and appends them to ``records.csv`` and to one staging
+    csv file per record type whenever ``chunk_size`` rows have been collected.
+    On close the staged record types are handed to a ``RecordPartitionWriter``.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Cache folder containing the ``records`` folder.
+    chunk_size : int
+        Maximum number of rows held in memory before they are flushed.
+    partition_writer : RecordPartitionWriter | None
+        Writes the per type files, defaults to one csv file per record type.
+    append : bool
+        Append to the existing record files instead of replacing them.
+    """
+
+    def __init__(
+        self,
+        cache_path: Path,
+        chunk_size: int = 100_000,
+        partition_writer: RecordPartitionWriter | None = None,
+        append: bool = False,
+    ):
+        self.cache_path = Path(cache_path)
+        self.chunk_size = chunk_size
+        self.partition_writer = partition_writer or RecordPartitionWriter(
+            self.cache_path / "records"
+        )
+        self.append = append
+        self.rows: List[list] = []
+        self.files: List[IO] = []
+        self.writers = {}
+        self.full_writer = None
+        self.staging_path = None
+
+    def _open(self, path: Path, append: bool):
+        append = append and path.exists()
+        f = open(path, "a" if append else "w", newline="")
+        self.files.append(f)
+        writer = csv.writer(f)
+        if not append:
+            writer.writerow(RECORD_COLUMNS)
+        return writer
+
+    def add(self, element: ET.Element):
+        attrib = element.attrib
+        self.rows.append([attrib.get(column) for column in RECORD_COLUMNS])
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.full_writer is None:
+            self.full_writer = self._open(
+                self.cache_path / "records.csv", append=self.append
+            )
+            self.staging_path = Path(tempfile.mkdtemp(dir=self.cache_path))
+        self.full_writer.writerows(self.rows)
+
+        buffers: Dict[str, List[list]] = {}
+        for row in self.rows:
+            buffers.setdefault(row[0], []).append(row)
+        for record_type, rows in buffers.items():
+            if record_type not in self.writers:
+                self.writers[record_type] = self._open(
+                    self.staging_path / f"{record_type}.csv", append=False
+                )
+            self.writers[record_type].writerows(rows)
+        self.rows = []
+
+    def close(self, root_attrib: Dict[str, str]):
+        self.flush()
+        for f in self.files:
+            f.close()
+        self.files = []
+
+        self.partition_writer.write_types(
+            (
+                (record_type, self.staging_path / f"{record_type}.csv")
+                for record_type in self.writers
+            ),
+            append=self.append,
+        )
+        shutil.rmtree(self.staging_path)
+
+        self.writers = {}
+        self.full_writer = None
+        self.staging_path = None
+
+
+class ActivitySummarySink:
+    def __init__(self, cache_path: Path):
+        self.cache_path = Path(cache_path)
+        self.rows = []
+
+    def add(self, element: ET.Element):
+        self.rows.append(dict(element.attrib))
+
+    def close(self, root_attrib: Dict[str, str]):
+        FileSystemManager.to_processed(
+            path=self.cache_path,
+            df=pd.DataFrame(self.rows),
+            name="activity_summary",
+        )
+
+
+class MetadataSink:
+    def __init__(self, cache_path: Path):
+        self.cache_path = Path(cache_path)
+        self.me = {}
+        self.export_date = None
+
+    def add(self, element: ET.Element):
+        if element.tag == "Me":
+            self.me = dict(element.attrib)
+        elif element.tag == "ExportDate":
+            self.export_date = element.attrib["value"]
+
+    def close(self, root_attrib: Dict[str, str]):
+        metadata_df = pd.DataFrame(self.me, index=[0])
+        metadata_df["locale"] = root_attrib.get("locale")
+        metadata_df["export_date"] = self.export_date
+        FileSystemManager.to_processed(
+            path=self.cache_path, df=metadata_df, name="metadata"
+        )
+
+
+class WorkoutSink:
+    """
+    Writes the per workout statistics, metadata entry and route files as soon as
+    a Workout element arrives and collects the workout, event and route rows.
+    With ``append`` the rows are added to the existing workout tables.
+    """
+
+    def __init__(self, writer, append: bool = False):
+        self.writer = writer
+        self.append = append
+        self.workouts = []
+        self.events = []
+        self.routes = []
+
+    def add(self, element: ET.Element):
+        # Generate unique id for each workout to be able to join workouts with events, routes, etc.
+        workout_id = uuid4()
+        workout = dict(element.attrib)
+        workout["uuid"] = workout_id
+        self.workouts.append(workout)
+
+        for event in element.findall("WorkoutEvent"):
+            self.events.append({**event.attrib, "workout_uuid": workout_id})
+
+        for route in element.findall("WorkoutRoute"):
+            route_attrib = {**route.attrib, "workout_uuid": workout_id}
+            file_ref = route.find("FileReference")
+            if file_ref is not None:
+                route_path = file_ref.attrib["path"]
+                route_attrib["path"] = route_path
+                self.writer._write_route_files_for(
+                    self.writer.data_path / route_path[1:], workout_id
+                )
+            self.routes.append(route_attrib)
+
+        self.writer._write_statistics_file_for(element, workout_id)
+        self.writer._write_meta_data_entry_file_for(element, workout_id)
+
+    def _write_table(self, rows: List[dict], name: str):
+        path = self.writer.cache_path / f"{name}.csv"
+        if self.append and path.exists():
+            if not rows:
+                return
+            # Tables of exports without e.g. routes are empty files
+            previous = FileSystemManager.read_processed(self.writer.cache_path, name)
+            if not previous.empty:
+                rows = pd.concat([previous, pd.DataFrame(rows)], ignore_index=True)
+        FileSystemManager.to_processed(
+            path=self.writer.cache_path, df=pd.DataFrame(rows), name=name
+        )
+
+    def close(self, root_attrib: Dict[str, str]):
+        self._write_table(self.workouts, "workouts")
+        self._write_table(self.events, "workout_events")
+        self._write_table(self.routes, "routes_meta")
+        self.writer.write_route_store()
+
+
+class HighWaterMark:
+    """
+    Decides from the raw opening line of Record and Workout elements whether they
+    were created after ``since`` and keeps track of the newest creationDate, the
+    number of elements per tag and a digest of all opening lines, so old elements
+    are skipped before parsing while changes to them can still be detected.
+
+    Parameters
+    ----------
+    tags : Iterable[str]
+        Top level tags passed on to the parser, all other elements are skipped.
+    since : str | None
+        creationDate of the newest element already in the cache. Elements created
+        at or before it are skipped, None accepts every element.
+    """
+
+    TRACKED = ("Record", "Workout")
+
+    def __init__(self, tags: Iterable[str], since: str | None = None):
+        self.tags = {tag.encode() for tag in tags}
+        self.since = since
+        self.latest = since
+        self.counts = {tag: 0 for tag in self.TRACKED}
+        self.new = {tag: 0 for tag in self.TRACKED}
+        self.parsed = {tag: 0 for tag in self.TRACKED}
+        self._digest = hashlib.blake2b(digest_size=16)
+        self._old_digest = hashlib.blake2b(digest_size=16)
+        self._since_window = self._window(since)
+        self._latest_window = self._window(since)
+
+    @staticmethod
+    def _window(date: str | None):
+        # Local dates differ from UTC by less than a day. Outside of this window
+        # comparing the date strings is enough, inside the dates are parsed.
+        if date is None:
+            return None
+        day = datetime.strptime(date, DATE_FORMAT)
+        return (
+            (day - timedelta(days=1)).strftime("%Y-%m-%d"),
+            (day + timedelta(days=1)).strftime("%Y-%m-%d"),
+        )
+
+    @staticmethod
+    def _is_after(date: str, reference: str | None, window) -> bool:
+        if reference is None:
+            return True
+        if date[:10] < window[0]:
+            return False
+        if date[:10] > window[1]:
+            return True
+        return datetime.strptime(date, DATE_FORMAT) > datetime.strptime(
+            reference, DATE_FORMAT
+        )
+
+    def __call__(self, head: bytes) -> bool:
+        tag = element_tag(head)
+        if tag not in self.tags:
+            return False
+        name = tag.decode()
+        if name not in self.counts:
+            return True
+
+        match = CREATION_DATE.search(head)
+        if match is None:
+            return True
+        created = match.group(1).decode()
+
+        self.counts[name] += 1
+        self._digest.update(head)
+        if self._is_after(created, self.latest, self._latest_window):
+            self.latest = created
+            self._latest_window = self._window(created)
+
+        if not self._is_after(created, self.since, self._since_window):
+            self._old_digest.update(head)
+            return False
+        self.new[name] += 1
+        return True
+
+    def accepts(self, element: ET.Element) -> bool:
+        if element.tag in self.parsed:
+            self.parsed[element.tag] += 1
+        created = element.get("creationDate")
+        return created is None or self._is_after(
+            created, self.since, self._since_window
+        )
+
+    @property
+    def digest(self) -> str:
+        """
+        Digest of the opening lines of all Record and Workout elements.
+        """
+        return self._digest.hexdigest()
+
+    @property
+    def reliable(self) -> bool:
+        """
+        False if elements reached the parser without passing the raw line check,
+        which happens when Export.xml is not laid out like Apple writes it.
+        """
+        return all(self.parsed[tag] == self.new[tag] for tag in self.TRACKED)
+
+    def matches(self, counts: Dict[str, int], digest: str) -> bool:
+        """
+        True if the opening lines of the elements created at or before ``since``
+        are exactly the ones of a previous export, in the same order. Only needs
+        the raw lines, so it can be checked before anything is parsed.
+
+        Parameters
+        ----------
+        counts : Dict[str, int]
+            Element counts of the previous export.
+        digest : str
+            Digest of the previous export.
+        """
+        return self._old_digest.hexdigest() == digest and all(
+            self.counts[tag] - self.new[tag] == counts.get(tag, 0)
+            for tag in self.TRACKED
+        )
+
+    def continues(self, counts: Dict[str, int], digest: str) -> bool:
+        """
+        True if this export holds exactly the elements of a previous export, in
+        the same order, plus the new ones, i.e. no old data was removed or changed,
+        and every new element reached the parser through the raw line check.
+
+        Parameters
+        ----------
+        counts : Dict[str, int]
+            Element counts of the previous export.
+        digest : str
+            Digest of the previous export.
+        """
+        return self.reliable and self.matches(counts, digest)
+
+
+class ExportIngest:
+    """
+    Reads Export.xml once and hands every top level element to the sink
+    registered for its tag. Elements without a sink are skipped.
+
+    Parameters
+    ----------
+    sinks : Dict[str, Sink]
+        Mapping from element tag to the sink receiving those elements.
+    """
+
+    def __init__(self, sinks: Dict[str, Sink]):
+        self.sinks = sinks
+
+    def run(self, export_path: Path | str, mark: HighWaterMark | None = None):
+        """
+        Parameters
+        ----------
+        export_path : Path | str
+            Path to the Export.xml file.
+        mark : HighWaterMark | None
+            Skips elements before they are parsed and counts them.
+        """
+        if mark is None:
+            stream = ExportStream(str(export_path))
+            elements = stream.elements(tags=self.sinks.keys())
+        else:
+            elements = stream_elements(str(export_path), mark)
+
+        for element in elements:
+            if element.tag not in self.sinks:
+                continue
+            if mark is not None and not mark.accepts(element):
+                continue
+            self.sinks[element.tag].add(element)
+
+        root_attrib = (
+            stream.root_attrib if mark is None else export_root_attrib(str(export_path))
+        )
+        closed = []
+        for sink in self.sinks.values():
+            if not any(sink is c for c in closed):
+                sink.close(root_attrib)
+                closed.append(sink)
@@ -1,5 +1,11 @@
 import xml.etree.ElementTree as ET
+from datetime import datetime
 from pathlib import Path
+from typing import List
+
+import pandas as pd
+from watchlib.data_handler.export_parser import parse_records
+from watchlib.data_handler.export_parser import RecordFilter
 
 
 class WatchLoader:
@@ -7,7 +13,46 @@ class WatchLoader:
         self.data_path = Path(data_path)
         self.cache_path = Path(cache_path) if cache_path else Path(data_path) / "cache"
 
+    @property
+    def export_path(self) -> Path:
+        return self.data_path / "Export.xml"
+
     def load_export_root(self) -> ET.Element:
-        tree = ET.parse(self.data_path / "Export.xml")
+        tree = ET.parse(self.export_path)
         root = tree.getroot()
         return root
+
+    def load_records(
+        self,
+        workers: int = 1,
+        types: List[str] | None = None,
+        start: datetime | str | None = None,
+        end: datetime | str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Loads the Record elements of Export.xml into one DataFrame.
+
+        Parameters
+        ----------
+        workers : int
+            Number of processes parsing separate byte ranges of Export.xml.
+            The result is identical for every worker count.
+        types : List[str] | None
+            Record types to load, either full identifiers or short names like
+            ``HeartRate``. Records of other types are skipped before parsing.
+        start : datetime | str | None
+            Only load records with a startDate at or after ``start``.
+        end : datetime | str | None
+            Only load records with a startDate before ``end``.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per record with a column for every record attribute.
+        """
+        record_filter = None
+        if types is not None or start is not None or end is not None:
+            record_filter = RecordFilter(types, start, end)
+        return parse_records(
+            str(self.export_path), workers=workers, record_filter=record_filter
+        ).to_frame()
@@ -1,12 +1,16 @@
 import json
+import logging
 import xml.etree.ElementTree as ET
 from datetime import datetime as dt
 from pathlib import Path
 
 from .file import FileSystemManager
+from .ingest import HighWaterMark
 from .loader import WatchLoader
 from .writer import WatchWriter
 
+logger = logging.getLogger(__name__)
+
 
 class WatchManager:
     def __init__(
@@ -24,24 +28,75 @@ class WatchManager:
         FileSystemManager.delete_files_in(self.cache_path / "routes")
         FileSystemManager.delete_files_in(self.cache_path / "workout_metadata_entry")
 
-    def update_cache_info(self):
+    def read_cache_info(self) -> dict:
+        if not (self.cache_path / "cache.json").exists():
+            return {}
+        with open(self.cache_path / "cache.json", "r") as f:
+            return json.load(f)
+
+    def update_cache_info(self, mark: HighWaterMark | None = None):
         if not self.cache_path.exists():
             self.writer.scaffold_folder_structure()
 
-        with open(self.cache_path / "cache.json", "w") as f:
-            content = {
-                "last_updated": dt.now().strftime("%Y-%m-%d %H:%M:%S"),
+        content = {
+            "last_updated": dt.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        # Only exports whose elements could all be counted support incremental reloads
+        if mark is not None and mark.reliable:
+            content["export"] = {
+                "size": self.loader.export_path.stat().st_size,
+                "high_water_mark": mark.latest,
+                "counts": mark.counts,
+                "digest": mark.digest,
             }
+
+        with open(self.cache_path / "cache.json", "w") as f:
             f.write(json.dumps(content))
 
-    def reload_data(self, root: ET.Element = None):
-        self.writer.scaffold_folder_structure()
+    def reload_data(self, root: ET.Element = None, incremental: bool = False):
+        """
+        Rebuilds the cache from Export.xml.
 
-        if root is None:
-            print("Reading Export.xml file...")
-            root = self.loader.load_export_root()
+        The stored high water mark is removed before the cache is written and
+        only saved again once every file was written, so a reload that fails
+        half way is followed by a full rebuild instead of appending twice.
 
+        Parameters
+        ----------
+        root : ET.Element
+            Already parsed Export.xml root, the file is streamed if None.
+        incremental : bool
+            Only parse and append the records and workouts created after the
+            last reload. The old elements of the export are compared with the
+            previous export first, the cache is rebuilt instead if the export
+            was truncated or old data in it was changed.
+        """
+        self.writer.scaffold_folder_structure()
+        export = self.read_cache_info().get("export")
         self.update_cache_info()
-        # self.delete_old_data()
 
-        self.writer.write_all(root=root)
+        if root is not None:
+            self.writer.write_all(root=root)
+            return
+
+        if incremental and export is not None:
+            if self.loader.export_path.stat().st_size < export["size"]:
+                logger.info("Export.xml is smaller than before, rebuilding the cache")
+            elif not self.writer.scan(
+                self.loader.export_path, since=export["high_water_mark"]
+            ).matches(export["counts"], export["digest"]):
+                logger.info("Export.xml has been rewritten, rebuilding the cache")
+            else:
+                logger.info("Streaming new data from Export.xml file...")
+                mark = self.writer.stream_all(
+                    self.loader.export_path, since=export["high_water_mark"]
+                )
+                if mark.continues(export["counts"], export["digest"]):
+                    self.update_cache_info(mark)
+                    return
+                # Elements bypassed the raw line check, the appended rows are replaced below
+                logger.info("Export.xml could not be checked, rebuilding the cache")
+
+        logger.info("Streaming Export.xml file...")
+        mark = self.writer.stream_all(self.loader.export_path)
+        self.update_cache_info(mark)
@@ -1,13 +1,22 @@
 import logging
 import os
+from datetime import datetime
 from pathlib import Path
 from typing import List
 from typing import Tuple
 
 import pandas as pd
+from watchlib.data_handler.export_parser import RecordFilter
+from watchlib.data_handler.route_store import RouteStore
+from watchlib.utils.ecg_csv import read_ecg_csv
+from watchlib.utils.gpx import route_frame
 from watchml import ECG
 from watchml import WorkoutRoute
 
+from .records import local_start_dates
+from .records import read_record_type
+from .records import record_types
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,27 +31,8 @@ class ECGReader:
 
     @staticmethod
     def read_ecg(ecg) -> Tuple[List[float], dict]:
-        data = ecg.split("\n")
-        m_data = data[:12]
-        meta_data = {}
-        for m in m_data:
-            if (
-                m != "" and "," in m
-            ):  # makes sure that the row isnt empty and that it is a key,value pair
-                x = m.split(",")
-                if len(x) == 3:  # if commas were used instead of points for floats
-                    meta_data[x[0]] = x[1] + "." + x[2]
-                else:
-                    meta_data[x[0]] = x[1]
-
-        data = data[13:]
-
-        values = []
-        for d in data:
-            if d != "":
-                values.append(float(d.replace(",", ".")))
-
-        return values, meta_data
+        values, meta_data = read_ecg_csv(ecg)
+        return values.tolist(), meta_data
 
 
 class WatchReader:
@@ -58,7 +48,7 @@ class WatchReader:
 
     @property
     def record_types(self):
-        return [file.split(".")[0] for file in os.listdir(self.cache_path / "records")]
+        return record_types(self.cache_path / "records")
 
     def ecgs(self):
         logger.info("Reading ECGs")
@@ -69,7 +59,7 @@ class WatchReader:
                 ecg = f.read()
                 logger.debug(f"Reading ECG {file}")
                 name = file.split(".")[0]
-                values, meta_data = ECGReader.ecg_data(ecg)
+                values, meta_data = ECGReader.read_ecg(ecg)
             ecgs.append(ECG(values, meta_data, name))
         return ecgs
 
@@ -95,9 +85,15 @@ class WatchReader:
 
     def routes(self) -> List[WorkoutRoute]:
         logger.info("Reading routes")
+        routes_path = self.cache_path / "routes"
+        store = RouteStore(routes_path) if RouteStore.exists(routes_path) else None
         routes = []
         for row in self.routes_meta().itertuples():
-            route_df = self.route(row.workout_uuid)
+            if store is not None and row.workout_uuid in store:
+                # Zero-copy view of the memory-mapped route store, times as UTC timestamps like the csv routes
+                route_df = store.frame(row.workout_uuid)
+            else:
+                route_df = route_frame(self.route(row.workout_uuid))
             route = WorkoutRoute(
                 route_df=route_df, uuid=row.workout_uuid, gpx_path=row.path
             )
@@ -114,14 +110,64 @@ class WatchReader:
         logger.debug(f"Reading workout statistics for workout {workout_id}")
         return pd.read_csv(self.cache_path / "workout_statistics" / f"{workout_id}.csv")
 
-    def records(self):
+    def _filter_records(
+        self, df: pd.DataFrame, start: datetime | str | None, end: datetime | str | None
+    ) -> pd.DataFrame:
+        if start is None and end is None:
+            return df
+        # The local time written in the export, like RecordFilter.accepts_date
+        record_filter = RecordFilter(start=start, end=end)
+        if pd.api.types.is_datetime64_any_dtype(df["startDate"]):
+            stamps = local_start_dates(df)
+            bound = pd.Timestamp
+        else:
+            stamps = df["startDate"].str.slice(0, 19)
+            bound = lambda value: value
+        mask = stamps.notna()
+        if record_filter.start is not None:
+            mask &= stamps >= bound(record_filter.start)
+        if record_filter.end is not None:
+            mask &= stamps < bound(record_filter.end)
+        return df.loc[mask]
+
+    def records(
+        self,
+        types: List[str] | None = None,
+        start: datetime | str | None = None,
+        end: datetime | str | None = None,
+    ):
+        """
+        Reads the cached records of the given types.
+
+        Parameters
+        ----------
+        types : List[str] | None
+            Record types to read, either full identifiers or short names.
+        start : datetime | str | None
+            Only records with a startDate at or after ``start``.
+        end : datetime | str | None
+            Only records with a startDate before ``end``.
+
+        ``start`` and ``end`` are compared with the local time written in
+        Export.xml (e.g. 08:00 of "2021-05-01 08:00:00 +0200"), for csv and
+        typed caches alike and like ``WatchLoader.load_records``.
+        """
         logger.info("Reading records")
+        record_filter = RecordFilter(types=types)
         records = []
-        for file in os.listdir(self.cache_path / "records"):
-            logger.debug(f"Reading record {file}")
-            records.append(pd.read_csv(self.cache_path / "records" / file))
+        for record_type in self.record_types:
+            # Only open the files of the requested record types
+            if not record_filter.accepts_type(record_type):
+                continue
+            records.append(self.record(record_type, start, end))
         return records
 
-    def record(self, record_type: str):
+    def record(
+        self,
+        record_type: str,
+        start: datetime | str | None = None,
+        end: datetime | str | None = None,
+    ):
         logger.debug(f"Reading record {record_type}")
-        return pd.read_csv(self.cache_path / "records" / f"{record_type}.csv")
+        df = read_record_type(self.cache_path / "records", record_type, start, end)
+        return self._filter_records(df, start, end)
@@ -0,0 +1,538 @@
+import json
+import os
+import re
+import shutil
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from watchlib.data_handler.cache_backend import cache_backend_for
+from watchlib.data_handler.cache_backend import CacheBackend
+from watchlib.data_handler.cache_backend import CSVBackend
+from watchlib.data_handler.export_parser import RecordFilter
+
+from .file import FileSystemManager
+
+# Attributes of the Record element as declared in the Export.xml DTD
+RECORD_COLUMNS = [
+    "type",
+    "sourceName",
+    "sourceVersion",
+    "unit",
+    "creationDate",
+    "startDate",
+    "endDate",
+    "value",
+    "device",
+]
+
+RECORD_DATE_COLUMNS = ["creationDate", "startDate", "endDate"]
+
+# Utc offset of startDate in minutes, written next to the UTC dates of typed caches
+START_OFFSET_COLUMN = "startDateOffset"
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+
+MANIFEST = "manifest.json"
+
+# strftime format for typed dates and prefix length for date strings
+PARTITION_FORMATS = {"year": ("%Y", 4), "month": ("%Y-%m", 7)}
+
+# Rows appended by incremental reloads are stored next to the file they extend
+# as "<name>.<part>", e.g. "records/HeartRate.2.npz" or "2021-03.1.csv"
+PART_NAME = re.compile(r"^(.*?)(?:\.(\d+))?$")
+
+
+def _utc_offsets(column: pd.Series) -> np.ndarray:
+    # "+HHMM" at the end of every date in minutes, 0 for missing dates
+    parts = column.astype("string").str.extract(r"([+-])(\d\d)(\d\d)$")
+    minutes = parts[1].astype(float) * 60 + parts[2].astype(float)
+    minutes = minutes.where(parts[0] != "-", -minutes)
+    return minutes.fillna(0).to_numpy(dtype=np.int16)
+
+
+def _utc_dates(column: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    # pd.to_datetime with %z falls back to a slow strptime loop. Apple writes
+    # every date as "YYYY-MM-DD HH:MM:SS +HHMM", so the local time and the utc
+    # offset are read from a fixed width byte matrix instead.
+    valid = column.notna().to_numpy()
+    try:
+        raw = np.asarray(
+            column.where(valid, "1970-01-01 00:00:00 +0000").to_numpy(),
+            dtype="S26",
+        )
+    except UnicodeEncodeError:
+        return pd.to_datetime(column, utc=True, format=DATE_FORMAT), _utc_offsets(column)
+    chars = raw.view(np.uint8).reshape(len(raw), 26)
+    digits = chars[:, 21:25].astype(np.int64) - ord("0")
+    if not (
+        (chars[:, 25] == 0).all()
+        and (chars[:, 19] == ord(" ")).all()
+        and np.isin(chars[:, 20], [ord("+"), ord("-")]).all()
+        and ((digits >= 0) & (digits <= 9)).all()
+    ):
+        return pd.to_datetime(column, utc=True, format=DATE_FORMAT), _utc_offsets(column)
+
+    local = pd.to_datetime(
+        chars[:, :19].copy().view("S19").ravel().astype(str),
+        format="%Y-%m-%d %H:%M:%S",
+    )
+    minutes = (digits[:, 0] * 10 + digits[:, 1]) * 60 + digits[:, 2] * 10 + digits[:, 3]
+    minutes = np.where(chars[:, 20] == ord("-"), -minutes, minutes)
+    utc = pd.Series(local - pd.to_timedelta(minutes, unit="min"), index=column.index)
+    return utc.where(valid).dt.tz_localize("UTC"), minutes.astype(np.int16)
+
+
+def typed_records(record_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parses the date columns of a record DataFrame so typed cache backends can
+    store them as timestamps. Dates are converted to UTC because an export mixes
+    utc offsets (e.g. summer and winter time). The offset of every startDate is
+    kept in minutes in ``START_OFFSET_COLUMN``, so ``startDate`` plus the offset
+    is the local time written in the export.
+    """
+    columns = [
+        column
+        for column in RECORD_DATE_COLUMNS
+        if column in record_df
+        and not pd.api.types.is_datetime64_any_dtype(record_df[column])
+    ]
+    if not columns:
+        return record_df
+    record_df = record_df.copy()
+    for column in columns:
+        record_df[column], offsets = _utc_dates(record_df[column])
+        if column == "startDate":
+            record_df[START_OFFSET_COLUMN] = offsets
+    return record_df
+
+
+def local_start_dates(record_df: pd.DataFrame) -> pd.Series:
+    """
+    The startDate of every record as the naive local time written in the
+    export, for typed as well as for csv caches.
+
+    Parameters
+    ----------
+    record_df : pd.DataFrame
+        Records read from the cache.
+    """
+    start = record_df["startDate"]
+    if not pd.api.types.is_datetime64_any_dtype(start):
+        # "YYYY-MM-DD HH:MM:SS +HHMM", the local time comes first
+        return pd.to_datetime(start.str.slice(0, 19), format="%Y-%m-%d %H:%M:%S")
+    if start.dt.tz is not None:
+        start = start.dt.tz_convert("UTC").dt.tz_localize(None)
+    if START_OFFSET_COLUMN not in record_df:
+        # Typed caches written before the offsets were kept, only UTC is known
+        return start
+    offsets = pd.to_numeric(record_df[START_OFFSET_COLUMN]).to_numpy(dtype=np.int64)
+    return start + pd.to_timedelta(offsets, unit="min")
+
+
+def _time_bound(column: pd.Series, largest: bool) -> str | None:
+    column = column.dropna()
+    if column.empty:
+        return None
+    value = column.max() if largest else column.min()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def _day(value: str) -> date:
+    return date.fromisoformat(value[:10])
+
+
+def _overlaps(entry: dict, start: str | None, end: str | None) -> bool:
+    # Partitions of typed caches are split by UTC dates while the bounds may be
+    # local dates, one day of slack keeps partitions at the edges.
+    if entry.get("start") is None or entry.get("end") is None:
+        return True
+    if start is not None and _day(entry["end"]) < _day(start) - timedelta(days=1):
+        return False
+    if end is not None and _day(entry["start"]) > _day(end) + timedelta(days=1):
+        return False
+    return True
+
+
+def _split_part(file: str) -> Tuple[str, int]:
+    match = PART_NAME.match(os.path.splitext(file)[0])
+    return match.group(1), int(match.group(2) or 0)
+
+
+def _part_file(name: str, part: int) -> str:
+    return name if part == 0 else f"{name}.{part}"
+
+
+def read_manifest(records_path: Path | str) -> List[dict]:
+    """
+    Reads the manifest written by ``RecordPartitionWriter``, one entry per
+    partition file. Returns an empty list for caches written without one.
+
+    Parameters
+    ----------
+    records_path : Path | str
+        Path to the ``records`` cache folder.
+    """
+    path = Path(records_path) / MANIFEST
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        return json.load(f)["partitions"]
+
+
+def record_types(records_path: Path | str) -> List[str]:
+    """
+    Lists the record types in the ``records`` cache folder, both the ones
+    stored in a single file and the ones split into partition folders.
+
+    Parameters
+    ----------
+    records_path : Path | str
+        Path to the ``records`` cache folder.
+    """
+    records_path = Path(records_path)
+    types = set()
+    for file in os.listdir(records_path):
+        if (records_path / file).is_dir():
+            types.add(file)
+        elif file != MANIFEST and cache_backend_for(file) is not None:
+            types.add(_split_part(file)[0])
+    return sorted(types)
+
+
+def _type_files(records_path: Path, record_type: str) -> List[Path]:
+    # Files of a record type ordered by partition and part, i.e. in the order
+    # the rows were written
+    folder = records_path / record_type
+    if folder.is_dir():
+        files = [(_split_part(file), folder / file) for file in os.listdir(folder)]
+    else:
+        files = [
+            (_split_part(file), records_path / file)
+            for file in os.listdir(records_path)
+            if file != MANIFEST and _split_part(file)[0] == record_type
+        ]
+    return [
+        path
+        for _, path in sorted(files)
+        if path.is_file() and cache_backend_for(path.name) is not None
+    ]
+
+
+def read_record_type(
+    records_path: Path | str,
+    record_type: str,
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+) -> pd.DataFrame:
+    """
+    Reads all rows of a record type, no matter if it is stored in a single file
+    or split by year or month, including the parts appended by incremental
+    reloads. ``start`` and ``end`` only skip partitions that lie completely
+    outside of the range, rows are not filtered.
+
+    Parameters
+    ----------
+    records_path : Path | str
+        Path to the ``records`` cache folder.
+    record_type : str
+        Record type, e.g. HKQuantityTypeIdentifierHeartRate.
+    start : datetime | str | None
+        Skip partitions ending before this date.
+    end : datetime | str | None
+        Skip partitions starting after this date.
+    """
+    records_path = Path(records_path)
+    files = _type_files(records_path, record_type)
+    if not files:
+        raise FileNotFoundError(f"No cached records of type {record_type} in {records_path}")
+
+    record_filter = RecordFilter(start=start, end=end)
+    entries = {
+        entry["file"]: entry
+        for entry in read_manifest(records_path)
+        if entry["type"] == record_type
+    }
+    frames = []
+    for path in files:
+        entry = entries.get(path.relative_to(records_path).as_posix(), {})
+        if not _overlaps(entry, record_filter.start, record_filter.end):
+            continue
+        frames.append(cache_backend_for(path.name).read(str(path)))
+    if not frames:
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+class RecordPartitionWriter:
+    """
+    Writes one cache file per record type, optionally split into one file per
+    year or month of ``startDate`` (``records/<type>/<partition>``), and a
+    ``manifest.json`` with the row count and time bounds of every file.
+    Record types are split in a single pass and written in parallel. Appended
+    rows are written as additional parts of the partitions they belong to.
+
+    Parameters
+    ----------
+    records_path : Path | str
+        Path to the ``records`` cache folder.
+    backend : CacheBackend
+        Format of the written files.
+    partition_by : str | None
+        ``"year"``, ``"month"`` or None to write a single file per record type.
+        Typed backends partition by the UTC date, csv by the local date.
+    workers : int
+        Number of threads writing record types at the same time.
+    """
+
+    def __init__(
+        self,
+        records_path: Path | str,
+        backend: CacheBackend = CSVBackend(),
+        partition_by: str | None = None,
+        workers: int = 1,
+    ):
+        if partition_by is not None and partition_by not in PARTITION_FORMATS:
+            raise ValueError(
+                f"Unknown partitioning {partition_by}, use one of {list(PARTITION_FORMATS)}"
+            )
+        self.records_path = Path(records_path)
+        self.backend = backend
+        self.partition_by = partition_by
+        self.workers = workers
+
+    def clear(self):
+        """
+        Deletes all cached record files and partition folders.
+        """
+        if not self.records_path.exists():
+            return
+        for file in os.listdir(self.records_path):
+            path = self.records_path / file
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def _remove_type(self, record_type: str):
+        shutil.rmtree(self.records_path / record_type, ignore_errors=True)
+        for path in _type_files(self.records_path, record_type):
+            os.remove(path)
+
+    def partitions(
+        self, record_df: pd.DataFrame
+    ) -> Iterable[Tuple[str | None, pd.DataFrame]]:
+        """
+        Splits the rows of a single record type by year or month.
+
+        Parameters
+        ----------
+        record_df : pd.DataFrame
+            Rows of one record type.
+        """
+        if self.partition_by is None:
+            yield None, record_df
+            return
+        date_format, length = PARTITION_FORMATS[self.partition_by]
+        start = record_df["startDate"]
+        if pd.api.types.is_datetime64_any_dtype(start):
+            keys = start.dt.strftime(date_format)
+        else:
+            keys = start.astype("string").str.slice(0, length)
+        keys = keys.fillna("unknown")
+        for key, partition_df in record_df.groupby(keys.to_numpy(), sort=True):
+            yield key, partition_df
+
+    def _location(self, record_type: str, partition: str | None) -> Tuple[Path, str]:
+        # Folder and file name (without extension) of a partition
+        if partition is None:
+            return self.records_path, record_type
+        return self.records_path / record_type, partition
+
+    def _entry(
+        self, record_type: str, partition: str | None, part: int, df: pd.DataFrame
+    ) -> dict:
+        folder, name = self._location(record_type, partition)
+        file = _part_file(name, part) + self.backend.extension
+        return {
+            "type": record_type,
+            "partition": partition,
+            "part": part,
+            "file": file if partition is None else f"{record_type}/{file}",
+            "rows": len(df),
+            "start": _time_bound(df["startDate"], largest=False),
+            "end": _time_bound(df["endDate"], largest=True),
+        }
+
+    def _appendable(self, record_type: str, entries: List[dict]) -> bool:
+        # New parts are only added to types written with the same layout and
+        # format, everything else is rewritten
+        partitioned = (self.records_path / record_type).is_dir()
+        return (
+            bool(entries)
+            and partitioned == (self.partition_by is not None)
+            and all(entry["file"].endswith(self.backend.extension) for entry in entries)
+        )
+
+    def write_type(
+        self,
+        record_type: str,
+        record_df: pd.DataFrame | Path,
+        append: bool = False,
+    ) -> List[dict]:
+        """
+        Writes the files of a record type and returns the manifest entries of
+        all its files.
+
+        With ``append`` the rows are written as new parts next to the cached
+        files of their partitions (``<partition>.<part>``), so only the new rows
+        are written. Types cached without a manifest entry, in another format or
+        with another partitioning are read and rewritten instead.
+
+        Parameters
+        ----------
+        record_type : str
+            Record type, e.g. HKQuantityTypeIdentifierHeartRate.
+        record_df : pd.DataFrame | Path
+            Rows of the record type or the path to a csv file containing them.
+        append : bool
+            Keep the already cached rows of the record type.
+        """
+        if isinstance(record_df, Path):
+            record_df = pd.read_csv(record_df)
+        if self.backend.name != "csv":
+            record_df = typed_records(record_df)
+
+        previous = []
+        if append and _type_files(self.records_path, record_type):
+            previous = [
+                entry
+                for entry in read_manifest(self.records_path)
+                if entry["type"] == record_type
+            ]
+            if not self._appendable(record_type, previous):
+                record_df = pd.concat(
+                    [read_record_type(self.records_path, record_type), record_df],
+                    ignore_index=True,
+                )
+                previous = []
+
+        if not previous:
+            self._remove_type(record_type)
+        parts: Dict[str | None, int] = {}
+        for entry in previous:
+            partition, part = entry["partition"], entry.get("part", 0)
+            parts[partition] = max(parts.get(partition, -1), part)
+
+        entries = list(previous)
+        for partition, partition_df in self.partitions(record_df):
+            part = parts.get(partition, -1) + 1
+            folder, name = self._location(record_type, partition)
+            folder.mkdir(exist_ok=True)
+            FileSystemManager.to_cache(
+                path=folder,
+                df=partition_df,
+                name=_part_file(name, part),
+                backend=self.backend,
+            )
+            entries.append(self._entry(record_type, partition, part, partition_df))
+        return entries
+
+    def write_types(
+        self,
+        records: Iterable[Tuple[str, pd.DataFrame | Path]],
+        append: bool = False,
+    ) -> List[dict]:
+        """
+        Writes several record types and the manifest. Without ``append`` all
+        previously cached records are replaced.
+
+        Parameters
+        ----------
+        records : Iterable[Tuple[str, pd.DataFrame | Path]]
+            Pairs of record type and its rows or a csv file containing them.
+        append : bool
+            Add the rows to the cached records instead of replacing them.
+        """
+        records = list(records)
+        if not append:
+            self.clear()
+        tasks = [(record_type, df, append) for record_type, df in records]
+        if self.workers > 1 and len(tasks) > 1:
+            # Compression and file writes release the GIL, threads avoid
+            # pickling the frames to worker processes
+            with ThreadPool(min(self.workers, len(tasks))) as pool:
+                results = pool.starmap(self.write_type, tasks)
+        else:
+            results = [self.write_type(*task) for task in tasks]
+
+        entries = [entry for result in results for entry in result]
+        self.write_manifest(entries, append=append)
+        return entries
+
+    def write(self, record_df: pd.DataFrame, append: bool = False) -> List[dict]:
+        """
+        Splits a DataFrame of all records by type and writes every type.
+
+        Parameters
+        ----------
+        record_df : pd.DataFrame
+            Records of all types, e.g. the content of ``records.csv``.
+        append : bool
+            Add the rows to the cached records instead of replacing them.
+        """
+        if self.backend.name != "csv":
+            # Parse the dates once instead of once per record type
+            record_df = typed_records(record_df)
+        groups = record_df.groupby("type", sort=False)
+        return self.write_types(
+            ((record_type, group_df) for record_type, group_df in groups),
+            append=append,
+        )
+
+    def write_manifest(self, entries: List[dict], append: bool = False):
+        """
+        Writes the manifest. With ``append`` the entries of record types that
+        were not written again are kept.
+
+        Parameters
+        ----------
+        entries : List[dict]
+            Manifest entries returned by ``write_type``.
+        append : bool
+            Merge with the existing manifest.
+        """
+        if append:
+            written = {entry["type"] for entry in entries}
+            entries = [
+                entry
+                for entry in read_manifest(self.records_path)
+                if entry["type"] not in written
+            ] + entries
+        entries = sorted(
+            entries,
+            key=lambda entry: (
+                entry["type"],
+                entry["partition"] or "",
+                entry.get("part", 0),
+            ),
+        )
+        manifest: Dict[str, object] = {
+            "backend": self.backend.name,
+            "partition_by": self.partition_by,
+            "partitions": entries,
+        }
+        with open(self.records_path / MANIFEST, "w") as f:
+            json.dump(manifest, f, indent=2)
@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from watchml.file.ingest import HighWaterMark
+from watchml.file.manager import WatchManager
+from watchml.file.records import read_record_type, record_types
+from watchml.file.writer import WatchWriter
+
+START = datetime(2021, 3, 1)
+FORMAT = "%Y-%m-%d %H:%M:%S +0100"
+OLD_WORKOUTS = (0, 100, 200)
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="de_DE">
+ <ExportDate value="2022-01-01 00:00:00 +0100"/>
+ <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-01-01"/>
+"""
+
+
+def record(i: int, value: float = None, created: str = None) -> str:
+    # One heart rate or step count record every 5 minutes, created when it started
+    start = (START + timedelta(minutes=5 * i)).strftime(FORMAT)
+    end = (START + timedelta(minutes=5 * i + 1)).strftime(FORMAT)
+    kind, unit = ("HeartRate", "count/min") if i % 2 else ("StepCount", "count")
+    value = i % 120 + 40 if value is None else value
+    return (f' <Record type="HKQuantityTypeIdentifier{kind}" sourceName="Apple Watch" unit="{unit}" '
+            f'creationDate="{created or start}" startDate="{start}" endDate="{end}" value="{value}"/>\n')
+
+
+def workout(i: int) -> str:
+    start = (START + timedelta(minutes=5 * i)).strftime(FORMAT)
+    end = (START + timedelta(minutes=5 * i + 2)).strftime(FORMAT)
+    return (f' <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="45" durationUnit="min" '
+            f'sourceName="Apple Watch" creationDate="{end}" startDate="{start}" endDate="{end}">\n'
+            f'  <WorkoutStatistics type="HKQuantityTypeIdentifierHeartRate" startDate="{start}" endDate="{end}" '
+            f'average="140.0" unit="count/min"/>\n'
+            f' </Workout>\n')
+
+
+def write_export(folder, records: int, workouts=(), lines=None) -> str:
+    # workouts are written after the records at these positions, lines replace records by position
+    lines = lines or {}
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(folder / "Export.xml", "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        for i in range(records):
+            f.write(lines.get(i, record(i)))
+            if i in workouts:
+                f.write(workout(i))
+        f.write("</HealthData>\n")
+    return folder / "Export.xml"
+
+
+def frames(manager: WatchManager) -> dict:
+    path = manager.cache_path / "records"
+    return {
+        record_type: read_record_type(path, record_type)
+        .sort_values(["startDate", "type"])
+        .reset_index(drop=True)
+        for record_type in record_types(path)
+    }
+
+
+def assert_same_cache(manager: WatchManager, tmp_path):
+    rebuilt = WatchManager(manager.data_path, tmp_path / "rebuilt")
+    rebuilt.reload_data()
+
+    expected = frames(rebuilt)
+    actual = frames(manager)
+    assert actual.keys() == expected.keys()
+    for record_type in expected:
+        pd.testing.assert_frame_equal(actual[record_type], expected[record_type], check_dtype=False,
+                                      check_categorical=False)
+    for name in ("records.csv", "workouts.csv"):
+        # Workouts get a new random uuid on every reload
+        actual, expected = (pd.read_csv(m.cache_path / name).drop(columns="uuid", errors="ignore")
+                            for m in (manager, rebuilt))
+        pd.testing.assert_frame_equal(actual, expected)
+    assert manager.read_cache_info()["export"] == rebuilt.read_cache_info()["export"]
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    # The since argument of every WatchWriter.stream_all call, None for a full rebuild
+    calls = []
+    stream_all = WatchWriter.stream_all
+
+    def recording(self, export_path, chunk_size=100_000, since=None):
+        calls.append(since)
+        return stream_all(self, export_path, chunk_size, since)
+
+    monkeypatch.setattr(WatchWriter, "stream_all", recording)
+    return calls
+
+
+@pytest.fixture
+def manager(tmp_path) -> WatchManager:
+    write_export(tmp_path / "export", 500, workouts=OLD_WORKOUTS)
+    manager = WatchManager(tmp_path / "export", tmp_path / "cache")
+    manager.reload_data()
+    return manager
+
+
+def test_appended_export_is_streamed_incrementally(manager, streams, tmp_path):
+    mark = manager.read_cache_info()["export"]["high_water_mark"]
+    write_export(tmp_path / "export", 800, workouts=OLD_WORKOUTS + (600, 700))
+
+    manager.reload_data(incremental=True)
+
+    assert streams == [mark]
+    export = manager.read_cache_info()["export"]
+    assert export["counts"] == {"Record": 800, "Workout": 5}
+    assert export["high_water_mark"] == (START + timedelta(minutes=5 * 799)).strftime(FORMAT)
+    assert len(pd.read_csv(manager.cache_path / "records.csv")) == 800
+    assert_same_cache(manager, tmp_path)
+
+
+def test_unchanged_export_appends_nothing(manager, streams, tmp_path):
+    manager.reload_data(incremental=True)
+
+    assert len(streams) == 1 and streams[0] is not None
+    assert len(pd.read_csv(manager.cache_path / "records.csv")) == 500
+    assert_same_cache(manager, tmp_path)
+
+
+def test_truncated_export_is_rebuilt(manager, streams, tmp_path):
+    write_export(tmp_path / "export", 400, workouts=OLD_WORKOUTS)
+
+    manager.reload_data(incremental=True)
+
+    assert streams == [None]
+    assert manager.read_cache_info()["export"]["counts"] == {"Record": 400, "Workout": 3}
+    assert_same_cache(manager, tmp_path)
+
+
+def test_rewritten_old_element_is_rebuilt(manager, streams, tmp_path):
+    # Same size or larger, only the digest of the old elements tells the change
+    write_export(tmp_path / "export", 600, workouts=OLD_WORKOUTS, lines={10: record(10, value=1000)})
+
+    manager.reload_data(incremental=True)
+
+    assert streams == [None]
+    assert 1000 in pd.read_csv(manager.cache_path / "records.csv")["value"].tolist()
+    assert_same_cache(manager, tmp_path)
+
+
+def test_new_element_created_at_the_mark_is_rebuilt(manager, streams, tmp_path):
+    # Records created at the mark count as old, an added one changes the old elements
+    mark = manager.read_cache_info()["export"]["high_water_mark"]
+    write_export(tmp_path / "export", 502, workouts=OLD_WORKOUTS, lines={500: record(500, created=mark)})
+
+    manager.reload_data(incremental=True)
+
+    assert streams == [None]
+    assert manager.read_cache_info()["export"]["counts"] == {"Record": 502, "Workout": 3}
+    assert len(pd.read_csv(manager.cache_path / "records.csv")) == 502
+    assert_same_cache(manager, tmp_path)
+
+
+def test_failed_reload_drops_the_mark(manager, tmp_path, monkeypatch):
+    write_export(tmp_path / "export", 600, workouts=OLD_WORKOUTS)
+
+    def fail(self, export_path, chunk_size=100_000, since=None):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(WatchWriter, "stream_all", fail)
+    with pytest.raises(RuntimeError):
+        manager.reload_data(incremental=True)
+
+    assert "export" not in manager.read_cache_info()
+
+
+def head(i: int, tag: str = "Record") -> bytes:
+    return record(i).replace(" <Record", f" <{tag}", 1).split(">")[0].encode() + b">"
+
+
+def test_mark_counts_old_and_new_elements():
+    previous = HighWaterMark(HighWaterMark.TRACKED)
+    for i in range(5):
+        assert previous(head(i))
+    assert previous.counts == {"Record": 5, "Workout": 0}
+
+    mark = HighWaterMark(HighWaterMark.TRACKED, since=previous.latest)
+    accepted = [mark(head(i)) for i in range(8)]
+
+    assert accepted == [False] * 5 + [True] * 3
+    assert mark.new == {"Record": 3, "Workout": 0}
+    assert mark.latest == (START + timedelta(minutes=35)).strftime(FORMAT)
+    assert mark.matches(previous.counts, previous.digest)
+    assert not mark.matches({"Record": 4}, previous.digest)
+    # Nothing was parsed yet, the new elements have not reached the parser
+    assert not mark.reliable and not mark.continues(previous.counts, previous.digest)
+
+
+def test_mark_skips_untracked_tags():
+    mark = HighWaterMark(["Record"])
+
+    assert not mark(b'<ActivitySummary dateComponents="2021-03-01"/>')
+    assert not mark(head(0, "Workout"))
+    assert mark.counts == {"Record": 0, "Workout": 0}
@@ -1,18 +1,45 @@
+import os
 import xml.etree.ElementTree as ET
 from pathlib import Path
 from uuid import uuid4
 
 import pandas as pd
+from watchlib.data_handler.cache_backend import CacheBackend
+from watchlib.data_handler.cache_backend import get_cache_backend
+from watchlib.data_handler.export_parser import scan_elements
+from watchlib.data_handler.route_store import RouteStore
+from watchlib.utils.gpx import read_gpx
 
 from .file import FileSystemManager
+from .ingest import ActivitySummarySink
+from .ingest import ExportIngest
+from .ingest import HighWaterMark
+from .ingest import MetadataSink
+from .ingest import RecordSink
+from .ingest import WorkoutSink
+from .records import RecordPartitionWriter
 
 WorkoutElement = ET.Element
 
 
 class WatchWriter:
-    def __init__(self, data_path: str | Path, cache_path: str | Path | None = None):
+    def __init__(
+        self,
+        data_path: str | Path,
+        cache_path: str | Path | None = None,
+        backend: str | CacheBackend = "columnar",
+        partition_by: str | None = None,
+        workers: int = 1,
+    ):
         self.data_path = Path(data_path)
         self.cache_path = Path(cache_path) if cache_path else Path(data_path) / "cache"
+        self.backend = get_cache_backend(backend)
+        self.record_writer = RecordPartitionWriter(
+            self.cache_path / "records",
+            backend=self.backend,
+            partition_by=partition_by,
+            workers=workers,
+        )
 
     def scaffold_folder_structure(self):
         paths = [
@@ -28,12 +55,7 @@ class WatchWriter:
             FileSystemManager.scaffold_paths(paths)
 
     def write_record_files(self, record_df: pd.DataFrame):
-        unique_record_types = record_df["type"].unique()
-        for record_type in unique_record_types:
-            record_sub_df = record_df.loc[record_df["type"] == record_type]
-            FileSystemManager.to_processed(
-                path=self.cache_path / "records", df=record_sub_df, name=record_type
-            )
+        self.record_writer.write(record_df)
 
     def write_full_record_file(self, record_df: pd.DataFrame):
         record_df.to_csv(self.cache_path / "records.csv", index=False)
@@ -74,54 +96,67 @@ class WatchWriter:
             name=workout_id,
         )
 
-    def _write_route_files_for(self, route_root, workout_id: str):
-        ns = {"gpx": "http://www.topografix.com/GPX/1/1"}
-        routes = route_root.findall("gpx:trk", ns)
-
-        route_data = {
-            "lon": [],
-            "lat": [],
-            "time": [],
-            "elevation": [],
-            "speed": [],
-            "course": [],
-            "hAcc": [],
-            "vAcc": [],
-        }
-
-        for route in routes:
-            route_segments = route.findall("gpx:trkseg", ns)
-            for route_segment in route_segments:
-                route_points = route_segment.findall("gpx:trkpt", ns)
-                for route_point in route_points:
-                    elevation = route_point.find("gpx:ele", ns).text
-                    time = route_point.find("gpx:time", ns).text
-
-                    # contains information about speed, course and acceleration
-                    extension = route_point.find("gpx:extensions", ns)
-
-                    lon = route_point.get("lon")
-                    lat = route_point.get("lat")
-                    speed = extension.find("gpx:speed", ns).text
-                    course = extension.find("gpx:course", ns).text
-                    hAcc = extension.find("gpx:hAcc", ns).text
-                    vAcc = extension.find("gpx:vAcc", ns).text
-
-                    route_data["lon"].append(float(lon))
-                    route_data["lat"].append(float(lat))
-                    route_data["elevation"].append(float(elevation))
-                    route_data["time"].append(time)
-                    route_data["speed"].append(float(speed))
-                    route_data["course"].append(float(course))
-                    route_data["hAcc"].append(float(hAcc))
-                    route_data["vAcc"].append(float(vAcc))
-
-        route_df = pd.DataFrame(route_data)
+    def _write_route_files_for(self, route: Path | ET.Element, workout_id: str):
+        """
+        Writes the track points of a GPX route to ``routes/<workout_id>.csv``.
+
+        Parameters
+        ----------
+        route : Path | ET.Element
+            Path to the GPX file or its parsed root element.
+        workout_id : str
+            Id of the workout the route belongs to.
+        """
+        points = read_gpx(route if isinstance(route, ET.Element) else str(route))
+        route_df = pd.DataFrame(points, copy=False)
+        # Keep the GPX time format in the csv files
+        route_df["time"] = route_df["time"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
         FileSystemManager.to_processed(
             path=self.cache_path / "routes", df=route_df, name=workout_id
         )
 
+    def delete_workout_files(self):
+        """
+        Deletes the per workout statistics, metadata entry and route csv files.
+        Workouts get new ids on every full rebuild, so the files of previous
+        rebuilds would otherwise pile up.
+        """
+        for folder in ["workout_statistics", "workout_metadata_entries", "routes"]:
+            path = self.cache_path / folder
+            if not path.exists():
+                continue
+            for file in os.listdir(path):
+                if file.endswith(".csv"):
+                    os.remove(path / file)
+
+    def write_route_store(self):
+        """
+        Consolidates the route csv files of the workouts in ``routes_meta.csv``
+        into a memory-mapped ``RouteStore`` in the ``routes`` folder. Routes
+        already in the previous store are copied from it instead of parsing
+        their csv file again.
+        """
+        routes_path = self.cache_path / "routes"
+        previous = RouteStore(routes_path) if RouteStore.exists(routes_path) else None
+        routes_meta = FileSystemManager.read_processed(self.cache_path, "routes_meta")
+        workout_ids = (
+            routes_meta["workout_uuid"].astype(str)
+            if "workout_uuid" in routes_meta
+            else []
+        )
+
+        def routes():
+            # A workout can have several WorkoutRoute elements sharing one file
+            for workout_id in dict.fromkeys(workout_ids):
+                if previous is not None and workout_id in previous:
+                    yield workout_id, previous.points(workout_id)
+                elif (routes_path / f"{workout_id}.csv").exists():
+                    yield workout_id, pd.read_csv(routes_path / f"{workout_id}.csv")
+
+        RouteStore.write(str(routes_path), routes())
+
     def write_workout_files(self, root: ET.Element):
+        self.delete_workout_files()
         workout_attributes = []
         route_attributes = []
         workouts = root.findall("Workout")
@@ -142,11 +177,9 @@ class WatchWriter:
                 if file_ref is not None:
                     route_path = file_ref.attrib["path"]
                     route.attrib["path"] = route_path
-                    route_path = self.data_path / route_path[1:]
-                    route_tree = ET.parse(route_path)
-                    route_root = route_tree.getroot()
-
-                    self._write_route_files_for(route_root, workout_id)
+                    self._write_route_files_for(
+                        self.data_path / route_path[1:], workout_id
+                    )
 
             route_attribs = [route.attrib for route in routes]
             route_attributes.extend(route_attribs)
@@ -163,6 +196,7 @@ class WatchWriter:
         FileSystemManager.to_processed(
             path=self.cache_path, df=routes_meta_df, name="routes_meta"
         )
+        self.write_route_store()
 
     def _load_full_record_df(self, root: ET.Element) -> pd.DataFrame:
         records = root.findall("Record")
@@ -193,6 +227,68 @@ class WatchWriter:
             path=self.cache_path, df=activity_summary_df, name="activity_summary"
         )
 
+    def stream_all(
+        self,
+        export_path: str | Path,
+        chunk_size: int = 100_000,
+        since: str | None = None,
+    ) -> HighWaterMark:
+        """
+        Writes the same cache files as ``write_all`` while reading Export.xml
+        only once and without loading the whole element tree into memory.
+
+        Parameters
+        ----------
+        export_path : str | Path
+            Path to the Export.xml file.
+        chunk_size : int
+            Maximum number of record rows buffered before they are written.
+        since : str | None
+            creationDate of the newest cached record or workout. If given, only
+            newer records and workouts are parsed and appended to the cache,
+            otherwise the per workout files of previous reloads are deleted.
+
+        Returns
+        -------
+        HighWaterMark
+            Newest creationDate and element counts of the export.
+        """
+        append = since is not None
+        if not append:
+            self.delete_workout_files()
+        metadata_sink = MetadataSink(self.cache_path)
+        sinks = {
+            "Me": metadata_sink,
+            "ExportDate": metadata_sink,
+            "ActivitySummary": ActivitySummarySink(self.cache_path),
+            "Record": RecordSink(
+                self.cache_path,
+                chunk_size=chunk_size,
+                partition_writer=self.record_writer,
+                append=append,
+            ),
+            "Workout": WorkoutSink(self, append=append),
+        }
+        mark = HighWaterMark(tags=sinks.keys(), since=since)
+        ExportIngest(sinks=sinks).run(export_path, mark=mark)
+        return mark
+
+    def scan(self, export_path: str | Path, since: str | None = None) -> HighWaterMark:
+        """
+        Counts and hashes the Record and Workout elements of Export.xml from their
+        raw opening lines without parsing or writing anything.
+
+        Parameters
+        ----------
+        export_path : str | Path
+            Path to the Export.xml file.
+        since : str | None
+            creationDate of the newest cached record or workout.
+        """
+        mark = HighWaterMark(tags=HighWaterMark.TRACKED, since=since)
+        scan_elements(str(export_path), mark)
+        return mark
+
     def write_all(self, root: ET.Element):
         self.write_metadata(root)
         self.write_activity_summary(root)